@@ -1,73 +1,199 @@
-from fastapi import FastAPI, HTTPException
+from contextlib import asynccontextmanager
+from fastapi import FastAPI, HTTPException, Request
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import JSONResponse, Response
 from pydantic import BaseModel
-from pricing_engine import PricingEngine, TripRequest, UserProfile, PricingConfig
+from typing import List, Optional, Union
+from pricing_engine import PricingEngine, PricingConfig
+from micro_batcher import MicroBatcher
+from codec import CodecError, BOOKED_TRIP, PRICING_TRIP, USER_PROFILE
+import codec
+import asyncio
+import logging
+import os
 import time
 
-# Initialize FastAPI app
-app = FastAPI()
+logger = logging.getLogger(__name__)
+
+# Serving mode: "sync" prices each request on the threadpool, "batched" gathers
+# concurrent requests into micro-batches priced with one model call
+SERVING_MODE = os.environ.get("TAXIMAX_SERVING_MODE", "sync")
+BATCH_MAX_SIZE = int(os.environ.get("TAXIMAX_BATCH_MAX_SIZE", "64"))
+BATCH_MAX_WAIT_MS = float(os.environ.get("TAXIMAX_BATCH_MAX_WAIT_MS", "2.0"))
+# Run representative requests before /ready reports ready
+WARMUP = os.environ.get("TAXIMAX_WARMUP", "0") == "1"
 
 # Load the pricing engine
-config = PricingConfig()
+# Inference backend, surge source and the other pricing settings come from TAXIMAX_* variables
+config = PricingConfig.from_env()
 pricing_engine = PricingEngine(config)
+micro_batcher = MicroBatcher(pricing_engine, BATCH_MAX_SIZE, BATCH_MAX_WAIT_MS) if SERVING_MODE == "batched" else None
+ready = False
+
+async def warmup():
+    global ready
+    try:
+        await run_in_threadpool(pricing_engine.warmup)
+    except Exception as e:
+        logger.error(f"Warmup failed: {e}")
+    ready = True
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    global ready
+    if micro_batcher is not None:
+        await micro_batcher.start()
+    warmup_task = asyncio.create_task(warmup()) if WARMUP else None
+    ready = not WARMUP
+    yield
+    if warmup_task is not None:
+        warmup_task.cancel()
+    if micro_batcher is not None:
+        await micro_batcher.stop()
+
+# Initialize FastAPI app
+app = FastAPI(lifespan=lifespan)
+
+# Pricing bodies are decoded with the codec schemas shared with appV2 (JSON or MessagePack)
+# straight into the internal data models, and responses are encoded for the client's Accept header
+async def read_payload(request: Request):
+    try:
+        return codec.decode(await request.body(), request.headers.get("content-type"))
+    except CodecError as e:
+        raise invalid_payload(e)
+
+def invalid_payload(e: CodecError) -> HTTPException:
+    # 422 is what FastAPI answers for bodies that fail validation
+    return HTTPException(status_code=422 if e.status == 400 else e.status, detail=str(e))
+
+def respond(request: Request, content) -> Response:
+    body, media_type = codec.encode(content, request.headers.get("accept"))
+    return Response(body, media_type=media_type)
 
-# Define request models for the API
-class TripRequestModel(BaseModel):
-    user_id: str
-    distance: float
-    duration: float
-    zone: str
-    ride_demand_level: int
-    traffic_level: int
-    weather_severity: int  # New field for real-time weather
-    traffic_blocks: int    # New field for real-time traffic
-    is_holiday: bool       # New field for real-time holiday status
-    is_event_nearby: bool  # New field for real-time event status
-
-class UserProfileModel(BaseModel):
-    loyalty_tier: int
-    price_sensitivity: float
-
-class PricingRequest(BaseModel):
-    trip_request: TripRequestModel
-    user_profile: UserProfileModel
-    current_supply: int
+def parse_supply(item) -> int:
+    supply = item.get("current_supply")
+    if type(supply) is not int:
+        raise CodecError(f"current_supply must be int, got {type(supply).__name__}")
+    return supply
+
+def field_of(items, name: str) -> list:
+    """One field of every item, None where an item is not an object"""
+    return [item.get(name) if type(item) is dict else None for item in items]
 
 # Define the API endpoint
 @app.post("/calculate_price")
-def calculate_price(request: PricingRequest):
+async def calculate_price(request: Request):
+    payload = await read_payload(request)
     try:
-        # Convert API request to the internal data models
-        trip_request = TripRequest(
-            user_id=request.trip_request.user_id,
-            distance=request.trip_request.distance,
-            duration=request.trip_request.duration,
-            zone=request.trip_request.zone,
-            timestamp=time.time(),
-            ride_demand_level=request.trip_request.ride_demand_level,
-            traffic_level=request.trip_request.traffic_level,
-            weather_severity=request.trip_request.weather_severity,  # Pass real-time weather
-            traffic_blocks=request.trip_request.traffic_blocks,      # Pass real-time traffic
-            is_holiday=request.trip_request.is_holiday,              # Pass real-time holiday status
-            is_event_nearby=request.trip_request.is_event_nearby     # Pass real-time event status
-        )
-
-        user_profile = UserProfile(
-            loyalty_tier=request.user_profile.loyalty_tier,
-            price_sensitivity=request.user_profile.price_sensitivity
-        )
+        if type(payload) is not dict:
+            raise CodecError(f"expected an object, got {type(payload).__name__}")
+        trip_request = PRICING_TRIP.decode(payload.get("trip_request"), "trip_request", timestamp=time.time())
+        user_profile = USER_PROFILE.decode(payload.get("user_profile"), "user_profile")
+        current_supply = parse_supply(payload)
+    except CodecError as e:
+        raise invalid_payload(e)
 
+    try:
         # Calculate the price
-        price = pricing_engine.calculate_price(
-            request=trip_request,
-            user=user_profile,
-            current_supply=request.current_supply
+        if micro_batcher is not None:
+            price = await micro_batcher.submit(trip_request, user_profile, current_supply)
+        else:
+            price = await run_in_threadpool(
+                pricing_engine.calculate_price,
+                request=trip_request,
+                user=user_profile,
+                current_supply=current_supply
+            )
+
+        return respond(request, {"price": price})
+
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@app.post("/calculate_price_batch")
+async def calculate_price_batch(request: Request):
+    payload = await read_payload(request)
+    try:
+        if type(payload) is not dict:
+            raise CodecError(f"expected an object, got {type(payload).__name__}")
+        items, seed = payload.get("requests"), payload.get("seed")  # Seed for the surge jitter, for reproducible quotes
+        if type(items) is not list:
+            raise CodecError(f"requests: expected a list, got {type(items).__name__}")
+        if seed is not None and (type(seed) is not int or seed < 0):
+            raise CodecError(f"seed must be a non-negative int, got {seed!r}")
+        now = time.time()
+        trips = PRICING_TRIP.decode_many(field_of(items, "trip_request"), "requests.trip_request", timestamp=now)
+        users = USER_PROFILE.decode_many(field_of(items, "user_profile"), "requests.user_profile")
+        supply = [parse_supply(item) for item in items]
+    except CodecError as e:
+        raise invalid_payload(e)
+
+    try:
+        prices = await run_in_threadpool(
+            pricing_engine.calculate_price_batch,
+            requests=trips,
+            users=users,
+            current_supply=supply,
+            seed=seed
         )
 
-        return {"price": price}
+        return respond(request, {"prices": prices})
 
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+class SurgeEventModel(BaseModel):
+    type: str                        # request_created, driver_online or driver_offline
+    zone: Optional[str] = None
+    driver_id: Optional[Union[str, int]] = None
+    timestamp: Optional[float] = None
+
+class SurgeEventsRequest(BaseModel):
+    events: List[SurgeEventModel]
+
+@app.post("/surge_events")
+def surge_events(request: SurgeEventsRequest):
+    if pricing_engine.surge_state is None:
+        raise HTTPException(status_code=409, detail="Surge streaming is disabled; start the service with TAXIMAX_SURGE_MODE=stream")
+    try:
+        applied = pricing_engine.surge_state.apply_events(event.model_dump() for event in request.events)
+        return {"applied": applied}
+    except (KeyError, ValueError) as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+@app.post("/record_trips")
+async def record_trips(request: Request):
+    """Report booked trips ({"trips": [{"zone", "timestamp", ...}]}); demand is refit from these, never from quotes"""
+    if config.demand_refresh_interval <= 0:
+        raise HTTPException(status_code=409, detail="Demand refresh is disabled; set TAXIMAX_DEMAND_REFRESH_SECONDS")
+    payload = await read_payload(request)
+    try:
+        if type(payload) is not dict:
+            raise CodecError(f"expected an object, got {type(payload).__name__}")
+        trips = BOOKED_TRIP.columns(payload.get("trips", []), "trips")
+    except CodecError as e:
+        raise invalid_payload(e)
+    return {"recorded": pricing_engine.record_trips(zip(trips["zone"], trips["timestamp"]))}
+
+@app.get("/surge")
+def surge():
+    if pricing_engine.surge_state is None:
+        return {"surge_mode": config.surge_mode, "zones": {}}
+    return {"surge_mode": config.surge_mode, "zones": pricing_engine.surge_state.snapshot()}
+
+@app.get("/ready")
+def readiness():
+    body = {"ready": ready, "startup_timings": pricing_engine.startup_timings}
+    return body if ready else JSONResponse(body, status_code=503)
+
+@app.get("/serving_stats")
+def serving_stats():
+    return {"serving_mode": SERVING_MODE, "micro_batcher": micro_batcher.stats() if micro_batcher is not None else None}
+
+@app.get("/prediction_cache_stats")
+def prediction_cache_stats():
+    return {"prediction_cache": pricing_engine.cache_stats()}
+
 # Run the API
 if __name__ == "__main__":
     import uvicorn
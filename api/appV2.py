@@ -1,21 +1,154 @@
-from flask import Flask, request, jsonify
-from profitability_evaluatorV2 import RequestEvaluator, DriverProfile, TripRequest, UserProfile, PricingEngine, PricingConfig
-from dataclasses import asdict
+from flask import Flask, Request, request, jsonify, has_request_context
+from flask.json.provider import JSONProvider
+from profitability_evaluatorV2 import RequestEvaluator, DriverProfile, UserProfile, PricingEngine, PricingConfig, SCORE_METRICS
+import io
 import logging
+import os
+import threading
 import time
 from flask_cors import CORS
+from werkzeug.exceptions import RequestEntityTooLarge
+from zone_graph import ZoneRouter
+from fleet_assignment import FleetAssigner
+from shift_planner import ShiftPlanner
+from request_pool import RequestPool
+from response_cache import CachedResponse, ResponseCache, payload_key
+from codec import CodecError, Schema, BOOKED_TRIP, PRICING_TRIP, TRIP_REQUEST, USER_PROFILE, decode_request_array
+import codec
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+class CodecRequest(Request):
+    """request.json that also reads MessagePack bodies (Content-Type: application/msgpack)"""
+    def get_json(self, force=False, silent=False, cache=True):
+        if codec.is_msgpack(self.mimetype):
+            return codec.decode(self.get_data(cache=cache), self.mimetype)
+        return super().get_json(force=force, silent=silent, cache=cache)
+
+class CodecJSONProvider(JSONProvider):
+    """orjson for request.json and jsonify; dataclasses are serialized without building dicts first.
+    jsonify answers in MessagePack when the client's Accept header prefers it."""
+    def dumps(self, obj, **kwargs):
+        return codec.dumps(obj).decode()
+
+    def loads(self, s, **kwargs):
+        return codec.loads(s)
+
+    def response(self, *args, **kwargs):
+        obj = self._prepare_response_obj(args, kwargs)
+        body, content_type = codec.encode(obj, request.headers.get("Accept") if has_request_context() else None)
+        return self._app.response_class(body, mimetype=content_type)
+
 app = Flask(__name__)
+app.request_class = CodecRequest
+app.json = CodecJSONProvider(app)
 CORS(app)  # Enable CORS for all routes
+# Largest request body accepted; larger ones are answered 413 before any endpoint reads them
+app.config["MAX_CONTENT_LENGTH"] = int(float(os.environ.get("TAXIMAX_MAX_BODY_MB", "16")) * 2**20)
+
+@app.before_request
+def read_body():
+    """Read the body up front (Flask keeps it for the endpoint), so an oversized one fails here with a 413
+    instead of inside an endpoint's error handling"""
+    limit = app.config["MAX_CONTENT_LENGTH"]
+    if request.content_length is None and request.environ.get("wsgi.input_terminated"):
+        # Chunked bodies have no length to check, and Werkzeug cuts them at the limit instead of refusing them
+        body = request.environ["wsgi.input"].read(limit + 1)
+        if len(body) > limit:
+            raise RequestEntityTooLarge()
+        request.environ["wsgi.input"] = io.BytesIO(body)
+    request.get_data()
+
+@app.errorhandler(RequestEntityTooLarge)
+def body_too_large(e):
+    return jsonify({
+        "status": "error",
+        "message": f"Request body is larger than {app.config['MAX_CONTENT_LENGTH']} bytes"
+    }), 413
 
 # Initialize pricing engine and evaluator
-config = PricingConfig()
+# Inference backend, surge source and the other pricing settings come from TAXIMAX_* variables
+config = PricingConfig.from_env()
 pricing_engine = PricingEngine(config)
-evaluator = RequestEvaluator()
+# Zone travel costs: the built-in graph, or a graph file that is reloaded when it changes
+zone_router = ZoneRouter(os.environ.get("TAXIMAX_ZONE_GRAPH"), float(os.environ.get("TAXIMAX_ZONE_GRAPH_POLL_SECONDS", "5")))
+zone_router.start()
+# Optional candidate prefilter for drivers that send coordinates
+max_deadhead_miles = os.environ.get("TAXIMAX_MAX_DEADHEAD_MILES")
+nearest_candidates = os.environ.get("TAXIMAX_NEAREST_CANDIDATES")
+evaluator = RequestEvaluator(
+    zone_router,
+    max_deadhead_miles=float(max_deadhead_miles) if max_deadhead_miles else None,
+    nearest_candidates=int(nearest_candidates) if nearest_candidates else None
+)
+fleet_assigner = FleetAssigner(evaluator)
+# Multi-trip lookahead for /plan-shift, bounded per call by a search time budget
+shift_planner = ShiftPlanner(evaluator, budget_ms=float(os.environ.get("TAXIMAX_PLAN_BUDGET_MS", "20")))
+# Server-side open-request pool with per-driver rankings, for drivers that poll
+request_pool = RequestPool(evaluator, ttl_seconds=float(os.environ.get("TAXIMAX_POOL_TTL_SECONDS", "300")))
+# Idle /pool/drivers/<driver_id>/stream connections get a comment line this often
+STREAM_HEARTBEAT_SECONDS = float(os.environ.get("TAXIMAX_STREAM_HEARTBEAT_SECONDS", "15"))
+# Each open stream holds a server thread (TAXIMAX_THREADS per gunicorn worker) until a write finds the client gone,
+# so the cap keeps threads free for other requests; streams past it are answered 503
+MAX_STREAMS = int(os.environ.get("TAXIMAX_MAX_STREAMS", "8"))
+# Short-lived cache of /rank-requests responses, for drivers that poll with unchanged payloads (a TTL of 0 disables it)
+response_cache_ttl = float(os.environ.get("TAXIMAX_RESPONSE_CACHE_TTL_SECONDS", "2"))
+response_cache = ResponseCache(
+    response_cache_ttl, int(float(os.environ.get("TAXIMAX_RESPONSE_CACHE_MB", "32")) * 2**20)
+) if response_cache_ttl > 0 else None
+
+# Run representative requests before /ready reports ready
+WARMUP = os.environ.get("TAXIMAX_WARMUP", "0") == "1"
+ready = threading.Event()
+
+def run_warmup():
+    try:
+        pricing_engine.warmup()
+    except Exception as e:
+        logger.error(f"Warmup failed: {e}")
+    ready.set()
+
+if WARMUP:
+    threading.Thread(target=run_warmup, name="warmup", daemon=True).start()
+else:
+    ready.set()
+
+def before_fork():
+    """Stop background threads before a preloading server (gunicorn.conf.py) forks workers; fork copies no threads"""
+    zone_router.stop()
+    pricing_engine.close()
+
+def after_fork():
+    """Restart the background threads in a forked worker"""
+    zone_router.start()
+    pricing_engine.start_background()
+
+
+@app.route("/ready", methods=["GET"])
+def readiness():
+    body = {"ready": ready.is_set(), "startup_timings": pricing_engine.startup_timings}
+    return jsonify(body), (200 if ready.is_set() else 503)
+
+
+# Pricing payloads may leave out trip and user fields; these defaults fill them in
+PRICING_TRIP_WITH_DEFAULTS = PRICING_TRIP.with_defaults(
+    zone="downtown", ride_demand_level=4, traffic_level=3, weather_severity=2, traffic_blocks=3,
+    is_holiday=False, is_event_nearby=False
+)
+PRICING_USER_WITH_DEFAULTS = USER_PROFILE.with_defaults(loyalty_tier=4, price_sensitivity=0.95)
+RANKING_USER = Schema(UserProfile)
+DRIVER_PROFILE = Schema(DriverProfile)
+
+def parse_trip_request(trip_data, timestamp):
+    """Build a TripRequest for pricing, filling in defaults for missing fields"""
+    return PRICING_TRIP_WITH_DEFAULTS.decode(trip_data, "trip_request", timestamp=timestamp,
+                                             fare=0)  # Initialize with 0, will be calculated
+
+def parse_user_profile(profile_data):
+    """Build a UserProfile for pricing, filling in defaults for missing fields"""
+    return PRICING_USER_WITH_DEFAULTS.decode(profile_data, "user_profile")
 
 
 @app.route("/calculate_price", methods=["POST"])
@@ -23,25 +156,8 @@ def calculate_price():
     try:
         data = request.json
         
-        trip_request = TripRequest(
-            user_id=data['trip_request']['user_id'],
-            distance=data['trip_request']['distance'],
-            duration=data['trip_request']['duration'],
-            zone=data['trip_request'].get('zone', "downtown"),
-            timestamp=time.time(),
-            ride_demand_level=data['trip_request'].get('ride_demand_level', 4),
-            traffic_level=data['trip_request'].get('traffic_level', 3),
-            weather_severity=data['trip_request'].get('weather_severity', 2),
-            traffic_blocks=data['trip_request'].get('traffic_blocks', 3),
-            is_holiday=data['trip_request'].get('is_holiday', False),
-            is_event_nearby=data['trip_request'].get('is_event_nearby', False),
-            fare=0  # Initialize with 0, will be calculated
-        )
-
-        user_profile = UserProfile(
-            loyalty_tier=data['user_profile'].get('loyalty_tier', 4),
-            price_sensitivity=data['user_profile'].get('price_sensitivity', 0.95)
-        )
+        trip_request = parse_trip_request(data['trip_request'], time.time())
+        user_profile = parse_user_profile(data['user_profile'])
 
         price = pricing_engine.calculate_price(
             request=trip_request,
@@ -51,73 +167,206 @@ def calculate_price():
 
         return jsonify({"fare": price})
 
+    except CodecError as e:
+        return jsonify({"error": str(e)}), e.status
     except Exception as e:
         logger.error(f"Error calculating price: {e}")
         return jsonify({"error": str(e)}), 500
 
+@app.route("/calculate_price_batch", methods=["POST"])
+def calculate_price_batch():
+    """
+    Price many trips with a single model call.
+    Expects {"requests": [{"trip_request", "user_profile", "current_supply"}, ...], "seed": optional int}.
+    """
+    try:
+        data = request.json
+        if type(data) is not dict:
+            raise CodecError(f"expected an object, got {type(data).__name__}")
+        items, seed = data.get('requests', []), data.get('seed')
+        if type(items) is not list:
+            raise CodecError(f"requests: expected a list, got {type(items).__name__}")
+        if seed is not None and (type(seed) is not int or seed < 0):
+            raise CodecError(f"seed must be a non-negative int, got {seed!r}")
+        for i, item in enumerate(items):
+            if type(item) is not dict:
+                raise CodecError(f"requests[{i}]: expected an object, got {type(item).__name__}")
+            if type(item.get('current_supply', 20)) is not int:
+                raise CodecError(f"requests[{i}]: current_supply must be int, got {type(item['current_supply']).__name__}")
+        now = time.time()
+        trips = PRICING_TRIP_WITH_DEFAULTS.decode_many([item.get('trip_request') for item in items], "requests.trip_request",
+                                                       timestamp=now, fare=0)
+        users = PRICING_USER_WITH_DEFAULTS.decode_many([item.get('user_profile', {}) for item in items], "requests.user_profile")
+    except CodecError as e:
+        logger.error(f"Invalid batch pricing request: {e}")
+        return jsonify({"error": str(e)}), e.status
+
+    try:
+        fares = pricing_engine.calculate_price_batch(
+            requests=trips,
+            users=users,
+            current_supply=[item.get('current_supply', 20) for item in items],
+            seed=seed
+        )
+        return jsonify({"fares": fares})
+
+    except Exception as e:
+        logger.error(f"Error calculating batch prices: {e}")
+        return jsonify({"error": str(e)}), 500
+
+@app.route("/surge_events", methods=["POST"])
+def surge_events():
+    """
+    Feed supply/demand events into the streaming surge state.
+    Expects {"events": [{"type": "request_created" | "driver_online" | "driver_offline", "zone", "driver_id", "timestamp"}]}.
+    """
+    if pricing_engine.surge_state is None:
+        return jsonify({"error": "Surge streaming is disabled; start the service with TAXIMAX_SURGE_MODE=stream"}), 409
+    try:
+        applied = pricing_engine.surge_state.apply_events(request.json.get('events', []))
+        return jsonify({"applied": applied})
+    except (KeyError, ValueError) as e:
+        logger.error(f"Invalid surge event: {e}")
+        return jsonify({"error": str(e)}), 400
+
+@app.route("/record_trips", methods=["POST"])
+def record_trips():
+    """
+    Report booked trips; the demand forecaster is refit from these and the history CSV, never from quotes.
+    Expects {"trips": [{"zone", "timestamp", ...}]}; other trip request fields are ignored.
+    """
+    if config.demand_refresh_interval <= 0:
+        return jsonify({"error": "Demand refresh is disabled; set TAXIMAX_DEMAND_REFRESH_SECONDS"}), 409
+    try:
+        payload = request.json
+        if type(payload) is not dict:
+            raise CodecError(f"expected an object, got {type(payload).__name__}")
+        trips = BOOKED_TRIP.columns(payload.get('trips', []), "trips")
+        return jsonify({"recorded": pricing_engine.record_trips(zip(trips["zone"], trips["timestamp"]))})
+    except CodecError as e:
+        logger.error(f"Invalid booked trips: {e}")
+        return jsonify({"error": str(e)}), e.status
+
+@app.route("/surge", methods=["GET"])
+def surge():
+    zones = pricing_engine.surge_state.snapshot() if pricing_engine.surge_state is not None else {}
+    return jsonify({"surge_mode": config.surge_mode, "zones": zones})
+
+@app.route("/prediction_cache_stats", methods=["GET"])
+def prediction_cache_stats():
+    return jsonify({"prediction_cache": pricing_engine.cache_stats()})
+
+def score_to_json(score):
+    """Score breakdown of one ranked request"""
+    return {
+        "request_id": score.request_id,
+        "fare": score.fare,
+        "profit": score.profit,
+        "deadhead_distance": score.deadhead_distance,
+        "pickup_time": score.pickup_time,
+        "total_time": score.total_time,
+        "profit_per_minute": score.profit_per_minute,
+        "profit_per_mile": score.profit_per_mile,
+        "surge_factor": score.surge_factor,
+        "opportunity_cost": score.opportunity_cost,
+        "final_score": score.final_score,
+        "request": score.request  # Serialized by the JSON provider, no dict copy
+    }
+
 @app.route('/rank-requests', methods=['POST'])
 def rank_requests():
     """
     API endpoint to rank trip requests based on profitability.
     Expects JSON input with driver profile, user profiles, and trip requests.
+    With an optional "k", also returns the k best requests with their score breakdowns.
+    Repeated identical payloads are answered from the response cache (see the X-Cache header).
     """
+    if response_cache is None:
+        return rank_payload()
     try:
-        # Parse JSON input
         data = request.json
+        key = rank_cache_key(data)
+    except Exception:
+        return rank_payload()  # Malformed payloads get their error response uncached
+
+    def compute():
+        response = app.make_response(rank_payload(data))
+        return CachedResponse(response.get_data(), response.status_code, response.mimetype)
+
+    cached, source = response_cache.get_or_compute(key, compute)
+    response = app.response_class(cached.body, status=cached.status, mimetype=cached.content_type)
+    response.headers["X-Cache"] = source.upper()
+    return response
+
+def rank_cache_key(data):
+    """Cache key of a /rank-requests payload: the fields ranking reads (defaults filled in), the response
+    encoding, and the hour and zone graph the deadheads come from"""
+    payload = {
+        "driver_profile": data.get('driver_profile'),
+        "user_profiles": data.get('user_profiles', {}),
+        "rideRequests": data.get('rideRequests', []),
+        "current_supply": data.get('current_supply', 20),
+        "k": data.get('k')
+    }
+    return payload_key(payload, codec.prefers_msgpack(request.headers.get("Accept")), time.localtime().tm_hour, zone_router.version)
+
+def rank_payload(data=None):
+    """Rank a /rank-requests payload (the request body when `data` is None)"""
+    try:
+        # Parse JSON input
+        if data is None:
+            data = request.json
         
         # Extract driver profile
-        driver_data = data.get('driver_profile')
-        driver = DriverProfile(**driver_data)
+        driver = DRIVER_PROFILE.decode(data.get('driver_profile'), "driver_profile")
         
         # Extract user profiles
         user_profiles_data = data.get('user_profiles', {})
-        user_profiles = {
-            user_id: UserProfile(**profile_data)
-            for user_id, profile_data in user_profiles_data.items()
-        }
+        user_profiles = dict(zip(user_profiles_data, RANKING_USER.decode_many(list(user_profiles_data.values()), "user_profiles")))
         
-        # Extract trip requests
-        requests_data = data.get('rideRequests', [])
-        trip_requests = [
-            TripRequest(**request_data)
-            for request_data in requests_data
-        ]
+        # Validate trip requests straight into one compact array; only the returned ones become TripRequests
+        trip_requests = decode_request_array(data.get('rideRequests', []))
         
         # Extract current supply (optional, default to 20)
         current_supply = data.get('current_supply', 20)
         
-        # Rank requests and get the best one
-        best_request = evaluator.rank_requests(trip_requests, driver, user_profiles, current_supply)
+        # Number of alternatives to return (optional)
+        k = data.get('k')
+        if k is not None and (not isinstance(k, int) or isinstance(k, bool) or k < 1):
+            return jsonify({
+                "status": "error",
+                "message": "k must be a positive integer"
+            }), 400
+        
+        if k is None:
+            # Rank requests and get the best one
+            best_request = evaluator.rank_requests(trip_requests, driver, user_profiles, current_supply)
+            top_requests = [best_request] if best_request else []
+        else:
+            top_requests = evaluator.get_top_requests(trip_requests, driver, user_profiles, current_supply, k)
         
-        if best_request:
-            # Convert best request to JSON-friendly format
-            ranked_requests_json = {
-
-                "request_id": best_request.request_id,
-                "fare": best_request.fare,
-                "profit": best_request.profit,
-                "deadhead_distance": best_request.deadhead_distance,
-                "pickup_time": best_request.pickup_time,
-                "total_time": best_request.total_time,
-                "profit_per_minute": best_request.profit_per_minute,
-                "profit_per_mile": best_request.profit_per_mile,
-                "surge_factor": best_request.surge_factor,
-                "opportunity_cost": best_request.opportunity_cost,
-                "final_score": best_request.final_score,
-                "request": asdict(best_request.request)  # Convert TripRequest to dict
+        if top_requests:
+            response = {
+                "status": "success",
+                "optimised_rideid": top_requests[0].request_id
             }
+            if k is not None:
+                response["top_requests"] = top_requests  # RequestScores serialize in the score_to_json layout
             
             # Return ranked requests as JSON
-            return jsonify({
-                "status": "success",
-                "optimised_rideid": ranked_requests_json["request_id"]  # Fixed: Use dictionary access
-            })
+            return jsonify(response)
         else:
             return jsonify({
                 "status": "no_suitable_requests",
                 "message": "No suitable requests found."
             })
     
+    except CodecError as e:
+        logger.error(f"Invalid rank request: {e}")
+        return jsonify({
+            "status": "error",
+            "message": str(e)
+        }), e.status
     except Exception as e:
         logger.error(f"Error processing request: {e}")
         return jsonify({
@@ -125,5 +374,327 @@ def rank_requests():
             "message": str(e)
         }), 500
 
+@app.route("/response_cache_stats", methods=["GET"])
+def response_cache_stats():
+    return jsonify({"response_cache": response_cache.stats() if response_cache is not None else None})
+
+@app.route('/assign', methods=['POST'])
+def assign():
+    """
+    API endpoint to assign open trip requests across a fleet in one tick.
+    Expects JSON input with "drivers" (driver profiles, each with a "driver_id") and "rideRequests".
+    Optional "method" ("auto", "optimal" or "greedy") and "candidates_per_driver".
+    """
+    try:
+        data = request.json
+
+        drivers_data = data.get('drivers', [])
+        driver_ids = [driver_data.get('driver_id', i) for i, driver_data in enumerate(drivers_data)]
+        drivers = DRIVER_PROFILE.decode_many(
+            [{key: value for key, value in driver_data.items() if key != 'driver_id'} for driver_data in drivers_data],
+            "drivers"
+        )
+        trip_requests = TRIP_REQUEST.decode_many(data.get('rideRequests', []), "rideRequests")
+
+        method = data.get('method', 'auto')
+        if method not in ('auto', 'optimal', 'greedy'):
+            return jsonify({
+                "status": "error",
+                "message": "method must be one of auto, optimal, greedy"
+            }), 400
+        candidates_per_driver = data.get('candidates_per_driver', fleet_assigner.candidates_per_driver)
+        if not isinstance(candidates_per_driver, int) or isinstance(candidates_per_driver, bool) or candidates_per_driver < 1:
+            return jsonify({
+                "status": "error",
+                "message": "candidates_per_driver must be a positive integer"
+            }), 400
+
+        assigner = fleet_assigner
+        if candidates_per_driver != fleet_assigner.candidates_per_driver:
+            assigner = FleetAssigner(evaluator, candidates_per_driver, fleet_assigner.greedy_above_edges)
+        result = assigner.assign(drivers, trip_requests, method)
+
+        return jsonify({
+            "status": "success",
+            "method": result.method,
+            "assignments": [
+                {"driver_id": driver_ids[driver_index], **score_to_json(score)}
+                for driver_index, score in result.assignments
+            ],
+            "unassigned_drivers": [driver_ids[i] for i in result.unassigned_drivers],
+            "total_score": result.total_score,
+            "timings_ms": result.timings_ms
+        })
+
+    except CodecError as e:
+        logger.error(f"Invalid assignment request: {e}")
+        return jsonify({
+            "status": "error",
+            "message": str(e)
+        }), e.status
+    except Exception as e:
+        logger.error(f"Error processing assignment: {e}")
+        return jsonify({
+            "status": "error",
+            "message": str(e)
+        }), 500
+
+@app.route('/plan-shift', methods=['POST'])
+def plan_shift():
+    """
+    API endpoint to plan the best chain of trips for the rest of a driver's shift.
+    Expects JSON input with driver profile and trip requests (optionally with "dropoff_zone").
+    Optional "budget_ms" caps the search time for this call.
+    """
+    try:
+        data = request.json
+
+        driver = DRIVER_PROFILE.decode(data.get('driver_profile'), "driver_profile")
+        trip_requests = decode_request_array(data.get('rideRequests', []))
+
+        budget_ms = data.get('budget_ms')
+        if budget_ms is not None and (not isinstance(budget_ms, (int, float)) or isinstance(budget_ms, bool) or budget_ms <= 0):
+            return jsonify({
+                "status": "error",
+                "message": "budget_ms must be a positive number"
+            }), 400
+
+        plan = shift_planner.plan(trip_requests, driver, budget_ms)
+        if not plan.requests:
+            return jsonify({
+                "status": "no_suitable_requests",
+                "message": "No trip fits in the remaining shift."
+            })
+
+        return jsonify({
+            "status": "success",
+            "optimised_rideid": plan.next_request.rideId,
+            "plan": [trip.rideId for trip in plan.requests],
+            "total_profit": plan.total_profit,
+            "total_minutes": plan.total_minutes,
+            "complete": plan.complete,
+            "elapsed_ms": plan.elapsed_ms
+        })
+
+    except CodecError as e:
+        logger.error(f"Invalid shift plan request: {e}")
+        return jsonify({
+            "status": "error",
+            "message": str(e)
+        }), e.status
+    except Exception as e:
+        logger.error(f"Error planning shift: {e}")
+        return jsonify({
+            "status": "error",
+            "message": str(e)
+        }), 500
+
+@app.route('/weight-sweep', methods=['POST'])
+def weight_sweep():
+    """
+    API endpoint to rank recorded scenarios under many candidate score weightings at once.
+    Expects JSON input with "scenarios" (each with driver_profile and rideRequests) and
+    "weight_sets" (dicts over the score metrics; missing metrics keep the current weights).
+    Optional "k" (default 1) is the number of top requests returned per weight set.
+    """
+    try:
+        data = request.json
+
+        weight_sets = data.get('weight_sets', [])
+        if not weight_sets:
+            return jsonify({
+                "status": "error",
+                "message": "weight_sets must be a non-empty list"
+            }), 400
+        k = data.get('k', 1)
+        if not isinstance(k, int) or isinstance(k, bool) or k < 1:
+            return jsonify({
+                "status": "error",
+                "message": "k must be a positive integer"
+            }), 400
+
+        scenarios = [
+            (
+                TRIP_REQUEST.decode_many(scenario.get('rideRequests', []), "rideRequests"),
+                DRIVER_PROFILE.decode(scenario['driver_profile'], "driver_profile")
+            )
+            for scenario in data.get('scenarios', [])
+        ]
+
+        start = time.perf_counter()
+        sweeps = evaluator.sweep_weights(scenarios, weight_sets, k)
+        elapsed_ms = (time.perf_counter() - start) * 1000
+
+        weights = evaluator.weight_matrix(weight_sets)
+        return jsonify({
+            "status": "success",
+            "metrics": list(SCORE_METRICS),
+            "weight_sets": [dict(zip(SCORE_METRICS, column)) for column in weights.T.tolist()],
+            "results": [
+                {"top_requests": sweep.top_request_ids(), "top_scores": sweep.top_scores()}
+                for sweep in sweeps
+            ],
+            "elapsed_ms": elapsed_ms
+        })
+
+    except ValueError as e:
+        logger.error(f"Invalid weight sweep: {e}")
+        return jsonify({
+            "status": "error",
+            "message": str(e)
+        }), 400
+    except Exception as e:
+        logger.error(f"Error processing weight sweep: {e}")
+        return jsonify({
+            "status": "error",
+            "message": str(e)
+        }), 500
+
+def server_workers():
+    """Processes serving the app; gunicorn.conf.py sets TAXIMAX_WORKERS in every worker"""
+    return int(os.environ.get("TAXIMAX_WORKERS", "1"))
+
+@app.before_request
+def pool_single_process():
+    """The pool lives in one process's memory: with several workers each would see only the requests and drivers
+    sent to it, so /pool endpoints refuse to run instead of answering from a partial pool"""
+    if request.path.startswith("/pool/") and server_workers() > 1:
+        return jsonify({
+            "status": "error",
+            "message": f"The request pool needs a single worker process, this server runs {server_workers()} (TAXIMAX_WORKERS)"
+        }), 503
+
+@app.route('/pool/requests', methods=['POST'])
+def pool_add_requests():
+    """
+    Add open trip requests to the pool (replacing any with the same rideId).
+    Expects {"rideRequests": [...], "ttl_seconds": optional}.
+    """
+    try:
+        data = request.json
+        trip_requests = TRIP_REQUEST.decode_many(data.get('rideRequests', []), "rideRequests")
+        added = request_pool.add_requests(trip_requests, data.get('ttl_seconds'))
+        return jsonify({"status": "success", "added": added})
+    except (TypeError, ValueError) as e:
+        logger.error(f"Invalid pool requests: {e}")
+        return jsonify({"status": "error", "message": str(e)}), 400
+
+@app.route('/pool/requests/remove', methods=['POST'])
+def pool_remove_requests():
+    """Remove taken or cancelled requests. Expects {"rideIds": [...]}"""
+    removed = request_pool.remove_requests(request.json.get('rideIds', []))
+    return jsonify({"status": "success", "removed": removed})
+
+@app.route('/pool/drivers/<driver_id>', methods=['PUT'])
+def pool_update_driver(driver_id):
+    """Register a driver or update its state; expects a driver profile"""
+    try:
+        request_pool.update_driver(driver_id, DRIVER_PROFILE.decode(request.json, "driver_profile"))
+        return jsonify({"status": "success", "driver_id": driver_id})
+    except (TypeError, CodecError) as e:
+        logger.error(f"Invalid driver profile: {e}")
+        return jsonify({"status": "error", "message": str(e)}), 400
+
+@app.route('/pool/drivers/<driver_id>', methods=['DELETE'])
+def pool_remove_driver(driver_id):
+    if not request_pool.remove_driver(driver_id):
+        return jsonify({"status": "error", "message": f"Unknown driver {driver_id}"}), 404
+    return jsonify({"status": "success", "driver_id": driver_id})
+
+@app.route('/pool/drivers/<driver_id>/best', methods=['GET'])
+def pool_best_requests(driver_id):
+    """
+    The driver's best open requests from the pool, in the /rank-requests response format.
+    Optional query parameter k (default 1).
+    """
+    k = request.args.get('k', 1, type=int)
+    if k is None or k < 1:
+        return jsonify({"status": "error", "message": "k must be a positive integer"}), 400
+    try:
+        top_requests = request_pool.best(driver_id, k)
+    except KeyError:
+        return jsonify({"status": "error", "message": f"Unknown driver {driver_id}"}), 404
+    return jsonify(best_response(top_requests))
+
+def best_response(top_requests):
+    if not top_requests:
+        return {"status": "no_suitable_requests", "message": "No suitable requests found."}
+    return {
+        "status": "success",
+        "optimised_rideid": top_requests[0].request_id,
+        "top_requests": top_requests
+    }
+
+# Open /pool/drivers/<driver_id>/stream connections
+stream_subscribers = 0
+stream_lock = threading.Lock()
+
+@app.route('/pool/drivers/<driver_id>/stream', methods=['GET', 'POST'])
+def pool_stream(driver_id):
+    """
+    Server-sent events with the driver's best open requests from the pool, pushed only when they change.
+    POST registers (or updates) the driver with a driver profile body first; GET streams a registered driver.
+    Optional query parameter k (default 1). Each "top_requests" event carries the /pool/drivers/<driver_id>/best
+    response; a "driver_removed" event ends the stream. Requests and driver state change through the other
+    /pool endpoints. At most TAXIMAX_MAX_STREAMS streams are open at once, each holding a server thread.
+    """
+    k = request.args.get('k', 1, type=int)
+    if k is None or k < 1:
+        return jsonify({"status": "error", "message": "k must be a positive integer"}), 400
+    if request.method == 'POST':
+        try:
+            request_pool.update_driver(driver_id, DRIVER_PROFILE.decode(request.json, "driver_profile"))
+        except CodecError as e:
+            logger.error(f"Invalid driver profile: {e}")
+            return jsonify({"status": "error", "message": str(e)}), e.status
+    try:
+        request_pool.top(driver_id, k)
+    except KeyError:
+        return jsonify({"status": "error", "message": f"Unknown driver {driver_id}"}), 404
+    global stream_subscribers
+    with stream_lock:
+        if stream_subscribers >= MAX_STREAMS:
+            return jsonify({"status": "error", "message": f"Too many open streams (limit {MAX_STREAMS})"}), 503
+        stream_subscribers += 1
+    response = app.response_class(stream_events(driver_id, k), mimetype="text/event-stream",
+                                  headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+    # The server closes the response when the client leaves, whether or not the stream ever started
+    response.call_on_close(release_stream)
+    return response
+
+def release_stream():
+    global stream_subscribers
+    with stream_lock:
+        stream_subscribers -= 1
+
+def stream_events(driver_id, k):
+    """Wait for pool changes and send an event whenever the driver's top-k ride ids change.
+
+    Waits time out every second so expired requests and hour changes are
+    noticed without other traffic; a comment line keeps idle connections open.
+    """
+    version, sent, last_write = -1, None, time.monotonic()
+    try:
+        yield b"retry: 2000\n\n"  # Reconnect delay for EventSource clients, e.g. after a server restart
+        while True:
+            version = request_pool.wait_for_change(version, 1.0)
+            ride_ids = [ride_id for ride_id, _ in request_pool.top(driver_id, k)]
+            if ride_ids != sent:
+                top_requests = request_pool.best(driver_id, k)
+                sent = [score.request_id for score in top_requests]
+                yield b"event: top_requests\nid: %d\ndata: %s\n\n" % (version, codec.dumps(best_response(top_requests)))
+                last_write = time.monotonic()
+            elif time.monotonic() - last_write > STREAM_HEARTBEAT_SECONDS:
+                yield b": keep-alive\n\n"
+                last_write = time.monotonic()
+    except KeyError:  # The driver was removed from the pool
+        yield b"event: driver_removed\ndata: %s\n\n" % codec.dumps({"driver_id": driver_id})
+
+@app.route('/pool/stats', methods=['GET'])
+def pool_stats():
+    """Pool counters plus open streams; every stream holds a server thread and wakes on each pool change"""
+    return jsonify({**request_pool.stats(), "streams": stream_subscribers, "max_streams": MAX_STREAMS})
+
 if __name__ == '__main__':
+    # Development server; in production: gunicorn -c gunicorn.conf.py appV2:app
     app.run(debug=True, port=8003)
\ No newline at end of file
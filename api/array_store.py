@@ -0,0 +1,81 @@
+import os
+import json
+import struct
+import hashlib
+import numpy as np
+from typing import Dict, Tuple
+
+# File layout: MAGIC | uint64 header length | JSON header | aligned raw arrays.
+# The header holds caller metadata plus dtype/shape/offset for each array, so
+# arrays can be opened as read-only memory maps without copying.
+MAGIC = b"TMXARR01"
+ALIGNMENT = 64
+
+
+def _aligned(offset: int) -> int:
+    return (offset + ALIGNMENT - 1) // ALIGNMENT * ALIGNMENT
+
+
+def file_fingerprint(path: str) -> str:
+    """Short content hash used to tie derived files to the model they came from"""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            digest.update(chunk)
+    return digest.hexdigest()[:16]
+
+
+def save_arrays(path: str, arrays: Dict[str, np.ndarray], meta: dict):
+    """Write arrays and metadata atomically (temp file + rename)"""
+    arrays = {name: np.ascontiguousarray(array) for name, array in arrays.items()}
+
+    # Offsets depend on the header length, so lay the header out until it is stable
+    entries, data_start = {}, 0
+    while True:
+        offset = data_start
+        for name, array in arrays.items():
+            entries[name] = {"dtype": array.dtype.str, "shape": list(array.shape), "offset": offset}
+            offset = _aligned(offset + array.nbytes)
+        header = json.dumps({"meta": meta, "arrays": entries}).encode()
+        needed = _aligned(len(MAGIC) + 8 + len(header))
+        if needed == data_start:
+            break
+        data_start = needed
+
+    tmp_path = f"{path}.tmp{os.getpid()}"
+    with open(tmp_path, "wb") as f:
+        f.write(MAGIC)
+        f.write(struct.pack("<Q", len(header)))
+        f.write(header)
+        for name, array in arrays.items():
+            f.write(b"\0" * (entries[name]["offset"] - f.tell()))
+            f.write(array.tobytes())
+    os.replace(tmp_path, path)
+
+
+def read_meta(path: str) -> dict:
+    """Read only the metadata of an array file"""
+    return _read_header(path)["meta"]
+
+
+def _read_header(path: str) -> dict:
+    with open(path, "rb") as f:
+        if f.read(len(MAGIC)) != MAGIC:
+            raise ValueError(f"{path} is not an array store file")
+        (length,) = struct.unpack("<Q", f.read(8))
+        return json.loads(f.read(length))
+
+
+def load_arrays(path: str, mmap: bool = True) -> Tuple[dict, Dict[str, np.ndarray]]:
+    """Load metadata and arrays; with mmap=True arrays are read-only views of the file"""
+    header = _read_header(path)
+    arrays = {}
+    for name, entry in header["arrays"].items():
+        dtype, shape = np.dtype(entry["dtype"]), tuple(entry["shape"])
+        if mmap and int(np.prod(shape)) > 0:
+            arrays[name] = np.memmap(path, dtype=dtype, mode="r", offset=entry["offset"], shape=shape)
+        else:
+            with open(path, "rb") as f:
+                f.seek(entry["offset"])
+                arrays[name] = np.fromfile(f, dtype=dtype, count=int(np.prod(shape))).reshape(shape)
+    return header["meta"], arrays
@@ -9,6 +9,9 @@ from sklearn.ensemble import RandomForestRegressor
 from sklearn.metrics import mean_squared_error, r2_score
 import joblib  # For saving the model
 import logging
+import os
+from array_store import file_fingerprint
+from compiled_forest import CompiledForest
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
@@ -45,6 +48,15 @@ def preprocess_data(df):
     # Clean the data first
     df = clean_data(df)
     
+    df = engineer_features(df)
+    
+    logger.info("Data preprocessing completed.")
+    return df
+
+def engineer_features(df):
+    """Derive the model features from raw trip columns."""
+    df = df.copy()
+    
     # Feature engineering
     df['hour_of_day'] = df['time_of_day']
     
@@ -69,7 +81,6 @@ def preprocess_data(df):
     # Drop unnecessary columns
     df = df.drop(['time_of_day', 'weather_condition', 'traffic_blocks', 'holiday', 'event_nearby'], axis=1)
     
-    logger.info("Data preprocessing completed.")
     return df
 
 # Build the model pipeline
@@ -161,6 +172,16 @@ def save_model(model, filename):
     logger.info(f"Saving the model as {filename}...")
     joblib.dump(model, filename)
     logger.info(f"Model saved as {filename}")
+    
+    # Fast-loading artifact next to the joblib file: flat forest arrays that
+    # PricingEngine memory-maps without unpickling or importing sklearn
+    artifact = artifact_path(filename)
+    CompiledForest.from_pipeline(model).save(artifact, file_fingerprint(filename))
+    logger.info(f"Fast-loading artifact saved as {artifact}")
+
+def artifact_path(filename):
+    """Path of the fast-loading artifact written next to a joblib model"""
+    return os.path.splitext(filename)[0] + ".forest"
 
 # Main function
 def main():
@@ -0,0 +1,296 @@
+import json
+from dataclasses import MISSING, fields, is_dataclass
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple, Union, get_args, get_origin, get_type_hints
+import numpy as np
+from pricing_engine import TripRequest, UserProfile
+from compact import INT_BOUNDS, RequestArray
+
+# orjson (and MessagePack) when installed; the standard library otherwise
+try:
+    import orjson
+except ImportError:
+    orjson = None
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+JSON = "application/json"
+MSGPACK = "application/msgpack"
+MSGPACK_TYPES = frozenset({"application/msgpack", "application/x-msgpack", "application/vnd.msgpack"})
+
+
+class CodecError(ValueError):
+    """A payload that cannot be decoded or does not match its schema"""
+
+    def __init__(self, message: str, status: int = 400):
+        super().__init__(message)
+        self.status = status
+
+
+def _plain(obj):
+    """Fallback for types the encoders don't know: dataclasses one level deep, NumPy values as Python ones"""
+    if is_dataclass(obj) and not isinstance(obj, type):
+        return {f.name: getattr(obj, f.name) for f in fields(obj)}
+    if isinstance(obj, np.ndarray):
+        return obj.tolist()
+    if isinstance(obj, np.generic):
+        return obj.item()
+    raise TypeError(f"Object of type {type(obj).__name__} is not serializable")
+
+
+if orjson is not None:
+    _ORJSON_OPTIONS = orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_NON_STR_KEYS
+
+    def dumps(obj) -> bytes:
+        """Compact JSON; dataclasses (slotted ones included) are written directly, without a dict copy"""
+        return orjson.dumps(obj, default=_plain, option=_ORJSON_OPTIONS)
+
+    loads = orjson.loads
+
+    def canonical_dumps(obj) -> bytes:
+        """JSON with sorted keys, so equal payloads give equal bytes"""
+        return orjson.dumps(obj, default=_plain, option=_ORJSON_OPTIONS | orjson.OPT_SORT_KEYS)
+else:
+    def dumps(obj) -> bytes:
+        """Compact JSON; dataclasses (slotted ones included) are written directly, without a dict copy"""
+        return json.dumps(obj, default=_plain, separators=(",", ":")).encode()
+
+    def loads(data):
+        return json.loads(data)
+
+    def canonical_dumps(obj) -> bytes:
+        """JSON with sorted keys, so equal payloads give equal bytes"""
+        return json.dumps(obj, default=_plain, separators=(",", ":"), sort_keys=True).encode()
+
+
+def is_msgpack(content_type: Optional[str]) -> bool:
+    return bool(content_type) and content_type.split(";", 1)[0].strip().lower() in MSGPACK_TYPES
+
+
+def prefers_msgpack(accept: Optional[str]) -> bool:
+    """Whether an Accept header lists MessagePack before JSON (and MessagePack can be written)"""
+    if msgpack is None or not accept:
+        return False
+    for media_range in accept.split(","):
+        media_type, *params = media_range.split(";")
+        media_type = media_type.strip().lower()
+        if any(param.replace(" ", "") in ("q=0", "q=0.0", "q=0.00", "q=0.000") for param in params):
+            continue  # Explicitly refused
+        if media_type in MSGPACK_TYPES:
+            return True
+        if media_type in (JSON, "application/*", "*/*"):
+            return False
+    return False
+
+
+def decode(body: bytes, content_type: Optional[str] = None):
+    """Parse a request body: MessagePack when the content type says so, JSON otherwise"""
+    if is_msgpack(content_type):
+        if msgpack is None:
+            raise CodecError("MessagePack payloads are not supported (msgpack is not installed)", status=415)
+        try:
+            return msgpack.unpackb(body, raw=False)
+        except Exception as e:
+            raise CodecError(f"Invalid MessagePack payload: {e}")
+    try:
+        return loads(body)
+    except ValueError as e:
+        raise CodecError(f"Invalid JSON payload: {e}")
+
+
+def encode(obj, accept: Optional[str] = None) -> Tuple[bytes, str]:
+    """Serialize a response body and its content type: MessagePack when the client prefers it, JSON otherwise"""
+    if prefers_msgpack(accept):
+        return msgpack.packb(obj, default=_plain), MSGPACK
+    return dumps(obj), JSON
+
+
+# Accepted Python types per annotated type; values of any other type go through Schema._coerce
+_ACCEPTED = {float: frozenset({float, int}), int: frozenset({int}), str: frozenset({str}), bool: frozenset({bool})}
+
+
+class Schema:
+    """Field names and types of an internal dataclass, for decoding payloads straight into it.
+
+    Values are checked by exact type, a column at a time for lists of rows,
+    so a valid payload costs a few set operations per field. Ints are
+    accepted for floats, integral floats for ints and 0/1 for bools; None
+    only where the field is Optional or defaults to None. Missing fields take
+    `defaults` (or the dataclass defaults); unknown fields raise unless
+    `ignore_unknown` is set. Numbers outside a field's (low, high) `bounds`
+    are rejected.
+    """
+
+    def __init__(self, cls, names: Optional[Sequence[str]] = None, required: Optional[Iterable[str]] = None,
+                 defaults: Optional[Dict[str, Any]] = None, ignore_unknown: bool = False,
+                 bounds: Optional[Dict[str, Tuple[float, float]]] = None):
+        hints = get_type_hints(cls)
+        declared = {f.name: f for f in fields(cls)}
+        self.cls = cls
+        self.names = tuple(names or declared)
+        self.defaults = dict(defaults or {})
+        self.ignore_unknown = ignore_unknown
+        self.bounds = {name: limits for name, limits in (bounds or {}).items() if name in declared}
+        self.kinds = {}  # name -> (accepted types, annotated type)
+        for name in self.names:
+            kind, nullable = hints[name], declared[name].default is None
+            if get_origin(kind) is Union:
+                nullable = nullable or type(None) in get_args(kind)
+                kind = next(arg for arg in get_args(kind) if arg is not type(None))
+            self.kinds[name] = (_ACCEPTED[kind] | {type(None)} if nullable else _ACCEPTED[kind], kind)
+        if required is None:
+            required = (name for name in self.names
+                        if declared[name].default is MISSING and declared[name].default_factory is MISSING)
+        self.required = frozenset(required) - self.defaults.keys()
+        # Value of each field a row leaves out
+        self.fill = {name: self.defaults.get(name, None if declared[name].default is MISSING else declared[name].default)
+                     for name in self.names}
+
+    def with_defaults(self, **defaults) -> "Schema":
+        """The same fields, with these missing ones filled in instead of rejected"""
+        return Schema(self.cls, self.names, self.required - defaults.keys(), {**self.defaults, **defaults},
+                      self.ignore_unknown, self.bounds)
+
+    def check(self, row) -> Dict[str, Any]:
+        """Validated keyword arguments for the dataclass, defaults included"""
+        if type(row) is not dict:
+            raise CodecError(f"expected an object, got {type(row).__name__}")
+        missing = self.required - row.keys()
+        if missing:
+            raise CodecError(f"missing fields {sorted(missing)}")
+        values = dict(self.defaults) if self.defaults else {}
+        kinds = self.kinds
+        for name, value in row.items():
+            kind = kinds.get(name)
+            if kind is None:
+                if self.ignore_unknown:
+                    continue
+                raise CodecError(f"unexpected field {name!r}")
+            if type(value) not in kind[0]:
+                value = self._coerce(name, value, kind[1])
+            if name in self.bounds and value is not None:
+                self._check_bounds(name, value)
+            values[name] = value
+        return values
+
+    def columns(self, rows, where: str = "") -> Dict[str, List]:
+        """Validated rows as one list per field, with missing fields filled in"""
+        where = where or self.cls.__name__
+        if type(rows) is not list:
+            raise CodecError(f"{where}: expected a list, got {type(rows).__name__}")
+        required, known = self.required, self.kinds.keys()
+        for i, row in enumerate(rows):
+            if type(row) is not dict or not required <= row.keys() or not (self.ignore_unknown or row.keys() <= known):
+                try:
+                    self.check(row)
+                except CodecError as e:
+                    raise CodecError(f"{where}[{i}]: {e}")
+        columns = {}
+        for name, (accepted, kind) in self.kinds.items():
+            fill = self.fill[name]
+            column = [row.get(name, fill) for row in rows]
+            if not set(map(type, column)) <= accepted:
+                for i, value in enumerate(column):
+                    if type(value) not in accepted:
+                        try:
+                            column[i] = self._coerce(name, value, kind)
+                        except CodecError as e:
+                            raise CodecError(f"{where}[{i}]: {e}")
+            if name in self.bounds:
+                low, high = self.bounds[name]
+                present = [value for value in column if value is not None]
+                if present and (min(present) < low or max(present) > high):
+                    for i, value in enumerate(column):
+                        try:
+                            if value is not None:
+                                self._check_bounds(name, value)
+                        except CodecError as e:
+                            raise CodecError(f"{where}[{i}]: {e}")
+            columns[name] = column
+        return columns
+
+    def _check_bounds(self, name: str, value):
+        low, high = self.bounds[name]
+        if not low <= value <= high:
+            raise CodecError(f"field {name!r} must be between {low} and {high}, got {value}")
+
+    @staticmethod
+    def _coerce(name: str, value, kind: type):
+        if kind is int and type(value) is float and value.is_integer():
+            return int(value)
+        if kind is bool and type(value) is int and value in (0, 1):
+            return bool(value)
+        raise CodecError(f"field {name!r} must be {kind.__name__}, got {type(value).__name__}")
+
+    def decode(self, row, where: str = "", **fixed):
+        """One dataclass instance; `fixed` fields are set by the server and never read from the row"""
+        try:
+            return self.cls(**self.check(row), **fixed)
+        except CodecError as e:
+            raise CodecError(f"{where or self.cls.__name__}: {e}")
+
+    def decode_many(self, rows, where: str = "", **fixed) -> List:
+        columns = self.columns(rows, where)
+        cls, names = self.cls, tuple(columns)
+        return [cls(**dict(zip(names, values)), **fixed) for values in zip(*columns.values())]
+
+
+# Schemas shared by app.py and appV2.py. Ranking takes full trip requests; pricing
+# takes the trip fields the model reads (timestamp is set by the server) and ignores others.
+# Integer fields are limited to what their packed RequestArray column holds.
+TRIP_REQUEST = Schema(TripRequest, bounds=INT_BOUNDS)
+PRICING_TRIP = Schema(TripRequest, names=("user_id", "distance", "duration", "zone", "ride_demand_level", "traffic_level",
+                                          "weather_severity", "traffic_blocks", "is_holiday", "is_event_nearby"),
+                      ignore_unknown=True, bounds=INT_BOUNDS)
+USER_PROFILE = Schema(UserProfile, required=("loyalty_tier", "price_sensitivity"), ignore_unknown=True)
+# Booked trips reported for demand forecasting; a full trip request is accepted and only these fields are read
+BOOKED_TRIP = Schema(TripRequest, names=("zone", "timestamp"), ignore_unknown=True)
+
+
+def decode_request_array(rows, where: str = "rideRequests") -> RequestArray:
+    """Validated trip requests straight into a compact RequestArray, without creating TripRequests"""
+    columns = TRIP_REQUEST.columns(rows, where)
+    try:
+        return RequestArray.from_columns(columns)
+    except OverflowError as e:
+        raise CodecError(f"{where}: {e}")
+
+if __name__ == "__main__":
+    import argparse
+    import random
+    import time
+    from dataclasses import asdict
+
+    parser = argparse.ArgumentParser(description="Time decoding and encoding of a rank-requests payload")
+    parser.add_argument("--rides", type=int, default=500)
+    parser.add_argument("--repeat", type=int, default=200)
+    args = parser.parse_args()
+
+    rng = random.Random(0)
+    rides = [
+        {"user_id": f"user{i}", "distance": rng.uniform(1, 20), "duration": rng.uniform(5, 60), "zone": "downtown",
+         "timestamp": 1700000000 + i, "ride_demand_level": 3, "traffic_level": 2, "weather_severity": 0, "traffic_blocks": 1,
+         "is_holiday": False, "is_event_nearby": False, "fare": rng.uniform(50, 400), "rideId": i}
+        for i in range(args.rides)
+    ]
+    body = json.dumps({"rideRequests": rides}).encode()
+    requests = [TripRequest(**ride) for ride in rides]
+
+    def timed(name, fn):
+        fn()
+        start = time.perf_counter()
+        for _ in range(args.repeat):
+            fn()
+        print(f"{name:<40} {(time.perf_counter() - start) / args.repeat * 1000:8.3f} ms")
+
+    print(f"{args.rides} rides, orjson {'on' if orjson else 'off'}, msgpack {'on' if msgpack else 'off'}")
+    timed("json.loads + TripRequest(**)", lambda: [TripRequest(**ride) for ride in json.loads(body)["rideRequests"]])
+    timed("decode + TRIP_REQUEST.decode_many", lambda: TRIP_REQUEST.decode_many(decode(body)["rideRequests"]))
+    timed("json.loads + RequestArray.from_dicts", lambda: RequestArray.from_dicts(json.loads(body)["rideRequests"]))
+    timed("decode + decode_request_array", lambda: decode_request_array(decode(body)["rideRequests"]))
+    timed("json.dumps(asdict(...))", lambda: json.dumps([asdict(request) for request in requests]).encode())
+    timed("dumps (dataclasses directly)", lambda: dumps(requests))
+    if msgpack is not None:
+        packed = msgpack.packb({"rideRequests": rides})
+        timed("decode MessagePack + decode_request_array", lambda: decode_request_array(decode(packed, MSGPACK)["rideRequests"]))
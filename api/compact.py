@@ -0,0 +1,323 @@
+import numpy as np
+from dataclasses import MISSING, fields
+from typing import Dict, Iterable, List, Optional, Sequence
+from pricing_engine import TripRequest
+
+# Sentinel for a missing rideId in the int64 ride_id column
+NO_RIDE_ID = np.iinfo(np.int64).min
+
+# One packed record per request, 73 bytes. user_id and the zones are stored as
+# indices into the container's string tables; missing fares and coordinates are NaN.
+REQUEST_DTYPE = np.dtype([
+    ("user", np.int32),
+    ("distance", np.float64),
+    ("duration", np.float64),
+    ("zone", np.int16),
+    ("timestamp", np.float64),
+    ("ride_demand_level", np.int16),
+    ("traffic_level", np.int16),
+    ("weather_severity", np.int8),
+    ("traffic_blocks", np.int16),
+    ("is_holiday", np.bool_),
+    ("is_event_nearby", np.bool_),
+    ("fare", np.float64),
+    ("ride_id", np.int64),
+    ("pickup_lat", np.float64),
+    ("pickup_lon", np.float64),
+    ("dropoff_zone", np.int16),  # -1 when unknown
+])
+
+# Score metrics in RequestScore order; the request is referenced by its index in a RequestArray
+SCORE_FIELDS = ("fare", "profit", "deadhead_distance", "pickup_time", "total_time", "profit_per_minute",
+                "profit_per_mile", "surge_factor", "opportunity_cost", "final_score")
+SCORE_DTYPE = np.dtype([("request", np.int64), ("ride_id", np.int64)] + [(name, np.float64) for name in SCORE_FIELDS])
+
+# Values the integer TripRequest fields can take once packed; rideId leaves out the missing-id sentinel
+INT_BOUNDS = {name: (int(np.iinfo(REQUEST_DTYPE[name]).min), int(np.iinfo(REQUEST_DTYPE[name]).max))
+              for name in ("ride_demand_level", "traffic_level", "weather_severity", "traffic_blocks")}
+INT_BOUNDS["rideId"] = (int(NO_RIDE_ID) + 1, int(np.iinfo(np.int64).max))
+
+TRIP_FIELDS = tuple(f.name for f in fields(TripRequest))
+REQUIRED_FIELDS = frozenset(f.name for f in fields(TripRequest) if f.default is MISSING and f.default_factory is MISSING)
+# TripRequest fields stored unchanged under the same name
+PLAIN_FIELDS = ("distance", "duration", "timestamp", "ride_demand_level", "traffic_level", "weather_severity",
+                "traffic_blocks", "is_holiday", "is_event_nearby")
+
+
+class StringTable:
+    """Interned strings with stable integer codes"""
+
+    def __init__(self, values: Sequence[str] = ()):
+        self.values: List[str] = []
+        self.codes: Dict[str, int] = {}
+        for value in values:
+            self.code(value)
+
+    def code(self, value: str) -> int:
+        code = self.codes.get(value)
+        if code is None:
+            code = self.codes[value] = len(self.values)
+            self.values.append(value)
+        return code
+
+    def __len__(self) -> int:
+        return len(self.values)
+
+
+def _optional(values: np.ndarray, missing) -> List:
+    """Column values as Python objects, with None where the entry equals the missing marker (NaN for floats)"""
+    if values.dtype.kind == "f":
+        return [None if v != v else v for v in values.tolist()]
+    return [None if v == missing else v for v in values.tolist()]
+
+
+class RequestArray:
+    """Many TripRequests as one structured array instead of one object each.
+
+    Indexing with an int materializes a TripRequest; slicing, boolean masks
+    and index arrays give another RequestArray sharing the string tables, so
+    filtering never creates per-request objects. Evaluators read columns
+    straight from `records`.
+    """
+
+    def __init__(self, records: np.ndarray, users: StringTable, zones: StringTable, int_timestamps: bool = False):
+        self.records = records
+        self.users = users
+        self.zones = zones
+        self.int_timestamps = int_timestamps  # Every timestamp came in as an int; converted back as ints
+
+    @classmethod
+    def from_requests(cls, requests: Iterable[TripRequest]) -> "RequestArray":
+        return cls.from_dicts({name: getattr(request, name) for name in TRIP_FIELDS} for request in requests)
+
+    @classmethod
+    def from_dicts(cls, rows: Iterable[Dict], users: Optional[StringTable] = None,
+                   zones: Optional[StringTable] = None) -> "RequestArray":
+        """Build from TripRequest-shaped dicts (e.g. parsed JSON) without creating TripRequests.
+
+        Unknown or missing fields raise TypeError, as TripRequest(**row) would.
+        """
+        rows = rows if isinstance(rows, list) else list(rows)
+        for row in rows:
+            unknown = row.keys() - TRIP_FIELDS
+            if unknown:
+                raise TypeError(f"Unexpected trip request fields: {sorted(unknown)}")
+            missing = REQUIRED_FIELDS - row.keys()
+            if missing:
+                raise TypeError(f"Missing trip request fields: {sorted(missing)}")
+        return cls.from_columns({name: [row.get(name) for row in rows] for name in TRIP_FIELDS}, users, zones)
+
+    @classmethod
+    def from_columns(cls, columns: Dict[str, List], users: Optional[StringTable] = None,
+                     zones: Optional[StringTable] = None) -> "RequestArray":
+        """Build from one list per TripRequest field, with None for missing optional values"""
+        users = users if users is not None else StringTable()
+        zones = zones if zones is not None else StringTable()
+        records = np.zeros(len(columns["user_id"]), dtype=REQUEST_DTYPE)
+        for name in PLAIN_FIELDS:
+            records[name] = columns[name]
+        user_code, zone_code = users.code, zones.code
+        user_codes = [user_code(user) for user in columns["user_id"]]
+        zone_codes = [zone_code(zone) for zone in columns["zone"]]
+        dropoff_codes = [-1 if zone is None else zone_code(zone) for zone in columns["dropoff_zone"]]
+        for table, kind, column in ((users, "user ids", "user"), (zones, "zones", "zone")):
+            limit = int(np.iinfo(REQUEST_DTYPE[column]).max) + 1
+            if len(table) > limit:
+                raise OverflowError(f"more than {limit} distinct {kind}")
+        records["user"] = user_codes
+        records["zone"] = zone_codes
+        records["dropoff_zone"] = dropoff_codes
+        for name in ("fare", "pickup_lat", "pickup_lon"):
+            records[name] = [np.nan if value is None else value for value in columns[name]]
+        records["ride_id"] = [NO_RIDE_ID if ride_id is None else ride_id for ride_id in columns["rideId"]]
+        int_timestamps = all(isinstance(timestamp, int) for timestamp in columns["timestamp"])
+        return cls(records, users, zones, int_timestamps)
+
+    def __len__(self) -> int:
+        return len(self.records)
+
+    def __getitem__(self, index):
+        if isinstance(index, (int, np.integer)):
+            return self.take([index]).to_requests()[0]
+        return RequestArray(self.records[index], self.users, self.zones, self.int_timestamps)
+
+    def __iter__(self):
+        return iter(self.to_requests())
+
+    def take(self, indices) -> "RequestArray":
+        return RequestArray(self.records[np.asarray(indices, dtype=np.intp)], self.users, self.zones, self.int_timestamps)
+
+    def user_ids(self) -> List[str]:
+        values = self.users.values
+        return [values[code] for code in self.records["user"].tolist()]
+
+    def zone_names(self) -> List[str]:
+        values = self.zones.values
+        return [values[code] for code in self.records["zone"].tolist()]
+
+    def ride_ids(self) -> List[Optional[int]]:
+        return _optional(self.records["ride_id"], NO_RIDE_ID)
+
+    def to_dicts(self) -> List[Dict]:
+        """TripRequest-shaped dicts, as asdict() would give for each request"""
+        records = self.records
+        columns = {name: records[name].tolist() for name in PLAIN_FIELDS}
+        if self.int_timestamps:
+            columns["timestamp"] = records["timestamp"].astype(np.int64).tolist()
+        columns["user_id"] = self.user_ids()
+        columns["zone"] = self.zone_names()
+        columns["fare"] = _optional(records["fare"], None)
+        columns["rideId"] = self.ride_ids()
+        columns["pickup_lat"] = _optional(records["pickup_lat"], None)
+        columns["pickup_lon"] = _optional(records["pickup_lon"], None)
+        columns["dropoff_zone"] = [None if code < 0 else self.zones.values[code] for code in records["dropoff_zone"].tolist()]
+        return [dict(zip(TRIP_FIELDS, values)) for values in zip(*(columns[name] for name in TRIP_FIELDS))]
+
+    def to_requests(self) -> List[TripRequest]:
+        return [TripRequest(**row) for row in self.to_dicts()]
+
+
+class ScoreArray:
+    """Many RequestScores as one structured array, each referring to its request by index into `requests`"""
+
+    def __init__(self, records: np.ndarray, requests: RequestArray):
+        self.records = records
+        self.requests = requests
+
+    @classmethod
+    def from_columns(cls, columns, requests: Optional[RequestArray] = None) -> "ScoreArray":
+        """From profitability_evaluatorV2.ScoreColumns; requests defaults to the columns' own requests"""
+        if requests is None:
+            requests = columns.requests if isinstance(columns.requests, RequestArray) else RequestArray.from_requests(columns.requests)
+        records = np.zeros(len(columns.final_score), dtype=SCORE_DTYPE)
+        records["request"] = np.arange(len(records))
+        records["ride_id"] = requests.records["ride_id"][:len(records)]
+        for name in SCORE_FIELDS:
+            records[name] = getattr(columns, name)
+        return cls(records, requests)
+
+    @classmethod
+    def from_scores(cls, scores: Sequence) -> "ScoreArray":
+        """From RequestScore objects; their requests are packed into a new RequestArray"""
+        requests = RequestArray.from_requests(score.request for score in scores)
+        records = np.zeros(len(scores), dtype=SCORE_DTYPE)
+        records["request"] = np.arange(len(scores))
+        records["ride_id"] = [NO_RIDE_ID if score.request_id is None else score.request_id for score in scores]
+        for name in SCORE_FIELDS:
+            records[name] = [getattr(score, name) for score in scores]
+        return cls(records, requests)
+
+    def __len__(self) -> int:
+        return len(self.records)
+
+    def __getitem__(self, index):
+        if isinstance(index, (int, np.integer)):
+            return self.to_scores(np.array([index]))[0]
+        return ScoreArray(self.records[index], self.requests)
+
+    def ranked(self) -> np.ndarray:
+        """Indices from highest to lowest final score; ties keep order"""
+        return np.argsort(-self.records["final_score"], kind="stable")
+
+    def to_scores(self, indices=None, score_class=None) -> List:
+        """RequestScore objects (profitability_evaluatorV2's unless score_class is given) for all or some entries"""
+        if score_class is None:
+            from profitability_evaluatorV2 import RequestScore as score_class
+        records = self.records if indices is None else self.records[np.asarray(indices, dtype=np.intp)]
+        requests = self.requests.take(records["request"]).to_requests()
+        columns = [records[name].tolist() for name in SCORE_FIELDS]
+        ride_ids = _optional(records["ride_id"], NO_RIDE_ID)
+        return [
+            score_class(request_id=ride_id, request=request, **dict(zip(SCORE_FIELDS, values)))
+            for ride_id, request, values in zip(ride_ids, requests, zip(*columns))
+        ]
+
+    def to_dicts(self, indices=None, include_request: bool = True) -> List[Dict]:
+        """JSON-ready score breakdowns in the /rank-requests top_requests format"""
+        records = self.records if indices is None else self.records[np.asarray(indices, dtype=np.intp)]
+        columns = [records[name].tolist() for name in SCORE_FIELDS]
+        rows = [
+            {"request_id": ride_id, **dict(zip(SCORE_FIELDS, values))}
+            for ride_id, values in zip(_optional(records["ride_id"], NO_RIDE_ID), zip(*columns))
+        ]
+        if include_request:
+            for row, request in zip(rows, self.requests.take(records["request"]).to_dicts()):
+                row["request"] = request
+        return rows
+
+
+if __name__ == "__main__":
+    import gc
+    import time
+    import random
+    import argparse
+    import tracemalloc
+    from dataclasses import make_dataclass
+    from profitability_evaluatorV2 import RequestScore
+
+    parser = argparse.ArgumentParser(description="Memory and GC cost of holding many requests and scores")
+    parser.add_argument("--n", type=int, default=1_000_000)
+    args = parser.parse_args()
+
+    # The same fields as plain (non-slotted) dataclasses, as TripRequest and RequestScore used to be
+    DictTripRequest = make_dataclass("DictTripRequest", [(f.name, f.type, f) for f in fields(TripRequest)])
+    DictRequestScore = make_dataclass("DictRequestScore", [(f.name, f.type, f) for f in fields(RequestScore)])
+    zones = ["downtown", "suburb", "airport"]
+
+    def request_rows():
+        """Fresh rows on every pass, so each container owns its values like requests parsed from JSON"""
+        rng = random.Random(0)
+        for i in range(args.n):
+            yield dict(user_id=f"user{i % 50000}", distance=rng.uniform(1, 20), duration=rng.uniform(5, 60),
+                       zone=rng.choice(zones), timestamp=1700000000.0 + i, ride_demand_level=rng.randint(1, 5),
+                       traffic_level=rng.randint(1, 5), weather_severity=rng.randint(0, 3), traffic_blocks=rng.randint(1, 5),
+                       is_holiday=rng.random() < 0.1, is_event_nearby=rng.random() < 0.1, fare=rng.uniform(5, 80),
+                       rideId=i, pickup_lat=12.97 + rng.gauss(0, 0.05), pickup_lon=77.59 + rng.gauss(0, 0.05))
+
+    def score_rows():
+        rng = random.Random(1)
+        for i in range(args.n):
+            yield i, {name: rng.uniform(-50, 50) for name in SCORE_FIELDS}
+
+    def measure(name: str, unit: str, build):
+        """Traced bytes of what build() returns, and how many objects it adds for the cyclic GC to traverse"""
+        gc.collect()
+        tracked = len(gc.get_objects())
+        tracemalloc.start()
+        value = build()
+        size = tracemalloc.get_traced_memory()[0]
+        tracemalloc.stop()
+        tracked = len(gc.get_objects()) - tracked
+        print(f"  {name:<24} {size / 2**20:9.1f} MB  {size / args.n:7.1f} B/{unit}  {tracked:>10,} GC-tracked objects")
+        return value, size
+
+    print(f"{args.n:,} requests")
+    legacy, dataclass_size = measure("dataclass TripRequest", "request", lambda: [DictTripRequest(**row) for row in request_rows()])
+    del legacy
+    requests, slotted_size = measure("slotted TripRequest", "request", lambda: [TripRequest(**row) for row in request_rows()])
+    array, array_size = measure("RequestArray", "request", lambda: RequestArray.from_dicts(request_rows()))
+    print(f"  saved vs dataclass: slotted {(dataclass_size - slotted_size) / 2**20:.1f} MB, "
+          f"RequestArray {(dataclass_size - array_size) / 2**20:.1f} MB")
+    start = time.perf_counter()
+    assert array[:1000].to_requests() == requests[:1000]
+    print(f"  RequestArray -> TripRequest: {(time.perf_counter() - start) / 1000 * 1e6:.2f} us per request")
+
+    # Scores: a RequestScore also refers to its TripRequest (not counted), a ScoreArray row holds its index
+    print(f"{args.n:,} scores (requests not counted)")
+    scores, dataclass_size = measure("dataclass RequestScore", "score  ",
+                                     lambda: [DictRequestScore(request_id=i, request=requests[i], **v) for i, v in score_rows()])
+    del scores
+    scores, slotted_size = measure("slotted RequestScore", "score  ",
+                                   lambda: [RequestScore(request_id=i, request=requests[i], **v) for i, v in score_rows()])
+    del scores
+
+    def build_score_array():
+        records = np.zeros(args.n, dtype=SCORE_DTYPE)
+        records["request"] = records["ride_id"] = np.arange(args.n)
+        for i, v in score_rows():
+            records[i] = (i, i, *(v[name] for name in SCORE_FIELDS))
+        return ScoreArray(records, array)
+
+    scores, array_size = measure("ScoreArray", "score  ", build_score_array)
+    print(f"  saved vs dataclass: slotted {(dataclass_size - slotted_size) / 2**20:.1f} MB, "
+          f"ScoreArray {(dataclass_size - array_size) / 2**20:.1f} MB")
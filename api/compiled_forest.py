@@ -0,0 +1,275 @@
+import time
+import logging
+import numpy as np
+from typing import Dict, List, Optional
+from array_store import save_arrays, load_arrays, read_meta
+
+# Configure logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+FORMAT_VERSION = 1
+
+_SIGN_BIT = np.int64(-0x8000000000000000)
+_MAGNITUDE = np.int64(0x7FFFFFFFFFFFFFFF)
+
+
+def _float_to_key(x: np.ndarray) -> np.ndarray:
+    """Map float64 values to int64 keys that sort in the same order"""
+    bits = np.ascontiguousarray(x, dtype=np.float64).view(np.int64)
+    return np.where(bits < 0, -(bits & _MAGNITUDE), bits)
+
+
+def _key_to_float(key: np.ndarray) -> np.ndarray:
+    """Inverse of _float_to_key"""
+    bits = np.where(key < 0, (-key) | _SIGN_BIT, key)
+    return bits.view(np.float64)
+
+
+def _fold_thresholds(threshold: np.ndarray, mean: np.ndarray, scale: np.ndarray) -> np.ndarray:
+    """Fold a StandardScaler into tree split thresholds.
+
+    sklearn trees test float32((x - mean) / scale) <= threshold. That test is
+    monotone in x, so it equals x <= t_raw for the largest float64 t_raw that
+    still passes. We bisect on the float64 bit pattern around the algebraic
+    guess threshold * scale + mean, which makes the raw-space split exact.
+    """
+    def passes(x):
+        return ((x - mean) / scale).astype(np.float32) <= threshold
+
+    guess = threshold * scale + mean
+    width = 1e-6 * (np.abs(guess) + np.abs(mean) + scale)
+    lo, hi = guess - width, guess + width
+    for _ in range(16):
+        bad_lo, bad_hi = ~passes(lo), passes(hi)
+        if not (bad_lo.any() or bad_hi.any()):
+            break
+        width = np.where(bad_lo | bad_hi, width * 16, width)
+        lo, hi = np.where(bad_lo, guess - width, lo), np.where(bad_hi, guess + width, hi)
+    else:
+        raise ValueError("Could not bracket folded split thresholds")
+
+    lo_key, hi_key = _float_to_key(lo), _float_to_key(hi)
+    while True:
+        open_gap = (hi_key - lo_key) > 1
+        if not open_gap.any():
+            break
+        mid_key = lo_key + (hi_key - lo_key) // 2
+        mid_passes = passes(_key_to_float(mid_key))
+        lo_key = np.where(open_gap & mid_passes, mid_key, lo_key)
+        hi_key = np.where(open_gap & ~mid_passes, mid_key, hi_key)
+    return _key_to_float(lo_key)
+
+
+class CompiledForest:
+    """Array-backed evaluator for the StandardScaler + RandomForestRegressor pipeline.
+
+    All trees are flattened into one set of node arrays (feature, threshold,
+    left/right child, leaf value) with the scaler folded into the thresholds.
+    Leaves point back to themselves, so every row walks exactly max_depth steps
+    and a batch of rows is evaluated for all trees with a few array gathers.
+    """
+
+    def __init__(self, feature_names: List[str], feature: np.ndarray, threshold: np.ndarray,
+                 children: np.ndarray, value: np.ndarray, roots: np.ndarray, max_depth: int):
+        self.feature_names = list(feature_names)
+        self.feature = feature
+        self.threshold = threshold
+        self.children = children  # Interleaved [left, right] pairs so one gather picks the branch taken
+        self.value = value
+        self.roots = roots
+        self.max_depth = int(max_depth)
+
+    # Rows per traversal chunk; keeps the (trees x rows) working set cache-sized
+    chunk_rows = 1024
+
+    @property
+    def n_trees(self) -> int:
+        return len(self.roots)
+
+    @property
+    def n_nodes(self) -> int:
+        return len(self.feature)
+
+    @property
+    def left(self) -> np.ndarray:
+        return self.children[0::2]
+
+    @property
+    def right(self) -> np.ndarray:
+        return self.children[1::2]
+
+    @classmethod
+    def from_pipeline(cls, pipeline) -> "CompiledForest":
+        """Compile a fitted pipeline built by base_price_model.build_model()"""
+        preprocessor = pipeline.named_steps['preprocessor']
+        regressor = pipeline.named_steps['regressor']
+
+        feature_names, means, scales = [], [], []
+        for name, transformer, columns in preprocessor.transformers_:
+            if transformer == 'drop' or len(columns) == 0:
+                continue
+            if transformer == 'passthrough':
+                means.append(np.zeros(len(columns)))
+                scales.append(np.ones(len(columns)))
+            elif type(transformer).__name__ == 'StandardScaler':
+                means.append(transformer.mean_ if transformer.with_mean else np.zeros(len(columns)))
+                scales.append(transformer.scale_ if transformer.with_std else np.ones(len(columns)))
+            else:
+                raise ValueError(f"Cannot compile transformer {name!r} of type {type(transformer).__name__}")
+            feature_names.extend(columns)
+        mean, scale = np.concatenate(means), np.concatenate(scales)
+
+        features, thresholds, lefts, rights, values, roots = [], [], [], [], [], []
+        offset, max_depth = 0, 0
+        for estimator in regressor.estimators_:
+            tree = estimator.tree_
+            n = tree.node_count
+            own = np.arange(offset, offset + n, dtype=np.int32)
+            is_leaf = tree.children_left < 0
+
+            feature = np.where(is_leaf, 0, tree.feature).astype(np.int32)
+            threshold = np.where(is_leaf, np.inf, tree.threshold)
+            split = ~is_leaf
+            threshold[split] = _fold_thresholds(threshold[split], mean[feature[split]], scale[feature[split]])
+
+            features.append(feature)
+            thresholds.append(threshold)
+            lefts.append(np.where(is_leaf, own, tree.children_left + offset).astype(np.int32))
+            rights.append(np.where(is_leaf, own, tree.children_right + offset).astype(np.int32))
+            values.append(tree.value[:, 0, 0].astype(np.float64))
+            roots.append(offset)
+            offset += n
+            max_depth = max(max_depth, tree.max_depth)
+
+        return cls(
+            feature_names=feature_names,
+            feature=np.concatenate(features),
+            threshold=np.concatenate(thresholds),
+            children=np.stack([np.concatenate(lefts), np.concatenate(rights)], axis=1).ravel(),
+            value=np.concatenate(values),
+            roots=np.array(roots, dtype=np.int32),
+            max_depth=max_depth
+        )
+
+    def save(self, path: str, model_version: str):
+        """Write the node arrays to a memory-mappable file tagged with the source model version"""
+        save_arrays(path, {
+            "feature": self.feature,
+            "threshold": self.threshold,
+            "children": self.children,
+            "value": self.value,
+            "roots": self.roots
+        }, {
+            "format_version": FORMAT_VERSION,
+            "model_version": model_version,
+            "feature_names": self.feature_names,
+            "max_depth": self.max_depth
+        })
+
+    @classmethod
+    def load(cls, path: str, model_version: Optional[str] = None, mmap: bool = True) -> Optional["CompiledForest"]:
+        """Open a saved forest; None if it has another format or came from another model.
+
+        With mmap=True the node arrays are read-only views of the file, so
+        every process that opens it shares one copy through the page cache.
+        """
+        meta = read_meta(path)
+        if meta.get("format_version") != FORMAT_VERSION:
+            return None
+        if model_version is not None and meta.get("model_version") != model_version:
+            return None
+        meta, arrays = load_arrays(path, mmap=mmap)
+        return cls(meta["feature_names"], max_depth=meta["max_depth"], **arrays)
+
+    def _as_matrix(self, X) -> np.ndarray:
+        """Accept a DataFrame with the training columns or an already ordered 2-D array"""
+        if hasattr(X, 'columns'):
+            X = X[self.feature_names].to_numpy(dtype=np.float64)
+        return np.atleast_2d(np.asarray(X, dtype=np.float64))
+
+    def predict(self, X) -> np.ndarray:
+        """Predict fares for a batch of rows"""
+        X = self._as_matrix(X)
+        if len(X) <= self.chunk_rows:
+            return self._predict_chunk(X)
+        return np.concatenate([
+            self._predict_chunk(X[start:start + self.chunk_rows])
+            for start in range(0, len(X), self.chunk_rows)
+        ])
+
+    def _predict_chunk(self, X: np.ndarray) -> np.ndarray:
+        n, n_features = X.shape
+        flat_X = X.ravel()
+        row_offsets = (np.arange(n) * n_features)[None, :]
+        # nodes is (trees, rows) so the final reduction adds trees in order, like sklearn
+        nodes = np.repeat(self.roots[:, None], n, axis=1)
+        for _ in range(self.max_depth):
+            values = np.take(flat_X, row_offsets + np.take(self.feature, nodes))
+            go_right = values > np.take(self.threshold, nodes)
+            nodes = np.take(self.children, 2 * nodes + go_right)
+        leaves = np.take(self.value, nodes)
+        if n == 1:
+            # A single column would be summed pairwise; cumsum keeps sklearn's one-tree-at-a-time order
+            return np.cumsum(leaves[:, 0])[-1:] / self.n_trees
+        return leaves.sum(axis=0) / self.n_trees
+
+
+def compare_with_pipeline(pipeline, compiled: CompiledForest, X) -> Dict[str, float]:
+    """Compare compiled predictions with the sklearn pipeline on the rows of X"""
+    start = time.perf_counter()
+    expected = np.asarray(pipeline.predict(X), dtype=float)
+    sklearn_seconds = time.perf_counter() - start
+
+    start = time.perf_counter()
+    actual = compiled.predict(X)
+    compiled_seconds = time.perf_counter() - start
+
+    return {
+        "rows": len(expected),
+        "max_abs_diff": float(np.max(np.abs(expected - actual))) if len(expected) else 0.0,
+        "sklearn_ms": sklearn_seconds * 1000,
+        "compiled_ms": compiled_seconds * 1000
+    }
+
+
+def held_out_features(filepath: str = '../realistic_taxi_data.csv'):
+    """Rebuild the held-out test split used by base_price_model.main()"""
+    from sklearn.model_selection import train_test_split
+    from base_price_model import load_data, preprocess_data
+
+    df = preprocess_data(load_data(filepath))
+    X = df.drop('fare', axis=1)
+    y = df['fare']
+    _, X_test, _, _ = train_test_split(X, y, test_size=0.2, random_state=42)
+    return X_test
+
+
+def all_features(filepath: str = '../realistic_taxi_data.csv'):
+    """Engineered features for every row of the dataset, without outlier cleaning"""
+    from base_price_model import load_data, engineer_features
+
+    return engineer_features(load_data(filepath)).drop('fare', axis=1)
+
+
+if __name__ == "__main__":
+    import joblib
+
+    pipeline = joblib.load("dynamic_pricing_model.joblib")
+
+    start = time.perf_counter()
+    compiled = CompiledForest.from_pipeline(pipeline)
+    print(f"Compiled {compiled.n_trees} trees / {compiled.n_nodes} nodes in {(time.perf_counter() - start) * 1000:.1f} ms")
+
+    X_test = held_out_features()
+    for label, X in (("Held-out split", X_test), ("All dataset rows", all_features())):
+        report = compare_with_pipeline(pipeline, compiled, X)
+        print(f"{label}: {report['rows']} rows, max |compiled - sklearn| = {report['max_abs_diff']:.3e}, "
+              f"batch predict sklearn {report['sklearn_ms']:.1f} ms / compiled {report['compiled_ms']:.1f} ms")
+
+    single = X_test.iloc[:200]
+    for name, predict in (("sklearn", pipeline.predict), ("compiled", compiled.predict)):
+        start = time.perf_counter()
+        for i in range(len(single)):
+            predict(single.iloc[i:i + 1])
+        print(f"Single-row predict ({name}): {(time.perf_counter() - start) * 1000 / len(single):.3f} ms/row")
@@ -0,0 +1,17 @@
+import os
+import joblib
+import pytest
+from base_price_model import build_model, engineer_features, load_data
+
+DATA_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'realistic_taxi_data.csv')
+
+
+@pytest.fixture(scope="session")
+def model_path(tmp_path_factory):
+    """A small pipeline from build_model(), saved where PricingConfig.model_path can load it"""
+    df = engineer_features(load_data(DATA_PATH))
+    pipeline = build_model().set_params(regressor__n_estimators=20)
+    pipeline.fit(df.drop('fare', axis=1), df['fare'])
+    path = str(tmp_path_factory.mktemp("model") / "dynamic_pricing_model.joblib")
+    joblib.dump(pipeline, path)
+    return path
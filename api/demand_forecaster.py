@@ -0,0 +1,156 @@
+import os
+import time
+import logging
+import threading
+from collections import deque
+from typing import Iterable, List, Optional, Sequence, Tuple
+import numpy as np
+
+# Configure logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+GLOBAL_ZONE = "*"  # Row used for unknown zones and zone-less lookups
+
+
+class DemandTable:
+    """Immutable (zone, weekday, hour) -> expected trips per hour table"""
+
+    def __init__(self, zones: Sequence[str], table: np.ndarray):
+        # table has shape (len(zones), 7, 24); zones[0] is the global row
+        self.zones = list(zones)
+        self.table = table
+        self.zone_index = {zone: i for i, zone in enumerate(self.zones)}
+
+    @classmethod
+    def uniform(cls, hourly_demand: np.ndarray) -> "DemandTable":
+        """Same 24-hour curve for every zone and weekday"""
+        return cls([GLOBAL_ZONE], np.tile(np.asarray(hourly_demand, dtype=float), (1, 7, 1)))
+
+    def lookup(self, hour: int, zone: Optional[str] = None, weekday: Optional[int] = None) -> float:
+        row = self.zone_index.get(zone, 0)
+        return float(self.table[row, 0 if weekday is None else weekday, hour])
+
+    def lookup_batch(self, hours: np.ndarray, zones: Optional[Sequence[str]] = None,
+                     weekdays: Optional[np.ndarray] = None) -> np.ndarray:
+        hours = np.asarray(hours, dtype=np.intp)
+        rows = 0 if zones is None else np.array([self.zone_index.get(zone, 0) for zone in zones], dtype=np.intp)
+        days = 0 if weekdays is None else np.asarray(weekdays, dtype=np.intp)
+        return self.table[rows, days, hours]
+
+
+def fit_demand_table(trips: Iterable[Tuple[str, float]], prior: DemandTable) -> DemandTable:
+    """Average trips per hour for each (zone, weekday, hour) from (zone, timestamp) records.
+
+    Each cell's count is divided by how many times that (weekday, hour) slot
+    occurs in the span of the history. Slots the history never covers keep
+    the prior.
+    """
+    trips = list(trips)
+    if not trips:
+        return prior
+
+    zone_names = [GLOBAL_ZONE] + sorted({zone for zone, _ in trips} - {GLOBAL_ZONE})
+    zone_index = {zone: i for i, zone in enumerate(zone_names)}
+    zone_ids, weekdays, hours = [], [], []
+    for zone, timestamp in trips:
+        local = time.localtime(timestamp)
+        zone_ids.append(zone_index[zone])
+        weekdays.append(local.tm_wday)
+        hours.append(local.tm_hour)
+
+    counts = np.zeros((len(zone_names), 7, 24))
+    np.add.at(counts, (np.array(zone_ids), np.array(weekdays), np.array(hours)), 1)
+    counts[0] = counts[1:].sum(axis=0)  # Global row is city-wide demand
+
+    # Number of hourly slots of each (weekday, hour) covered by the history span
+    timestamps = [timestamp for _, timestamp in trips]
+    coverage = np.zeros((7, 24))
+    for slot in range(int(min(timestamps) // 3600), int(max(timestamps) // 3600) + 1):
+        local = time.localtime(slot * 3600)
+        coverage[local.tm_wday, local.tm_hour] += 1
+
+    table = np.broadcast_to(prior.table[:1], counts.shape).copy()
+    covered = coverage > 0
+    table[:, covered] = counts[:, covered] / coverage[covered]
+    return DemandTable(zone_names, table)
+
+
+def read_trip_history(path: str) -> List[Tuple[str, float]]:
+    """Read (zone, timestamp) records from a CSV with 'zone' and 'timestamp' columns"""
+    import csv
+
+    with open(path, newline="") as f:
+        return [(row.get("zone") or GLOBAL_ZONE, float(row["timestamp"])) for row in csv.DictReader(f)]
+
+
+class DemandForecaster:
+    """Predicts demand by table lookup; the table is refit from trip history in the background.
+
+    train() sets the prior curve, a least-squares line over (hour, demand)
+    points. refit() rebuilds the per-zone table from the history CSV plus
+    trips recorded with record_trip(), then swaps it in with a single
+    reference assignment so request threads never wait on a refit.
+    """
+
+    def __init__(self, history_path: Optional[str] = None, refresh_interval: float = 0.0,
+                 max_recorded_trips: int = 100000):
+        self.history_path = history_path
+        self.refresh_interval = refresh_interval
+        self._recorded = deque(maxlen=max_recorded_trips)
+        self._prior = DemandTable.uniform(np.zeros(24))
+        self._table = self._prior
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def train(self, historical_data: np.ndarray):
+        # Historical data format: [hour_of_day, demand]
+        hours = historical_data[:, 0].astype(float)
+        demand = historical_data[:, 1].astype(float)
+        design = np.column_stack([np.ones_like(hours), hours])
+        (intercept, slope), *_ = np.linalg.lstsq(design, demand, rcond=None)
+        self._prior = DemandTable.uniform(intercept + slope * np.arange(24))
+        self._table = self._prior
+
+    def predict_demand(self, hour: int, zone: Optional[str] = None, weekday: Optional[int] = None) -> float:
+        return self._table.lookup(hour, zone, weekday)
+
+    def predict_demand_batch(self, hours: np.ndarray, zones: Optional[Sequence[str]] = None,
+                             weekdays: Optional[np.ndarray] = None) -> np.ndarray:
+        return self._table.lookup_batch(hours, zones, weekdays)
+
+    def record_trip(self, zone: str, timestamp: float):
+        """Remember a booked trip for the next refit (deque append is thread-safe)"""
+        self._recorded.append((zone, timestamp))
+
+    def refit(self):
+        """Rebuild the demand table from trip history and swap it in"""
+        start = time.perf_counter()
+        trips = list(self._recorded)
+        if self.history_path and os.path.exists(self.history_path):
+            trips = read_trip_history(self.history_path) + trips
+        self._table = fit_demand_table(trips, self._prior)
+        logger.info(f"Refit demand table from {len(trips)} trips across {len(self._table.zones) - 1} zones "
+                    f"in {(time.perf_counter() - start) * 1000:.1f} ms")
+
+    def start(self):
+        """Refit now, then every refresh_interval seconds on a daemon thread"""
+        self.refit()
+        if self.refresh_interval <= 0 or self._thread is not None:
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="demand-refit", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def _run(self):
+        while not self._stop.wait(self.refresh_interval):
+            try:
+                self.refit()
+            except Exception as e:
+                logger.error(f"Demand refit failed: {e}")
@@ -0,0 +1,153 @@
+import time
+import logging
+import numpy as np
+from typing import Callable, Optional, Tuple
+from array_store import save_arrays, load_arrays, read_meta, file_fingerprint
+
+# Configure logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+FORMAT_VERSION = 1
+
+# Discrete model inputs tabulated by the surface, as (first value, count).
+# holiday and event_nearby only reach the model as their sum (special_conditions),
+# so they share one axis of 3 values instead of two axes of 2.
+GRID_AXES = {
+    "hour": (0, 24),
+    "traffic_level": (1, 5),
+    "weather_severity": (0, 4),
+    "traffic_blocks": (0, 6),      # covers both the 0-4 training range and the 1-5 API range
+    "special_conditions": (0, 3),
+    "ride_demand_level": (1, 5),
+}
+
+
+class FareSurface:
+    """Precomputed ML fare term over the discrete inputs and a distance grid.
+
+    Lookups interpolate linearly along distance_km. Rows outside the grid
+    (unseen discrete values or distances past the last grid point) are
+    reported back so the caller can fall back to the model.
+    """
+
+    def __init__(self, table: np.ndarray, distance_step: float, model_version: str):
+        self.table = table
+        self.distance_step = float(distance_step)
+        self.model_version = model_version
+        self.n_distances = table.shape[-1]
+        self.max_distance = self.distance_step * (self.n_distances - 1)
+        self._cells = table.reshape(-1, self.n_distances)
+        self._shape = table.shape[:-1]
+
+    @classmethod
+    def build(cls, predict: Callable, prepare: Callable, model_version: str,
+              max_distance: float = 60.0, distance_step: float = 0.5, chunk_rows: int = 1 << 16) -> "FareSurface":
+        """Tabulate predict(prepare(...)) for every grid point.
+
+        prepare has the signature of PricingEngine._prepare_ml_input and predict
+        the signature of PricingEngine._predict_fares.
+        """
+        start = time.perf_counter()
+        distances = np.arange(int(round(max_distance / distance_step)) + 1) * distance_step
+        shape = tuple(count for _, count in GRID_AXES.values()) + (len(distances),)
+        grid = np.indices(shape).reshape(len(shape), -1)
+        offsets = [first for first, _ in GRID_AXES.values()]
+        hour, traffic_level, weather, blocks, special, demand = (grid[i] + offsets[i] for i in range(len(offsets)))
+        distance_km = distances[grid[-1]]
+
+        values = np.empty(grid.shape[1], dtype=np.float32)
+        for lo in range(0, len(values), chunk_rows):
+            rows = slice(lo, lo + chunk_rows)
+            ml_input = prepare(
+                distance_km=distance_km[rows],
+                time_of_day=hour[rows],
+                traffic_level=traffic_level[rows],
+                weather_condition=weather[rows],
+                traffic_blocks=blocks[rows],
+                holiday=special[rows],  # only the sum holiday + event_nearby reaches the model
+                event_nearby=np.zeros_like(special[rows]),
+                ride_demand_level=demand[rows]
+            )
+            values[rows] = predict(ml_input)
+
+        logger.info(f"Built fare surface with {len(values)} points in {time.perf_counter() - start:.1f}s")
+        return cls(values.reshape(shape), distance_step, model_version)
+
+    def save(self, path: str):
+        save_arrays(path, {"table": self.table}, {
+            "format_version": FORMAT_VERSION,
+            "model_version": self.model_version,
+            "distance_step": self.distance_step,
+            "axes": {name: list(axis) for name, axis in GRID_AXES.items()}
+        })
+
+    @classmethod
+    def load(cls, path: str, model_version: Optional[str] = None) -> Optional["FareSurface"]:
+        """Memory-map a saved surface; None if it is stale or from another format/model"""
+        meta = read_meta(path)
+        if meta.get("format_version") != FORMAT_VERSION:
+            return None
+        if meta.get("axes") != {name: list(axis) for name, axis in GRID_AXES.items()}:
+            return None
+        if model_version is not None and meta.get("model_version") != model_version:
+            return None
+        meta, arrays = load_arrays(path, mmap=True)
+        return cls(arrays["table"], meta["distance_step"], meta["model_version"])
+
+    def lookup(self, distance_km, time_of_day, traffic_level, weather_condition, traffic_blocks,
+               holiday, event_nearby, ride_demand_level) -> Tuple[np.ndarray, np.ndarray]:
+        """Interpolated fares and a mask of rows that fell inside the grid"""
+        distance_km = np.atleast_1d(np.asarray(distance_km, dtype=float))
+        discrete = [np.atleast_1d(time_of_day), np.atleast_1d(traffic_level), np.atleast_1d(weather_condition),
+                    np.atleast_1d(traffic_blocks), np.atleast_1d(holiday) + np.atleast_1d(event_nearby),
+                    np.atleast_1d(ride_demand_level)]
+
+        in_grid = (distance_km >= 0) & (distance_km <= self.max_distance)
+        indices = []
+        for values, (first, count) in zip(discrete, GRID_AXES.values()):
+            index = np.asarray(values, dtype=float) - first
+            in_grid &= (index >= 0) & (index < count) & (index == np.floor(index))
+            indices.append(np.where(in_grid, index, 0).astype(np.intp))
+        cell = np.ravel_multi_index(indices, self._shape)
+
+        position = np.where(in_grid, distance_km, 0.0) / self.distance_step
+        left = np.minimum(np.floor(position).astype(np.intp), self.n_distances - 2)
+        weight = position - left
+        fares = self._cells[cell, left] * (1.0 - weight) + self._cells[cell, left + 1] * weight
+        return fares.astype(float), in_grid
+
+
+def load_or_build(path: str, model_path: str, predict: Callable, prepare: Callable,
+                  max_distance: float, distance_step: float) -> FareSurface:
+    """Open the surface at path, rebuilding it when missing or built from another model"""
+    model_version = file_fingerprint(model_path)
+    try:
+        surface = FareSurface.load(path, model_version)
+        if surface is not None and surface.distance_step == distance_step and surface.max_distance == max_distance:
+            logger.info(f"Loaded fare surface from {path} (model {model_version})")
+            return surface
+        logger.info(f"Fare surface at {path} is stale, rebuilding")
+    except FileNotFoundError:
+        logger.info(f"No fare surface at {path}, building")
+    surface = FareSurface.build(predict, prepare, model_version, max_distance, distance_step)
+    surface.save(path)
+    return FareSurface.load(path, model_version)
+
+
+if __name__ == "__main__":
+    import argparse
+    from pricing_engine import PricingEngine, PricingConfig
+
+    parser = argparse.ArgumentParser(description="Build the precomputed fare surface offline")
+    parser.add_argument("--model", default="dynamic_pricing_model.joblib")
+    parser.add_argument("--out", default=PricingConfig.fare_surface_path)
+    parser.add_argument("--backend", default="compiled", choices=["sklearn", "compiled"])
+    args = parser.parse_args()
+
+    config = PricingConfig(model_path=args.model, inference_backend=args.backend)
+    engine = PricingEngine(config)
+    surface = FareSurface.build(engine._predict_fares, engine._prepare_model_input, file_fingerprint(args.model),
+                                config.fare_surface_max_km, config.fare_surface_step_km)
+    surface.save(args.out)
+    print(f"Wrote {args.out}: table {surface.table.shape}, {surface.table.nbytes / 1e6:.1f} MB")
@@ -0,0 +1,185 @@
+import time
+import logging
+import numpy as np
+from dataclasses import dataclass, field
+from typing import Dict, List, Tuple
+from profitability_evaluatorV2 import RequestEvaluator, DriverProfile, RequestScore, TripRequest
+
+# Configure logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class FleetAssignment:
+    """Result of one dispatch tick: matched pairs and the drivers left without a request"""
+    assignments: List[Tuple[int, RequestScore]]  # (driver index, score of the request assigned to it)
+    unassigned_drivers: List[int]
+    method: str
+    total_score: float
+    timings_ms: Dict[str, float] = field(default_factory=dict)
+
+
+def top_per_row(matrix: np.ndarray, k: int) -> np.ndarray:
+    """Flat indices of the k largest entries in every row"""
+    n_rows, n_columns = matrix.shape
+    k = min(k, n_columns)
+    if k <= 0:
+        return np.empty(0, dtype=np.intp)
+    columns = np.argpartition(-matrix, k - 1, axis=1)[:, :k] if k < n_columns else np.broadcast_to(np.arange(n_columns), matrix.shape)
+    return (np.arange(n_rows)[:, None] * n_columns + columns).reshape(-1)
+
+
+def candidate_edges(matrix: np.ndarray, per_driver: int) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """Pruned (driver, request, score) edges: each driver's best requests plus each request's best drivers.
+
+    Keeping only drivers' favourites would leave most requests without an
+    edge when every driver ranks the same few rides highest; the
+    per-request side gives the matching somewhere else to send them.
+    -inf pairs are never edges.
+    """
+    n_drivers, n_requests = matrix.shape
+    if not matrix.size:
+        empty = np.empty(0, dtype=np.intp)
+        return empty, empty, np.empty(0)
+    by_driver = top_per_row(matrix, per_driver)
+    by_request = top_per_row(np.ascontiguousarray(matrix.T), per_driver)
+    by_request = (by_request % n_drivers) * n_requests + by_request // n_drivers  # Back to (driver, request) flat indices
+    flat = np.unique(np.concatenate([by_driver, by_request]))
+    scores = matrix.reshape(-1)[flat]
+    usable = np.isfinite(scores)
+    return flat[usable] // n_requests, flat[usable] % n_requests, scores[usable]
+
+
+def greedy_match(rows: np.ndarray, columns: np.ndarray, scores: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """Take edges from highest score down whenever both driver and request are still free"""
+    order = np.argsort(-scores, kind="stable")
+    taken_drivers, taken_requests = set(), set()
+    matched_rows, matched_columns = [], []
+    for row, column in zip(rows[order].tolist(), columns[order].tolist()):
+        if row in taken_drivers or column in taken_requests:
+            continue
+        taken_drivers.add(row)
+        taken_requests.add(column)
+        matched_rows.append(row)
+        matched_columns.append(column)
+    return np.array(matched_rows, dtype=np.intp), np.array(matched_columns, dtype=np.intp)
+
+
+def optimal_match(rows: np.ndarray, columns: np.ndarray, scores: np.ndarray, n_drivers: int) -> Tuple[np.ndarray, np.ndarray]:
+    """Maximum-score matching over the candidate edges (min-cost bipartite matching, LAPJVsp).
+
+    Every driver also gets a private "stay unassigned" edge that costs more
+    than any real edge, so a full matching always exists and the solver first
+    maximizes the number of drivers matched, then their total score.
+    """
+    from scipy.sparse import csr_matrix
+    from scipy.sparse.csgraph import min_weight_full_bipartite_matching
+
+    # Strictly positive costs: the sparse solver treats stored zeros as missing edges
+    costs = (scores.max() - scores) + 1.0 if len(scores) else scores
+    unassigned_cost = (costs.max() if len(costs) else 1.0) * (n_drivers + 1)
+    compact, request_ids = np.unique(columns, return_inverse=True)  # Only requests that are someone's candidate
+    request_ids = request_ids.reshape(-1)
+    dummy = len(compact) + np.arange(n_drivers)
+    graph = csr_matrix(
+        (np.r_[costs, np.full(n_drivers, unassigned_cost)],
+         (np.r_[rows, np.arange(n_drivers)], np.r_[request_ids, dummy])),
+        shape=(n_drivers, len(compact) + n_drivers)
+    )
+    _, matched = min_weight_full_bipartite_matching(graph)
+    real = matched < len(compact)
+    return np.flatnonzero(real), compact[matched[real]]
+
+
+class FleetAssigner:
+    """Assigns open requests to many drivers at once so they don't all chase the same best ride.
+
+    The evaluator builds the driver x request score matrix in bulk (with a
+    pickup radius, only the pairs a grid over the requests finds within it). It is
+    pruned to each driver's `candidates_per_driver` best requests and each
+    request's best drivers; the pruned bipartite graph is solved exactly with a sparse assignment solver, or
+    greedily (best remaining pair first) when it is larger than
+    `greedy_above_edges` or SciPy is unavailable.
+    """
+
+    def __init__(self, evaluator: RequestEvaluator, candidates_per_driver: int = 10, greedy_above_edges: int = 200000):
+        self.evaluator = evaluator
+        self.candidates_per_driver = candidates_per_driver
+        self.greedy_above_edges = greedy_above_edges
+
+    def assign(self, drivers: List[DriverProfile], requests: List[TripRequest], method: str = "auto") -> FleetAssignment:
+        """method is "optimal", "greedy" or "auto" (optimal unless the instance is too large)"""
+        if method not in ("auto", "optimal", "greedy"):
+            raise ValueError(f"Unknown assignment method {method!r}")
+        timings = {}
+        start = time.perf_counter()
+        # With a pickup radius, a grid over the requests limits each driver to the pickups within it
+        columns = self.evaluator.request_arrays(requests, self.evaluator.zone_router.graph)
+        columns, matrix = self.evaluator.score_matrix(columns, drivers, index=self.evaluator.request_index(columns))
+        timings["score_ms"] = (time.perf_counter() - start) * 1000
+
+        start = time.perf_counter()
+        rows, cols, scores = candidate_edges(matrix, self.candidates_per_driver)
+        timings["prune_ms"] = (time.perf_counter() - start) * 1000
+
+        start = time.perf_counter()
+        if method == "auto":
+            method = "optimal" if len(scores) <= self.greedy_above_edges else "greedy"
+        if method == "optimal" and len(scores):
+            try:
+                matched_rows, matched_cols = optimal_match(rows, cols, scores, len(drivers))
+            except ImportError:
+                logger.warning("SciPy is not installed, falling back to greedy assignment")
+                method = "greedy"
+        if method == "greedy" or not len(scores):
+            matched_rows, matched_cols = greedy_match(rows, cols, scores)
+        timings["match_ms"] = (time.perf_counter() - start) * 1000
+
+        start = time.perf_counter()
+        breakdowns = self.evaluator.score_pairs(columns, drivers, matched_cols, matched_rows)
+        timings["materialize_ms"] = (time.perf_counter() - start) * 1000
+
+        assignments = list(zip(matched_rows.tolist(), breakdowns))
+        unassigned = sorted(set(range(len(drivers))) - set(matched_rows.tolist()))
+        total = float(sum(score.final_score for _, score in assignments))
+        logger.info(f"Assigned {len(assignments)} of {len(drivers)} drivers to {len(columns.requests)} requests "
+                    f"({method}, total score {total:.1f}) in {sum(timings.values()):.0f} ms")
+        return FleetAssignment(assignments, unassigned, method, total, timings)
+
+
+if __name__ == "__main__":
+    import argparse
+    import random
+
+    parser = argparse.ArgumentParser(description="Time fleet assignment on a synthetic dispatch tick")
+    parser.add_argument("--drivers", type=int, default=1000)
+    parser.add_argument("--requests", type=int, default=5000)
+    parser.add_argument("--candidates", type=int, default=10)
+    args = parser.parse_args()
+
+    logging.getLogger("profitability_evaluatorV2").setLevel(logging.WARNING)
+    rng = random.Random(0)
+    zones = ["downtown", "suburb", "airport"]
+    requests = [
+        TripRequest(user_id=f"user{i}", distance=rng.uniform(1, 20), duration=rng.uniform(5, 60), zone=rng.choice(zones),
+                    timestamp=time.time(), ride_demand_level=3, traffic_level=2, weather_severity=0, traffic_blocks=1,
+                    is_holiday=False, is_event_nearby=False, fare=rng.uniform(50, 400), rideId=i,
+                    pickup_lat=12.97 + rng.gauss(0, 0.05), pickup_lon=77.59 + rng.gauss(0, 0.05))
+        for i in range(args.requests)
+    ]
+    drivers = [
+        DriverProfile(current_location=rng.choice(zones), current_fuel=80.0, shift_remaining_time=rng.choice([45.0, 120.0, 240.0]),
+                      earnings_today=100.0, earnings_target=250.0, vehicle_mpg=25.0, cost_per_mile=rng.uniform(0.25, 0.4),
+                      return_to_base=rng.random() < 0.3, base_location="downtown",
+                      current_lat=12.97 + rng.gauss(0, 0.05), current_lon=77.59 + rng.gauss(0, 0.05))
+        for _ in range(args.drivers)
+    ]
+
+    assigner = FleetAssigner(RequestEvaluator(), candidates_per_driver=args.candidates)
+    assigner.assign(drivers[:10], requests[:10], "optimal")  # Warm up: SciPy import and first-call overheads
+    for method in ("optimal", "greedy"):
+        result = assigner.assign(drivers, requests, method)
+        timings = ", ".join(f"{name} {ms:.0f}" for name, ms in result.timings_ms.items())
+        print(f"{method:<8} matched {len(result.assignments)}/{len(drivers)}  total score {result.total_score:10.1f}  "
+              f"{sum(result.timings_ms.values()):6.0f} ms ({timings})")
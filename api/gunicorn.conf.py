@@ -0,0 +1,52 @@
+"""Gunicorn settings for serving appV2 in production: gunicorn -c gunicorn.conf.py appV2:app
+
+Every setting can be overridden on the command line. Environment:
+TAXIMAX_HOST/TAXIMAX_PORT (bind), TAXIMAX_WORKERS (processes, default one per
+CPU), TAXIMAX_THREADS (threads per worker), TAXIMAX_PRELOAD=1 (build the app
+once in the master and share it with the workers copy-on-write),
+TAXIMAX_KEEP_ALIVE, TAXIMAX_TIMEOUT and TAXIMAX_GRACEFUL_TIMEOUT (seconds).
+The /pool endpoints keep their state in one process and answer 503 unless
+TAXIMAX_WORKERS=1.
+"""
+import gc
+import os
+import sys
+
+bind = f"{os.environ.get('TAXIMAX_HOST', '0.0.0.0')}:{os.environ.get('TAXIMAX_PORT', '8003')}"
+workers = int(os.environ.get("TAXIMAX_WORKERS", str(os.cpu_count() or 1)))
+# Threaded workers keep idle HTTP/1.1 connections open between polls; the sync worker closes every one
+worker_class = "gthread"
+threads = int(os.environ.get("TAXIMAX_THREADS", "16"))
+keepalive = int(os.environ.get("TAXIMAX_KEEP_ALIVE", "5"))
+timeout = int(os.environ.get("TAXIMAX_TIMEOUT", "30"))  # A worker that stops heartbeating this long is replaced
+graceful_timeout = int(os.environ.get("TAXIMAX_GRACEFUL_TIMEOUT", "30"))
+preload_app = os.environ.get("TAXIMAX_PRELOAD", "0") == "1"
+backlog = 2048
+# Request line and header limits; body size is limited by appV2 (TAXIMAX_MAX_BODY_MB)
+limit_request_line = 8190
+limit_request_fields = 100
+
+
+def when_ready(server):
+    """With preload_app, the app is already built: finish warmup, stop its threads and freeze it before workers fork"""
+    app_module = sys.modules.get("appV2")
+    if app_module is None:
+        return
+    app_module.ready.wait()
+    app_module.before_fork()
+    gc.freeze()  # Keep the collector from touching (and so copying) the shared objects in every worker
+
+
+def post_fork(server, worker):
+    """Tell the app how many workers share the load, and restart the preloaded app's background threads;
+    fork copies no threads"""
+    os.environ["TAXIMAX_WORKERS"] = str(server.num_workers)
+    app_module = sys.modules.get("appV2")
+    if app_module is not None:
+        app_module.after_fork()
+
+
+def on_reload(server):
+    """HUP replaces the workers; with preload_app they fork from the app already in the master, so new code needs a restart"""
+    if "appV2" in sys.modules:
+        server.log.info("Reloading workers from the preloaded app; restart gunicorn to load changed code")
@@ -0,0 +1,337 @@
+import os
+import csv
+import sys
+import json
+import time
+import random
+import logging
+import threading
+import subprocess
+import multiprocessing
+import http.client
+import numpy as np
+from typing import Dict, List, Optional
+
+# Configure logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+ZONES = ["downtown", "suburb", "airport"]
+WEATHER_SEVERITY = {'Clear': 0, 'Rainy': 1, 'Foggy': 2, 'Snowy': 3}
+KM_PER_MILE = 1.60934
+
+# How to start each server locally: the command and the port it listens on
+SERVERS = {
+    "app": ([sys.executable, "-m", "uvicorn", "app:app", "--port", "{port}", "--log-level", "warning"], 8000),
+    "appV2": ([sys.executable, "-c", "from appV2 import app; app.run(port={port}, threaded=True)"], 8003),
+    # Production setup: workers from TAXIMAX_WORKERS, shared preloaded app with TAXIMAX_PRELOAD=1
+    "appV2-gunicorn": ([sys.executable, "-m", "gunicorn", "-c", "gunicorn.conf.py", "--bind", "127.0.0.1:{port}", "appV2:app"], 8003),
+}
+
+
+def read_rows(path: str, limit: Optional[int] = None) -> List[Dict]:
+    """Rows of realistic_taxi_data.csv or taximax_extended_parameters.csv (same columns)"""
+    with open(path, newline="") as f:
+        rows = []
+        for row in csv.DictReader(f):
+            rows.append(row)
+            if limit is not None and len(rows) >= limit:
+                break
+    return rows
+
+
+def trip_fields(row: Dict, rng: random.Random) -> Dict:
+    """TripRequestModel fields for one CSV row"""
+    distance_km = float(row["distance_km"])
+    return {
+        "user_id": f"user{rng.randrange(1000)}",
+        "distance": round(distance_km / KM_PER_MILE, 3),
+        "duration": round(max(5.0, distance_km * 3 + rng.gauss(0, 5)), 1),  # ~20 km/h, like the generator
+        "zone": rng.choice(ZONES),
+        "ride_demand_level": int(row["ride_demand_level"]),
+        "traffic_level": int(row["traffic_level"]),
+        "weather_severity": WEATHER_SEVERITY.get(row["weather_condition"], 0),
+        "traffic_blocks": int(row["traffic_blocks"]),
+        "is_holiday": row["holiday"] == "1",
+        "is_event_nearby": row["event_nearby"] == "1"
+    }
+
+
+def pricing_payload(row: Dict, rng: random.Random) -> Dict:
+    """Body in the PricingRequest schema of app.py (also accepted by appV2.py)"""
+    return {
+        "trip_request": trip_fields(row, rng),
+        "user_profile": {"loyalty_tier": rng.randint(1, 5), "price_sensitivity": round(rng.uniform(0.8, 1.2), 2)},
+        "current_supply": rng.randint(1, 50)
+    }
+
+
+def rank_payload(rows: List[Dict], rng: random.Random, first_ride_id: int) -> Dict:
+    """Body in the /rank-requests schema of appV2.py: one driver and a set of candidate rides"""
+    now = time.time()
+    ride_requests = []
+    for offset, row in enumerate(rows):
+        trip = trip_fields(row, rng)
+        trip.update(timestamp=now, fare=float(row["fare"]), rideId=first_ride_id + offset)
+        ride_requests.append(trip)
+    return {
+        "driver_profile": {
+            "current_location": rng.choice(ZONES),
+            "current_fuel": round(rng.uniform(20, 100), 1),
+            "shift_remaining_time": rng.choice([45.0, 120.0, 240.0]),
+            "earnings_today": round(rng.uniform(0, 300), 2),
+            "earnings_target": 250.0,
+            "vehicle_mpg": 25.0,
+            "cost_per_mile": 0.32,
+            "return_to_base": rng.random() < 0.5,
+            "base_location": "downtown",
+            "min_acceptable_fare": 8.0
+        },
+        "user_profiles": {
+            trip["user_id"]: {"loyalty_tier": rng.randint(1, 5), "price_sensitivity": 1.0} for trip in ride_requests
+        },
+        "rideRequests": ride_requests,
+        "current_supply": rng.randint(1, 50)
+    }
+
+
+def build_payloads(rows: List[Dict], endpoint: str, n: int, candidates: int, seed: int) -> List[bytes]:
+    """n encoded request bodies, cycling through the CSV rows"""
+    rng = random.Random(seed)
+    payloads = []
+    for i in range(n):
+        if endpoint == "/rank-requests":
+            chosen = [rows[(i * candidates + j) % len(rows)] for j in range(candidates)]
+            body = rank_payload(chosen, rng, i * candidates)
+        else:
+            body = pricing_payload(rows[i % len(rows)], rng)
+        payloads.append(json.dumps(body).encode())
+    return payloads
+
+
+class Replay:
+    """Open-loop replay: request i is due at start + i / rate, whether or not earlier ones have finished.
+
+    Latency is measured from the due time, so time spent waiting for a free
+    connection counts against the server instead of silently lowering the
+    offered rate. Each worker thread keeps one keep-alive connection.
+    """
+
+    def __init__(self, host: str, port: int, endpoint: str, payloads: List[bytes], rate: float,
+                 concurrency: int, timeout: float = 10.0):
+        self.host, self.port, self.endpoint = host, port, endpoint
+        self.payloads = payloads
+        self.rate = rate
+        self.concurrency = concurrency
+        self.timeout = timeout
+        self.latencies = np.full(len(payloads), np.nan)
+        self.service_times = np.full(len(payloads), np.nan)
+        self.statuses = np.zeros(len(payloads), dtype=int)  # 0 means a connection error or timeout
+        self._next = 0
+        self._lock = threading.Lock()
+
+    def _take(self) -> Optional[int]:
+        with self._lock:
+            if self._next >= len(self.payloads):
+                return None
+            self._next += 1
+            return self._next - 1
+
+    def _worker(self, start: float):
+        connection = None
+        headers = {"Content-Type": "application/json"}
+        while (i := self._take()) is not None:
+            due = start + i / self.rate
+            delay = due - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+            sent = time.perf_counter()
+            try:
+                if connection is None:
+                    connection = http.client.HTTPConnection(self.host, self.port, timeout=self.timeout)
+                connection.request("POST", self.endpoint, self.payloads[i], headers)
+                response = connection.getresponse()
+                response.read()
+                self.statuses[i] = response.status
+                if response.getheader("Connection", "").lower() == "close":
+                    connection.close()
+                    connection = None
+            except (OSError, http.client.HTTPException) as e:
+                logger.debug(f"Request {i} failed: {e}")
+                if connection is not None:
+                    connection.close()
+                connection = None
+            done = time.perf_counter()
+            self.latencies[i] = done - due
+            self.service_times[i] = done - sent
+        if connection is not None:
+            connection.close()
+
+    def run(self) -> Dict:
+        start = time.perf_counter() + 0.05  # Give every worker time to start before the first request is due
+        workers = [threading.Thread(target=self._worker, args=(start,), daemon=True) for _ in range(self.concurrency)]
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
+        return summarize(self.latencies, self.service_times, self.statuses, time.perf_counter() - start, self.rate)
+
+
+def percentiles_ms(samples: np.ndarray) -> Dict[str, float]:
+    samples = samples[~np.isnan(samples)] * 1000
+    if not len(samples):
+        return {}
+    return {
+        "p50_ms": float(np.percentile(samples, 50)),
+        "p95_ms": float(np.percentile(samples, 95)),
+        "p99_ms": float(np.percentile(samples, 99)),
+        "p99.9_ms": float(np.percentile(samples, 99.9)),
+        "max_ms": float(samples.max()),
+        "mean_ms": float(samples.mean())
+    }
+
+
+def summarize(latencies: np.ndarray, service_times: np.ndarray, statuses: np.ndarray, elapsed: float, rate: float) -> Dict:
+    ok = (statuses >= 200) & (statuses < 300)
+    return {
+        "requests": len(statuses),
+        "ok": int(ok.sum()),
+        "errors": int((~ok).sum()),
+        "error_rate": float((~ok).mean()) if len(statuses) else 0.0,
+        "status_counts": {str(code): int(count) for code, count in zip(*np.unique(statuses, return_counts=True))},
+        "offered_rate": rate,
+        "elapsed_s": elapsed,
+        "throughput_per_s": float(ok.sum() / elapsed) if elapsed > 0 else 0.0,
+        "latency": percentiles_ms(np.where(ok, latencies, np.nan)),  # From the due time, includes queueing
+        "service_time": percentiles_ms(np.where(ok, service_times, np.nan))  # From the actual send
+    }
+
+
+def start_server(name: str, port: int, env: Optional[Dict] = None, log_path: str = "load_replay_server.log",
+                 ready_timeout: float = 120.0) -> subprocess.Popen:
+    """Start app.py or appV2.py locally and wait until /ready answers 200; its output goes to log_path"""
+    command = [part.format(port=port) for part in SERVERS[name][0]]
+    with open(log_path, "w") as log:
+        process = subprocess.Popen(command, env=env, stdout=log, stderr=subprocess.STDOUT)
+    deadline = time.time() + ready_timeout
+    while time.time() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f"{name} exited with code {process.returncode} during startup, see {log_path}")
+        try:
+            connection = http.client.HTTPConnection("127.0.0.1", port, timeout=1.0)
+            connection.request("GET", "/ready")
+            status = connection.getresponse().status
+            connection.close()
+            if status == 200:
+                logger.info(f"{name} is ready on port {port}")
+                return process
+        except (OSError, http.client.HTTPException):
+            pass
+        time.sleep(0.2)
+    process.terminate()
+    raise TimeoutError(f"{name} did not become ready within {ready_timeout:.0f}s")
+
+
+def scaling_report(worker_counts: List[int], payloads: List[List[bytes]], endpoint: str, concurrency: int,
+                   port: int, preload: bool) -> List[Dict]:
+    """Saturating load against appV2 under gunicorn at each worker count; one client process per payload list"""
+    rate = 1e6  # Everything is due at once, so throughput is bounded by the server alone
+    context = multiprocessing.get_context("fork")
+    results = []
+    for workers in worker_counts:
+        env = {**os.environ, "TAXIMAX_WARMUP": "1", "TAXIMAX_WORKERS": str(workers), "TAXIMAX_PRELOAD": "1" if preload else "0"}
+        server = start_server("appV2-gunicorn", port, env, f"load_replay_{workers}_workers.log")
+        try:
+            # Several client processes, so the load generator's own GIL is not the bottleneck
+            with context.Pool(len(payloads)) as pool:
+                parts = pool.starmap(_client, [("127.0.0.1", port, endpoint, part, rate, max(1, concurrency // len(payloads)))
+                                               for part in payloads])
+        finally:
+            server.terminate()
+            server.wait()
+        latencies, service_times, statuses = (np.concatenate([part[i] for part in parts]) for i in range(3))
+        summary = summarize(latencies, service_times, statuses, max(part[3] for part in parts), rate)
+        results.append({"workers": workers, **summary})
+    return results
+
+
+def _client(host: str, port: int, endpoint: str, payloads: List[bytes], rate: float, concurrency: int):
+    """One load-generating process: its latencies, service times, statuses and elapsed seconds"""
+    replay = Replay(host, port, endpoint, payloads, rate, concurrency)
+    start = time.perf_counter()
+    replay.run()
+    return replay.latencies, replay.service_times, replay.statuses, time.perf_counter() - start
+
+
+def print_summary(summary: Dict):
+    print(f"\n{summary['requests']} requests at {summary['offered_rate']:.0f}/s offered: "
+          f"{summary['throughput_per_s']:.1f}/s completed, error rate {summary['error_rate']:.2%} {summary['status_counts']}")
+    for name in ("latency", "service_time"):
+        stats = summary[name]
+        if stats:
+            print(f"  {name:<13} p50 {stats['p50_ms']:8.1f} ms  p95 {stats['p95_ms']:8.1f}  p99 {stats['p99_ms']:8.1f}  "
+                  f"p99.9 {stats['p99.9_ms']:8.1f}  max {stats['max_ms']:8.1f}")
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Replay CSV trips against /calculate_price or /rank-requests at an open-loop rate")
+    parser.add_argument("--csv", default="../realistic_taxi_data.csv", help="realistic_taxi_data.csv or taximax_extended_parameters.csv")
+    parser.add_argument("--endpoint", default="/calculate_price", choices=["/calculate_price", "/rank-requests"])
+    parser.add_argument("--rate", type=float, default=50.0, help="Offered requests per second")
+    parser.add_argument("--duration", type=float, default=10.0, help="Seconds of traffic to offer")
+    parser.add_argument("--concurrency", type=int, default=16, help="Connections (worker threads)")
+    parser.add_argument("--candidates", type=int, default=10, help="Ride requests per /rank-requests call")
+    parser.add_argument("--timeout", type=float, default=10.0)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, help="Defaults to the port of --start-server, else 8000")
+    parser.add_argument("--start-server", choices=sorted(SERVERS), help="Start this server locally for the run")
+    parser.add_argument("--server-log", default="load_replay_server.log", help="Output of the --start-server process")
+    parser.add_argument("--out", default="load_replay_results.json")
+    parser.add_argument("--scaling-report", metavar="COUNTS",
+                        help="Instead of a replay, saturate appV2 under gunicorn at each comma-separated worker count, e.g. 1,2,4")
+    parser.add_argument("--requests", type=int, default=2000, help="Requests per worker count (--scaling-report)")
+    parser.add_argument("--clients", type=int, default=2, help="Load-generating processes (--scaling-report)")
+    parser.add_argument("--preload", action="store_true", help="Share one preloaded app between the workers (--scaling-report)")
+    args = parser.parse_args()
+
+    if args.scaling_report:
+        counts = [int(count) for count in args.scaling_report.split(",")]
+        rows = read_rows(args.csv)
+        payloads = [build_payloads(rows, args.endpoint, max(1, args.requests // args.clients), args.candidates, args.seed + i)
+                    for i in range(args.clients)]
+        results = scaling_report(counts, payloads, args.endpoint, args.concurrency, args.port or 8003, args.preload)
+        print(f"\n{args.endpoint} on {os.cpu_count()} CPUs{' (preload)' if args.preload else ''}")
+        print(f"{'workers':>8}{'req/s':>10}{'speedup':>9}{'p50 ms':>9}{'p99 ms':>9}{'errors':>9}")
+        base = results[0]["throughput_per_s"] or 1.0
+        for row in results:
+            latency = row["service_time"] or {}
+            print(f"{row['workers']:>8}{row['throughput_per_s']:>10.1f}{row['throughput_per_s'] / base:>9.2f}"
+                  f"{latency.get('p50_ms', float('nan')):>9.1f}{latency.get('p99_ms', float('nan')):>9.1f}{row['error_rate']:>9.2%}")
+        sys.exit(0)
+
+    if args.endpoint == "/rank-requests" and args.start_server == "app":
+        parser.error("/rank-requests is only served by appV2")
+    port = args.port or (SERVERS[args.start_server][1] if args.start_server else 8000)
+
+    n = max(1, int(args.rate * args.duration))
+    payloads = build_payloads(read_rows(args.csv), args.endpoint, n, args.candidates, args.seed)
+
+    server = None
+    if args.start_server:
+        env = {**os.environ, "TAXIMAX_WARMUP": "1"}
+        server = start_server(args.start_server, port, env, args.server_log)
+    try:
+        summary = Replay(args.host, port, args.endpoint, payloads, args.rate, args.concurrency, args.timeout).run()
+    finally:
+        if server is not None:
+            server.terminate()
+            server.wait()
+
+    print_summary(summary)
+    report = {"meta": {**vars(args), "port": port, "created": time.strftime("%Y-%m-%dT%H:%M:%S")}, "results": summary}
+    with open(args.out, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"\nWrote {args.out}")
@@ -0,0 +1,137 @@
+import asyncio
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Optional
+from pricing_engine import PricingEngine, TripRequest, UserProfile
+
+# Configure logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+class MicroBatcher:
+    """Gathers concurrent price quotes into micro-batches priced with one model call.
+
+    Handlers await submit(). A collector task takes the first queued quote,
+    keeps collecting until max_batch_size quotes are queued or max_wait_ms
+    has passed, then prices the batch with PricingEngine.calculate_price_batch
+    on a single worker thread so the event loop never blocks on the model.
+    If the batch call raises, its quotes are priced one at a time so an
+    error reaches only the caller whose quote caused it.
+    """
+
+    def __init__(self, pricing_engine: PricingEngine, max_batch_size: int = 64, max_wait_ms: float = 2.0):
+        if max_batch_size < 1:
+            raise ValueError("max_batch_size must be at least 1")
+        self.pricing_engine = pricing_engine
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000
+        self._queue: Optional[asyncio.Queue] = None
+        self._task: Optional[asyncio.Task] = None
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self.batches = 0
+        self.quotes = 0
+
+    async def start(self):
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="pricing-batch")
+        self._queue = asyncio.Queue()
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        # Fail anything still queued rather than leaving handlers waiting forever
+        while self._queue is not None and not self._queue.empty():
+            self._fail([self._queue.get_nowait()], RuntimeError("Pricing batcher stopped"))
+        if self._executor is not None:
+            executor, self._executor = self._executor, None
+            # Let a batch already on the pricing thread finish without blocking the event loop
+            await asyncio.get_running_loop().run_in_executor(None, executor.shutdown)
+
+    async def submit(self, trip_request: TripRequest, user: UserProfile, current_supply: int) -> float:
+        """Queue one quote and wait for its price"""
+        if self._task is None:
+            raise RuntimeError("MicroBatcher.start() has not been called")
+        future = asyncio.get_running_loop().create_future()
+        await self._queue.put((trip_request, user, current_supply, future))
+        return await future
+
+    def stats(self) -> Dict[str, float]:
+        return {
+            "batches": self.batches,
+            "quotes": self.quotes,
+            "mean_batch_size": self.quotes / self.batches if self.batches else 0.0,
+            "max_batch_size": self.max_batch_size,
+            "max_wait_ms": self.max_wait * 1000
+        }
+
+    async def _collect(self, batch: list):
+        """Fill batch in place, so quotes already taken from the queue are known if the task is cancelled"""
+        loop = asyncio.get_running_loop()
+        batch.append(await self._queue.get())
+        deadline = loop.time() + self.max_wait
+        while len(batch) < self.max_batch_size:
+            if not self._queue.empty():
+                batch.append(self._queue.get_nowait())
+                continue
+            remaining = deadline - loop.time()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(await asyncio.wait_for(self._queue.get(), remaining))
+            except asyncio.TimeoutError:
+                break
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = []
+            try:
+                await self._collect(batch)
+                requests, users, supplies, futures = zip(*batch)
+                try:
+                    results = await loop.run_in_executor(
+                        self._executor, self.pricing_engine.calculate_price_batch, list(requests), list(users), list(supplies)
+                    )
+                except Exception as e:
+                    logger.error(f"Micro-batch pricing failed, pricing its {len(batch)} quotes one at a time: {e}")
+                    results = await loop.run_in_executor(self._executor, self._price_each, batch)
+            except Exception as e:
+                logger.error(f"Micro-batch pricing failed: {e}")
+                self._fail(batch, e)
+                continue
+            except BaseException:
+                # Cancelled by stop() while collecting or pricing: this batch is no longer in the queue
+                self._fail(batch, RuntimeError("Pricing batcher stopped"))
+                raise
+
+            self.batches += 1
+            self.quotes += len(batch)
+            for future, result in zip(futures, results):
+                if future.done():  # The handler may have been cancelled
+                    continue
+                if isinstance(result, Exception):
+                    future.set_exception(result)
+                else:
+                    future.set_result(result)
+
+    def _price_each(self, batch: list) -> list:
+        """Each quote's price, or the exception pricing it raised"""
+        results = []
+        for trip_request, user, current_supply, _ in batch:
+            try:
+                results.append(self.pricing_engine.calculate_price(trip_request, user, current_supply))
+            except Exception as e:
+                results.append(e)
+        return results
+
+    @staticmethod
+    def _fail(batch: list, error: BaseException):
+        for *_, future in batch:
+            if not future.done():
+                future.set_exception(error)
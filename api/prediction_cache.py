@@ -0,0 +1,81 @@
+import time
+import threading
+from collections import OrderedDict
+from typing import Dict, Hashable, List, Optional, Sequence
+
+
+class PredictionCache:
+    """Bounded LRU cache of fare model predictions with a time-to-live.
+
+    Entries are evicted least-recently-used once max_size is reached and are
+    dropped on lookup once older than ttl seconds. clear() bumps a generation
+    counter so predictions computed against a model that has since been
+    reloaded are never written back.
+    """
+
+    def __init__(self, max_size: int, ttl: float, clock=time.monotonic):
+        if max_size <= 0:
+            raise ValueError("max_size must be positive")
+        self.max_size = max_size
+        self.ttl = ttl
+        self._clock = clock
+        self._entries: "OrderedDict[Hashable, tuple]" = OrderedDict()  # key -> (expires_at, value)
+        self._lock = threading.Lock()
+        self.generation = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def get_many(self, keys: Sequence[Hashable]) -> List[Optional[float]]:
+        """Look up keys, returning None for misses and expired entries"""
+        now = self._clock()
+        results = []
+        with self._lock:
+            for key in keys:
+                entry = self._entries.get(key)
+                if entry is not None and entry[0] <= now:
+                    del self._entries[key]
+                    self.expirations += 1
+                    entry = None
+                if entry is None:
+                    self.misses += 1
+                    results.append(None)
+                else:
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    results.append(entry[1])
+        return results
+
+    def put_many(self, keys: Sequence[Hashable], values: Sequence[float], generation: Optional[int] = None):
+        """Store predictions; skipped if the cache was cleared since `generation` was read"""
+        expires_at = self._clock() + self.ttl
+        with self._lock:
+            if generation is not None and generation != self.generation:
+                return
+            for key, value in zip(keys, values):
+                self._entries[key] = (expires_at, value)
+                self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self):
+        """Drop every entry, e.g. after the model is reloaded"""
+        with self._lock:
+            self._entries.clear()
+            self.generation += 1
+
+    def stats(self) -> Dict[str, float]:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "size": len(self._entries),
+                "max_size": self.max_size,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+                "generation": self.generation
+            }
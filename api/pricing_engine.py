@@ -1,16 +1,33 @@
+import os
 import time
 import logging
-import joblib
-import pandas as pd
 from dataclasses import dataclass
-from typing import Dict, Optional
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple, Union
 import numpy as np
-from sklearn.linear_model import LinearRegression
+from compiled_forest import CompiledForest, compare_with_pipeline
+from shared_model import load_shared_forest
+from prediction_cache import PredictionCache
+from fare_surface import FareSurface, load_or_build
+from demand_forecaster import DemandForecaster
+from surge_state import SurgeState, surge_curve, demand_time_weight
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# pandas, joblib and sklearn are imported lazily: with the compiled or shared
+# backends the engine can start and serve without importing them at all.
+
+# Model features, in training order
+ML_FEATURES = [
+    'distance_km', 'traffic_level', 'ride_demand_level',
+    'traffic_impact', 'weather_severity', 'hour_of_day',
+    'is_peak_hour', 'is_night', 'distance_squared', 'log_distance',
+    'special_conditions'
+]
+PEAK_HOURS = [7, 8, 9, 17, 18, 19]
+NIGHT_HOURS = list(range(22, 24)) + list(range(0, 6))
+
 # ========== Data Models ==========
 @dataclass
 class PricingConfig:
@@ -31,8 +48,53 @@ class PricingConfig:
     # Time-based rate adjustments
     night_rate_multiplier: float = 1.1  # For rides between 11 PM and 5 AM
     peak_rate_multiplier: float = 1.2   # For peak hours (8-10 AM, 4-7 PM)
+    
+    # Fare model inference
+    model_path: str = "dynamic_pricing_model.joblib"
+    inference_backend: str = "sklearn"  # "sklearn" pipeline, "compiled" array-backed forest, or "shared" memory-mapped forest
+    model_store_path: str = "dynamic_pricing_model.forest"  # Forest file shared by all workers in "shared" mode
+    compiled_validation_data: Optional[str] = None  # CSV of raw trips to check the compiled model against sklearn at startup
+    
+    # Fare prediction cache (0 disables it)
+    prediction_cache_size: int = 0
+    prediction_cache_ttl: float = 300.0           # seconds
+    prediction_cache_distance_step: float = 0.05  # km; distances are quantized to this step before predicting
+    
+    # Pricing mode: "model" calls the fare model, "surface" interpolates a precomputed fare table
+    pricing_mode: str = "model"
+    fare_surface_path: str = "dynamic_pricing_surface.bin"
+    fare_surface_max_km: float = 60.0   # Longer trips fall back to the model
+    fare_surface_step_km: float = 0.5
+    
+    # Demand forecasting
+    demand_history_path: Optional[str] = None  # CSV of past trips (zone, timestamp) to fit per-zone demand
+    demand_refresh_interval: float = 0.0       # seconds between background refits; 0 disables refreshing
+    
+    # Surge source: "forecast" (forecast demand / current_supply per quote) or
+    # "stream" (per-zone multiplier maintained from supply/demand events)
+    surge_mode: str = "forecast"
+    surge_window_seconds: int = 300
 
-@dataclass
+    @classmethod
+    def from_env(cls, environ=os.environ) -> "PricingConfig":
+        """Defaults overridden by the TAXIMAX_* settings the services are configured with"""
+        config = cls()
+        config.inference_backend = environ.get("TAXIMAX_INFERENCE_BACKEND", config.inference_backend)
+        config.surge_mode = environ.get("TAXIMAX_SURGE_MODE", config.surge_mode)
+        config.surge_window_seconds = int(environ.get("TAXIMAX_SURGE_WINDOW_SECONDS", config.surge_window_seconds))
+        config.demand_history_path = environ.get("TAXIMAX_DEMAND_HISTORY", config.demand_history_path)
+        config.demand_refresh_interval = float(environ.get("TAXIMAX_DEMAND_REFRESH_SECONDS", config.demand_refresh_interval))
+        config.prediction_cache_size = int(environ.get("TAXIMAX_PREDICTION_CACHE_SIZE", config.prediction_cache_size))
+        config.prediction_cache_ttl = float(environ.get("TAXIMAX_PREDICTION_CACHE_TTL_SECONDS", config.prediction_cache_ttl))
+        config.prediction_cache_distance_step = float(environ.get("TAXIMAX_PREDICTION_CACHE_DISTANCE_STEP_KM",
+                                                                  config.prediction_cache_distance_step))
+        config.pricing_mode = environ.get("TAXIMAX_PRICING_MODE", config.pricing_mode)
+        config.fare_surface_path = environ.get("TAXIMAX_FARE_SURFACE_PATH", config.fare_surface_path)
+        config.fare_surface_max_km = float(environ.get("TAXIMAX_FARE_SURFACE_MAX_KM", config.fare_surface_max_km))
+        config.fare_surface_step_km = float(environ.get("TAXIMAX_FARE_SURFACE_STEP_KM", config.fare_surface_step_km))
+        return config
+
+@dataclass(slots=True)  # No per-instance __dict__; see compact.RequestArray for large collections
 class TripRequest:
     user_id: str
     distance: float         # miles
@@ -47,35 +109,115 @@ class TripRequest:
     is_event_nearby: bool   # Real-time event status
     fare: float=None
     rideId:int=None
+    pickup_lat: Optional[float] = None  # Pickup coordinates, when the client sends them
+    pickup_lon: Optional[float] = None
+    dropoff_zone: Optional[str] = None  # Where the trip ends, when known
 
 @dataclass
 class UserProfile:
     loyalty_tier: int = 1   # 1 (low) to 5 (high)
     price_sensitivity: float = 1.0  # 1.0 (neutral), <1 (discount), >1 (premium)
 
-# ========== Demand Forecaster ==========
-class DemandForecaster:
-    """Predicts future demand using simple linear regression."""
-    
-    def __init__(self):
-        self.model = LinearRegression()
-    
-    def train(self, historical_data: np.ndarray):
-        # Historical data format: [hour_of_day, demand]
-        X = historical_data[:, 0].reshape(-1, 1)  # hour_of_day
-        y = historical_data[:, 1]  # demand
-        self.model.fit(X, y)
-    
-    def predict_demand(self, hour: int) -> float:
-        return self.model.predict(np.array([[hour]]))[0]
-
 # ========== Core Pricing Engine ==========
 class PricingEngine:
     def __init__(self, config: PricingConfig):
         self.config = config
-        self.demand_forecaster = DemandForecaster()
-        self.fare_model = joblib.load("dynamic_pricing_model.joblib")  # Load ML model
+        self.demand_forecaster = DemandForecaster(config.demand_history_path, config.demand_refresh_interval)
+        self.surge_state = self._build_surge_state()
+        self.prediction_cache = None
+        self.fare_surface = None
+        if config.prediction_cache_size > 0:
+            self.prediction_cache = PredictionCache(config.prediction_cache_size, config.prediction_cache_ttl)
+        start = time.perf_counter()
+        self.reload_model()  # Load ML model
         self._load_historical_data()
+        self.startup_timings = {"load_ms": (time.perf_counter() - start) * 1000}
+    
+    def warmup(self, n_requests: int = 32) -> Dict[str, float]:
+        """Price representative trips so lazy imports and first-call costs are paid before serving"""
+        zones = ["downtown", "suburb", "airport"]
+        now = time.time()
+        requests = [
+            TripRequest(
+                user_id=f"warmup{i}",
+                distance=1.0 + (i * 7) % 20,
+                duration=8.0 + (i * 11) % 50,
+                zone=zones[i % len(zones)],
+                timestamp=now + 3600 * (i % 24),
+                ride_demand_level=1 + i % 5,
+                traffic_level=1 + (i // 5) % 5,
+                weather_severity=i % 4,
+                traffic_blocks=1 + (i // 3) % 5,
+                is_holiday=i % 7 == 0,
+                is_event_nearby=i % 11 == 0
+            )
+            for i in range(n_requests)
+        ]
+        users = [UserProfile(loyalty_tier=1 + i % 5) for i in range(n_requests)]
+        
+        start = time.perf_counter()
+        self.calculate_price(requests[0], users[0], current_supply=20)
+        first_ms = (time.perf_counter() - start) * 1000
+        for request, user in zip(requests[1:8], users[1:8]):
+            self.calculate_price(request, user, current_supply=20)
+        self.calculate_price_batch(requests, users, current_supply=20)
+        total_ms = (time.perf_counter() - start) * 1000
+        
+        self.startup_timings.update({"first_request_ms": first_ms, "warmup_ms": total_ms})
+        logger.info(f"Warmup done: first request {first_ms:.1f} ms, total {total_ms:.1f} ms")
+        return self.startup_timings
+    
+    def reload_model(self, path: Optional[str] = None):
+        """Load the fare model and rebuild everything derived from it"""
+        path = path or self.config.model_path
+        if self.config.inference_backend == "shared":
+            # Attach to the forest file all workers map; no private sklearn copy is loaded
+            fare_model, compiled_model = None, load_shared_forest(self.config.model_store_path, path)
+        else:
+            import joblib
+            fare_model = joblib.load(path)
+            compiled_model = self._build_inference_backend(fare_model)
+        if compiled_model is not None and compiled_model.feature_names != ML_FEATURES:
+            raise ValueError(f"Fare model features {compiled_model.feature_names} do not match {ML_FEATURES}")
+        self.fare_model, self.compiled_model = fare_model, compiled_model
+        
+        # Cached predictions and the fare surface belong to the previous model
+        if self.prediction_cache is not None:
+            self.prediction_cache.clear()
+        self.fare_surface = self._load_fare_surface(path)
+        logger.info(f"Loaded fare model from {path}")
+    
+    def _load_fare_surface(self, model_path: str) -> Optional[FareSurface]:
+        """Open (or build and save) the fare surface when surface pricing is selected"""
+        if self.config.pricing_mode == "model":
+            return None
+        if self.config.pricing_mode != "surface":
+            raise ValueError(f"Unknown pricing mode: {self.config.pricing_mode}")
+        return load_or_build(
+            self.config.fare_surface_path, model_path, self._predict_fares, self._prepare_model_input,
+            self.config.fare_surface_max_km, self.config.fare_surface_step_km
+        )
+    
+    def cache_stats(self) -> Optional[Dict[str, float]]:
+        """Hit/miss/eviction counters of the prediction cache, if enabled"""
+        return self.prediction_cache.stats() if self.prediction_cache is not None else None
+    
+    def _build_inference_backend(self, fare_model) -> Optional[CompiledForest]:
+        """Compile the fare model when the compiled backend is selected"""
+        if self.config.inference_backend == "sklearn":
+            return None
+        if self.config.inference_backend != "compiled":
+            raise ValueError(f"Unknown inference backend: {self.config.inference_backend}")
+        
+        compiled = CompiledForest.from_pipeline(fare_model)
+        logger.info(f"Compiled fare model: {compiled.n_trees} trees, {compiled.n_nodes} nodes")
+        
+        if self.config.compiled_validation_data:
+            from base_price_model import load_data, engineer_features
+            X = engineer_features(load_data(self.config.compiled_validation_data)).drop('fare', axis=1)
+            report = compare_with_pipeline(fare_model, compiled, X)
+            logger.info(f"Compiled model max |diff| vs sklearn on {report['rows']} rows: {report['max_abs_diff']:.3e}")
+        return compiled
         
     def _load_historical_data(self):
         # Simulated training data (hour, demand)
@@ -84,12 +226,52 @@ class PricingEngine:
             [17, 120], [18, 150], [19, 130]  # Evening peak
         ])
         self.demand_forecaster.train(historical_data)
+        if self.config.demand_history_path or self.config.demand_refresh_interval > 0:
+            self.demand_forecaster.start()
+    
+    def _build_surge_state(self) -> Optional[SurgeState]:
+        """Start the streaming surge state when surge_mode is 'stream'"""
+        if self.config.surge_mode == "forecast":
+            return None
+        if self.config.surge_mode != "stream":
+            raise ValueError(f"Unknown surge mode: {self.config.surge_mode}")
+        surge_state = SurgeState(self.config.surge_threshold, self.config.surge_window_seconds)
+        surge_state.start()
+        return surge_state
+    
+    def close(self):
+        """Stop background work (demand table refresh, surge ticks)"""
+        self.demand_forecaster.stop()
+        if self.surge_state is not None:
+            self.surge_state.stop()
+
+    def record_trips(self, trips: Iterable[Tuple[str, float]]) -> int:
+        """Remember booked (zone, timestamp) trips for the next demand refit; quotes are not demand.
+
+        Returns how many were recorded: none unless demand_refresh_interval is set,
+        because without refits nothing would ever read them.
+        """
+        if self.config.demand_refresh_interval <= 0:
+            return 0
+        recorded = 0
+        for zone, timestamp in trips:
+            self.demand_forecaster.record_trip(zone, float(timestamp))
+            recorded += 1
+        return recorded
+
+    def start_background(self):
+        """Start the background work again after close(), e.g. in a worker process forked from this one"""
+        if self.config.demand_history_path or self.config.demand_refresh_interval > 0:
+            self.demand_forecaster.start()
+        if self.surge_state is not None:
+            self.surge_state.start()
     
     def calculate_price(
         self,
         request: TripRequest,
         user: UserProfile,
-        current_supply: int
+        current_supply: int,
+        rng: Optional[np.random.Generator] = None
     ) -> float:
         try:
             logger.info(f"Request: {request}")
@@ -113,7 +295,7 @@ class PricingEngine:
             logger.info(f"Calculated Base Fare: {base_fare}")
             
             # Step 2: Get ML model prediction for comparison
-            ml_input = self._prepare_ml_input(
+            ml_fare = self._ml_fares(
                 distance_km=distance_km,
                 time_of_day=time.localtime(request.timestamp).tm_hour,
                 traffic_level=request.traffic_level,
@@ -122,8 +304,7 @@ class PricingEngine:
                 holiday=1 if request.is_holiday else 0,
                 event_nearby=1 if request.is_event_nearby else 0,
                 ride_demand_level=request.ride_demand_level
-            )
-            ml_fare = self.fare_model.predict(ml_input)[0]
+            )[0]
             logger.info(f"ML Model Fare: {ml_fare}")
             
             # Use weighted average of calculated base fare and ML prediction
@@ -131,22 +312,23 @@ class PricingEngine:
             logger.info(f"Final Base Fare: {base_fare}")
             
             # Step 2: Calculate demand/supply ratio with time-based weighting
-            current_hour = time.localtime(request.timestamp).tm_hour
-            predicted_demand = self.demand_forecaster.predict_demand(current_hour)
-            
-            # Apply time-based weight to demand
-            time_weight = 1.0
-            if 8 <= current_hour <= 10 or 16 <= current_hour <= 19:  # Peak hours
-                time_weight = 1.2
-            elif 23 <= current_hour or current_hour <= 4:  # Late night
-                time_weight = 1.1
+            local_time = time.localtime(request.timestamp)
+            current_hour = local_time.tm_hour
             
-            effective_demand = predicted_demand * time_weight
-            demand_supply_ratio = effective_demand / max(current_supply, 1)
-            
-            # Step 3: Calculate surge with more realistic progression
-            surge_multiplier = self._calculate_surge(demand_supply_ratio)
-            logger.info(f"Hour: {current_hour}, Demand/Supply: {demand_supply_ratio}, Surge: {surge_multiplier}")
+            if self.surge_state is not None:
+                # Streaming mode: the zone's multiplier is already maintained from live events
+                surge_multiplier = self.surge_state.get_surge(request.zone)
+                logger.info(f"Hour: {current_hour}, Zone: {request.zone}, Streamed Surge: {surge_multiplier}")
+            else:
+                predicted_demand = self.demand_forecaster.predict_demand(current_hour, request.zone, local_time.tm_wday)
+                
+                # Apply time-based weight to demand
+                effective_demand = predicted_demand * demand_time_weight(current_hour)
+                demand_supply_ratio = effective_demand / max(current_supply, 1)
+                
+                # Step 3: Calculate surge with more realistic progression
+                surge_multiplier = self._calculate_surge(demand_supply_ratio, rng)
+                logger.info(f"Hour: {current_hour}, Demand/Supply: {demand_supply_ratio}, Surge: {surge_multiplier}")
             
             # Step 4: Calculate other multipliers
             zone_multiplier = self._get_zone_multiplier(request.zone)
@@ -185,27 +367,189 @@ class PricingEngine:
             logger.error(f"Pricing error: {str(e)}")
             return self.config.min_price
 
-    def _calculate_surge(self, ratio: float) -> float:
+    def calculate_price_batch(
+        self,
+        requests: Sequence[TripRequest],
+        users: Sequence[UserProfile],
+        current_supply: Union[int, Sequence[int]],
+        seed: Optional[int] = None
+    ) -> List[float]:
+        """Price many trips in one vectorized pass with a single model call.
+
+        Results match calling calculate_price on each request in order with a
+        shared np.random.default_rng(seed) generator (or the global numpy RNG
+        when seed is None), so the surge jitter is reproducible.
+        """
+        n = len(requests)
+        if len(users) != n:
+            raise ValueError(f"Expected {n} user profiles, got {len(users)}")
+        if n == 0:
+            return []
+        
+        supplies = np.broadcast_to(np.asarray(current_supply), (n,))
+        rng = np.random.default_rng(seed) if seed is not None else None
+        
+        try:
+            distance_km = np.array([r.distance for r in requests], dtype=float) * 1.60934
+            duration = np.array([r.duration for r in requests], dtype=float)
+            local_times = [time.localtime(r.timestamp) for r in requests]
+            hours = np.array([t.tm_hour for t in local_times])
+            zones = [r.zone for r in requests]
+            traffic_blocks = np.array([r.traffic_blocks for r in requests])
+            
+            # Step 1: Base fare with time-based rate adjustments
+            base_fare = self.config.base_fare + \
+                       (self.config.per_km_rate * distance_km) + \
+                       (self.config.per_min_rate * duration) + \
+                       self.config.booking_fee
+            is_night = (hours >= 23) | (hours <= 5)
+            is_peak = ((hours >= 8) & (hours <= 10)) | ((hours >= 16) & (hours <= 19))
+            base_fare = np.where(is_night, base_fare * self.config.night_rate_multiplier,
+                                 np.where(is_peak, base_fare * self.config.peak_rate_multiplier, base_fare))
+            
+            # Step 2: One model call for every row, blended 60/40 as in calculate_price
+            ml_fares = self._ml_fares(
+                distance_km=distance_km,
+                time_of_day=hours,
+                traffic_level=np.array([r.traffic_level for r in requests]),
+                weather_condition=np.array([r.weather_severity for r in requests]),
+                traffic_blocks=traffic_blocks,
+                holiday=np.array([1 if r.is_holiday else 0 for r in requests]),
+                event_nearby=np.array([1 if r.is_event_nearby else 0 for r in requests]),
+                ride_demand_level=np.array([r.ride_demand_level for r in requests])
+            )
+            base_fare = (0.6 * base_fare) + (0.4 * ml_fares)
+            
+            # Step 3: Demand/supply ratio with time-based weighting
+            if self.surge_state is not None:
+                surge_multiplier = np.array([self.surge_state.get_surge(zone) for zone in zones])
+            else:
+                predicted_demand = self.demand_forecaster.predict_demand_batch(
+                    hours, zones, np.array([t.tm_wday for t in local_times]))
+                time_weight = np.where(is_peak, 1.2, np.where((hours >= 23) | (hours <= 4), 1.1, 1.0))
+                effective_demand = predicted_demand * time_weight
+                demand_supply_ratio = effective_demand / np.maximum(supplies, 1)
+                surge_multiplier = self._calculate_surge_batch(demand_supply_ratio, rng)
+            
+            # Step 4: Other multipliers
+            zone_multiplier = np.array([self._get_zone_multiplier(r.zone) for r in requests])
+            traffic_impact = np.minimum(traffic_blocks / 5, 1.0)
+            traffic_multiplier = 1.0 + (traffic_impact * 0.2)
+            weather_multiplier = np.array([self._get_weather_multiplier(r.weather_severity) for r in requests])
+            
+            raw_multiplier = (
+                (surge_multiplier * 0.4) +
+                (zone_multiplier * 0.2) +
+                (traffic_multiplier * 0.2) +
+                (weather_multiplier * 0.2)
+            )
+            total_multiplier = np.maximum(0.8, np.minimum(raw_multiplier, 2.0))
+            
+            # Step 5: Personalization
+            price_sensitivity = np.array([u.price_sensitivity for u in users], dtype=float)
+            loyal = np.array([u.loyalty_tier >= 4 for u in users])
+            final_price = base_fare * total_multiplier * price_sensitivity
+            final_price = np.where(loyal, final_price * 0.9, final_price)
+            
+            final_price = np.round(np.maximum(self.config.min_price,
+                                              np.minimum(final_price, self.config.max_price)), 2)
+            # Missing or non-numeric fields come through the float conversions as NaN rather than an error
+            failed = ~np.isfinite(final_price)
+            if failed.any():
+                logger.error(f"Batch pricing error: no valid price for rows {np.flatnonzero(failed).tolist()}")
+                final_price[failed] = self.config.min_price
+            logger.info(f"Batch priced {n} requests, mean price {final_price.mean():.2f}")
+            
+            return final_price.tolist()
+            
+        except Exception as e:
+            # One bad row must not cost the others their prices: price the rows one at a time with the same
+            # seeded generator, so valid rows still get real (and reproducible) prices and only failing rows min_price
+            logger.error(f"Batch pricing error, pricing the {n} requests one at a time: {str(e)}")
+            rng = np.random.default_rng(seed) if seed is not None else None
+            return [self.calculate_price(request, user, supply, rng=rng)
+                    for request, user, supply in zip(requests, users, supplies)]
+
+    def _ml_fares(self, distance_km, time_of_day, traffic_level, weather_condition, traffic_blocks, holiday, event_nearby, ride_demand_level) -> np.ndarray:
+        """ML fare term for raw feature values, from the fare surface, the prediction cache or the model"""
+        columns = [np.atleast_1d(c) for c in (distance_km, time_of_day, traffic_level, weather_condition,
+                                              traffic_blocks, holiday, event_nearby, ride_demand_level)]
+        surface = self.fare_surface
+        if surface is None:
+            return self._model_fares(columns)
+        
+        fares, in_grid = surface.lookup(*columns)
+        if not in_grid.all():
+            outside = ~in_grid
+            fares[outside] = self._model_fares([c[outside] for c in columns])
+        return fares
+
+    def _model_fares(self, columns) -> np.ndarray:
+        """Fare model predictions, served from the prediction cache when enabled"""
+        cache = self.prediction_cache
+        if cache is None:
+            return self._predict_fares(self._prepare_model_input(*columns))
+        
+        # Key on the discrete features plus quantized distance, and predict at the
+        # quantized distance so a cached value never depends on which trip filled it
+        step = self.config.prediction_cache_distance_step
+        if step > 0:
+            distance_bucket = np.round(columns[0] / step).astype(np.int64)
+            columns[0] = distance_bucket * step
+        else:
+            distance_bucket = columns[0]
+        keys = list(zip(distance_bucket.tolist(), *(c.tolist() for c in columns[1:])))
+        
+        generation = cache.generation
+        cached = cache.get_many(keys)
+        fares = np.array([np.nan if fare is None else fare for fare in cached])
+        
+        missing = {}
+        for i, fare in enumerate(cached):
+            if fare is None:
+                missing.setdefault(keys[i], []).append(i)
+        if missing:
+            first_rows = np.array([rows[0] for rows in missing.values()])
+            predicted = self._predict_fares(self._prepare_model_input(*(c[first_rows] for c in columns)))
+            for rows, fare in zip(missing.values(), predicted):
+                fares[rows] = fare
+            cache.put_many(list(missing.keys()), predicted.tolist(), generation)
+        return fares
+
+    def _predict_fares(self, ml_input) -> np.ndarray:
+        """Run the fare model on prepared ML input rows."""
+        if self.compiled_model is not None:
+            return self.compiled_model.predict(ml_input)
+        return np.asarray(self.fare_model.predict(ml_input), dtype=float)
+
+    def _calculate_surge_batch(self, ratios: np.ndarray, rng: Optional[np.random.Generator] = None) -> np.ndarray:
+        """Vectorized _calculate_surge; draws jitter only for surging rows, in order"""
+        surge = np.ones(len(ratios))
+        surging = ratios > 1.0
+        if not surging.any():
+            return surge
+        
+        variation = 1.0 + (rng or np.random).uniform(-0.05, 0.05, size=int(surging.sum()))
+        surge[surging] = np.maximum(1.0, np.minimum(surge_curve(ratios[surging], self.config.surge_threshold) * variation, 1.8))
+        return surge
+
+    def _calculate_surge(self, ratio: float, rng: Optional[np.random.Generator] = None) -> float:
         """Calculate surge price using industry-standard approach"""
         if ratio <= 1.0:
             return 1.0
             
-        # Progressive surge calculation using sigmoid function
+        # Progressive surge calculation using sigmoid function, scaled to 1.0-1.8
         # This creates a smooth curve that plateaus at high demand
-        normalized_ratio = (ratio - 1.0) / (self.config.surge_threshold - 1.0)
-        sigmoid = 1 / (1 + np.exp(-4 * (normalized_ratio - 0.5)))
-        
-        # Scale sigmoid output to surge range (1.0 to 1.8)
-        surge = 1.0 + (sigmoid * 0.8)
+        surge = surge_curve(ratio, self.config.surge_threshold)
         
         # Add small random variation (±5%)
-        variation = 1.0 + np.random.uniform(-0.05, 0.05)
+        variation = 1.0 + (rng or np.random).uniform(-0.05, 0.05)
         surge *= variation
         
         # Ensure bounds
         surge = max(1.0, min(surge, 1.8))
         
-        logger.info(f"Ratio: {ratio:.2f}, Normalized: {normalized_ratio:.2f}, Surge: {surge:.2f}")
+        logger.info(f"Ratio: {ratio:.2f}, Surge: {surge:.2f}")
         return surge
 
     def _get_zone_multiplier(self, zone: str) -> float:
@@ -228,23 +572,25 @@ class PricingEngine:
         return multipliers.get(weather, 1.0)
 
     def _prepare_ml_input(self, distance_km, time_of_day, traffic_level, weather_condition, traffic_blocks, holiday, event_nearby, ride_demand_level):
-        """Prepare input data for the ML model."""
+        """Prepare input data for the ML model (scalars for one row, arrays for a batch)."""
+        import pandas as pd
+        
         # Create a DataFrame with the input features
         input_data = pd.DataFrame({
-            'distance_km': [distance_km],
-            'time_of_day': [time_of_day],
-            'traffic_level': [traffic_level],
-            'weather_severity': [weather_condition],  # Already numeric from TripRequest
-            'traffic_blocks': [traffic_blocks],
-            'holiday': [holiday],
-            'event_nearby': [event_nearby],
-            'ride_demand_level': [ride_demand_level]
+            'distance_km': np.atleast_1d(distance_km),
+            'time_of_day': np.atleast_1d(time_of_day),
+            'traffic_level': np.atleast_1d(traffic_level),
+            'weather_severity': np.atleast_1d(weather_condition),  # Already numeric from TripRequest
+            'traffic_blocks': np.atleast_1d(traffic_blocks),
+            'holiday': np.atleast_1d(holiday),
+            'event_nearby': np.atleast_1d(event_nearby),
+            'ride_demand_level': np.atleast_1d(ride_demand_level)
         })
         
         # Add time-based features
         input_data['hour_of_day'] = input_data['time_of_day']
-        input_data['is_peak_hour'] = input_data['hour_of_day'].apply(lambda x: 1 if x in [7,8,9,17,18,19] else 0)
-        input_data['is_night'] = input_data['hour_of_day'].apply(lambda x: 1 if x in list(range(22,24)) + list(range(0,6)) else 0)
+        input_data['is_peak_hour'] = input_data['hour_of_day'].isin(PEAK_HOURS).astype(int)
+        input_data['is_night'] = input_data['hour_of_day'].isin(NIGHT_HOURS).astype(int)
         
         # Add distance-based features
         input_data['distance_squared'] = input_data['distance_km'] ** 2
@@ -257,11 +603,28 @@ class PricingEngine:
         input_data['special_conditions'] = input_data['holiday'] + input_data['event_nearby']
         
         # Select and order features to match training data
-        selected_features = [
-            'distance_km', 'traffic_level', 'ride_demand_level',
-            'traffic_impact', 'weather_severity', 'hour_of_day',
-            'is_peak_hour', 'is_night', 'distance_squared', 'log_distance',
-            'special_conditions'
-        ]
-        
-        return input_data[selected_features]
\ No newline at end of file
+        return input_data[ML_FEATURES]
+
+    def _prepare_ml_matrix(self, distance_km, time_of_day, traffic_level, weather_condition, traffic_blocks, holiday, event_nearby, ride_demand_level) -> np.ndarray:
+        """Same features as _prepare_ml_input as a float matrix in ML_FEATURES order, without pandas."""
+        distance_km = np.atleast_1d(np.asarray(distance_km, dtype=float))
+        hour_of_day = np.atleast_1d(time_of_day)
+        traffic_level = np.atleast_1d(traffic_level)
+        return np.column_stack([
+            distance_km,
+            traffic_level,
+            np.atleast_1d(ride_demand_level),
+            traffic_level * np.atleast_1d(traffic_blocks),
+            np.atleast_1d(weather_condition),
+            hour_of_day,
+            np.isin(hour_of_day, PEAK_HOURS),
+            np.isin(hour_of_day, NIGHT_HOURS),
+            distance_km ** 2,
+            np.log1p(distance_km),
+            np.atleast_1d(holiday) + np.atleast_1d(event_nearby)
+        ]).astype(float)
+
+    def _prepare_model_input(self, distance_km, time_of_day, traffic_level, weather_condition, traffic_blocks, holiday, event_nearby, ride_demand_level):
+        """Model input rows: a NumPy matrix for the compiled forest, a DataFrame for the sklearn pipeline."""
+        prepare = self._prepare_ml_matrix if self.compiled_model is not None else self._prepare_ml_input
+        return prepare(distance_km, time_of_day, traffic_level, weather_condition, traffic_blocks, holiday, event_nearby, ride_demand_level)
\ No newline at end of file
@@ -1,15 +1,23 @@
+import time
 import numpy as np
-import pandas as pd
 from dataclasses import dataclass
 from typing import List, Dict, Optional
 import logging
 from pricing_engine import PricingEngine, TripRequest, UserProfile, PricingConfig
+from zone_graph import ZoneGraph, ZoneRouter
+from compact import RequestArray
+from spatial_index import (deadhead_from_coordinates, deadhead_from_miles, has_coordinates, haversine_miles, haversine_outer,
+                           prefilter_requests, request_coordinates, RequestIndex)
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
 
+# Metrics the final score is a weighted sum of, in score_weights order
+SCORE_METRICS = ("profit", "profit_per_minute", "profit_per_mile", "pickup_time", "surge_factor", "opportunity_cost")
+
+
 @dataclass
 class DriverProfile:
     """Profile containing driver preferences and status"""
@@ -23,8 +31,10 @@ class DriverProfile:
     return_to_base: bool   # whether driver needs to return to specific location at end of shift
     base_location: Optional[str] = None  # location to return to if applicable
     min_acceptable_fare: float = 5.0  # minimum fare to accept
+    current_lat: Optional[float] = None  # GPS position, when the driver app sends it
+    current_lon: Optional[float] = None
 
-@dataclass
+@dataclass(slots=True)
 class RequestScore:
     """Detailed scoring of a trip request"""
     request_id: int
@@ -40,10 +50,135 @@ class RequestScore:
     final_score: float  # Overall weighted score
     request: TripRequest  # Original request
 
+@dataclass
+class ScoreColumns:
+    """Scores of many requests as parallel arrays, one entry per request that has a fare"""
+    requests: List[TripRequest]  # Or a RequestArray; score() materializes only the requests it returns
+    fare: np.ndarray
+    profit: np.ndarray
+    deadhead_distance: np.ndarray
+    pickup_time: np.ndarray
+    total_time: np.ndarray
+    profit_per_minute: np.ndarray
+    profit_per_mile: np.ndarray
+    surge_factor: np.ndarray
+    opportunity_cost: np.ndarray
+    final_score: np.ndarray
+
+    def __len__(self) -> int:
+        return len(self.requests)
+
+    def ranked(self) -> np.ndarray:
+        """Indices from highest to lowest final score; ties keep request order, like sorted(reverse=True)"""
+        return np.argsort(-self.final_score, kind="stable")
+
+    def top(self, k: int) -> np.ndarray:
+        """First k indices of ranked() without sorting every score.
+
+        argpartition finds the k-th best score in O(n); every entry at least
+        that good (including all ties with it) is then stably sorted, so the
+        result is exactly ranked()[:k].
+        """
+        if k >= len(self):
+            return self.ranked()
+        if k <= 0:
+            return np.empty(0, dtype=np.intp)
+        negated = -self.final_score
+        kth = negated[np.argpartition(negated, k - 1)[k - 1]]
+        candidates = np.flatnonzero(negated <= kth)
+        return candidates[np.argsort(negated[candidates], kind="stable")[:k]]
+
+    def metric_matrix(self) -> np.ndarray:
+        """(requests, SCORE_METRICS) matrix; final_score is this times the weight vector"""
+        return np.column_stack([getattr(self, metric) for metric in SCORE_METRICS]) if len(self) else np.empty((0, len(SCORE_METRICS)))
+
+    def score(self, i: int) -> RequestScore:
+        """Materialize the RequestScore of entry i"""
+        request = self.requests[i]
+        return RequestScore(
+            request_id=request.rideId,
+            fare=float(self.fare[i]),
+            profit=float(self.profit[i]),
+            deadhead_distance=float(self.deadhead_distance[i]),
+            pickup_time=float(self.pickup_time[i]),
+            total_time=float(self.total_time[i]),
+            profit_per_minute=float(self.profit_per_minute[i]),
+            profit_per_mile=float(self.profit_per_mile[i]),
+            surge_factor=float(self.surge_factor[i]),
+            opportunity_cost=float(self.opportunity_cost[i]),
+            final_score=float(self.final_score[i]),
+            request=request
+        )
+
+@dataclass
+class WeightSweep:
+    """One ranking scenario scored under many weight vectors"""
+    columns: ScoreColumns
+    scores: np.ndarray  # (requests, weight sets) final scores
+    top: np.ndarray     # (weight sets, k) request indices, best first
+
+    def top_request_ids(self) -> List[List[int]]:
+        return [[self.columns.requests[i].rideId for i in row] for row in self.top.tolist()]
+
+    def top_scores(self) -> List[List[float]]:
+        return [self.scores[row, w].tolist() for w, row in enumerate(self.top)]
+
+def top_per_column(scores: np.ndarray, k: int) -> np.ndarray:
+    """(columns, k) row indices of the k highest scores in each column, best first.
+
+    Exactly the first k of a stable descending sort, as ScoreColumns.top
+    gives: every row better than the k-th score is kept, then the earliest
+    rows tied with it fill the remaining places.
+    """
+    n, w = scores.shape
+    k = max(min(k, n), 0)
+    negated = -scores.T
+    if k == 0:
+        return np.empty((w, 0), dtype=np.intp)
+    if k == n:
+        return np.argsort(negated, axis=1, kind="stable")
+    kth = np.partition(negated, k - 1, axis=1)[:, k - 1:k]
+    better = negated < kth
+    tied = negated == kth
+    open_places = k - np.count_nonzero(better, axis=1)
+    chosen = better | (tied & (np.cumsum(tied, axis=1) <= open_places[:, None]))
+    candidates = np.nonzero(chosen)[1].reshape(w, k)
+    order = np.lexsort((candidates, np.take_along_axis(negated, candidates, axis=1)), axis=1)
+    return np.take_along_axis(candidates, order, axis=1)
+
+@dataclass
+class RequestArrays:
+    """Candidate requests (those with a fare) as column arrays"""
+    requests: List[TripRequest]  # Or a RequestArray, when built from one
+    distance: np.ndarray
+    duration: np.ndarray
+    fare: np.ndarray
+    zone_ids: np.ndarray  # ids in the zone graph the arrays were built with
+    lats: np.ndarray      # NaN where the pickup location is unknown
+    lons: np.ndarray
+
+@dataclass
+class DriverArrays:
+    """Driver state as column arrays, one entry per driver"""
+    zone_ids: np.ndarray
+    base_zone_ids: np.ndarray
+    cost_per_mile: np.ndarray
+    shift_remaining_time: np.ndarray
+    return_to_base: np.ndarray
+    lats: np.ndarray      # NaN where the driver's position is unknown
+    lons: np.ndarray
+
 class RequestEvaluator:
     """Evaluates multiple requests to find the most profitable one"""
    
-    def __init__(self):  # Fixed: Changed _init_ to __init__
+    def __init__(self, zone_router: Optional[ZoneRouter] = None,
+                 max_deadhead_miles: Optional[float] = None, nearest_candidates: Optional[int] = None):  # Fixed: Changed _init_ to __init__
+        # Zone-to-zone travel costs; the built-in default graph unless a router is given
+        self.zone_router = zone_router or ZoneRouter()
+        # Candidate prefilter for drivers with coordinates: only requests within this
+        # pickup radius and/or the nearest N are scored (None disables each limit)
+        self.max_deadhead_miles = max_deadhead_miles
+        self.nearest_candidates = nearest_candidates
         # Default weights for different factors
         self.score_weights = {
             "profit": 0.35,
@@ -60,25 +195,23 @@ class RequestEvaluator:
    
     def calculate_deadhead_costs(self, driver_zone: str, request_zone: str, driver_location=None, pickup_location=None) -> dict:
         """Calculate distance and time to pickup location"""
-        # In a real system, this would use geospatial data and routing APIs
-        # For this example, using a simplified zone-based approach
-       
-        # Zone distance matrix (simplified)
-        zone_distances = {
-            ("downtown", "downtown"): {"miles": 1.5, "minutes": 8},
-            ("downtown", "suburb"): {"miles": 5.0, "minutes": 12},
-            ("downtown", "airport"): {"miles": 10.0, "minutes": 18},
-            ("suburb", "downtown"): {"miles": 5.0, "minutes": 12},
-            ("suburb", "suburb"): {"miles": 2.0, "minutes": 6},
-            ("suburb", "airport"): {"miles": 8.0, "minutes": 15},
-            ("airport", "downtown"): {"miles": 10.0, "minutes": 18},
-            ("airport", "suburb"): {"miles": 8.0, "minutes": 15},
-            ("airport", "airport"): {"miles": 1.0, "minutes": 5},
-        }
+        if has_coordinates(driver_location) and has_coordinates(pickup_location):
+            # Straight-line distance scaled to road miles, at average pickup speed. One-element
+            # arrays take the same NumPy kernels as the batch path, so both round identically
+            miles, minutes = deadhead_from_coordinates(*driver_location, [pickup_location[0]], [pickup_location[1]])
+            return {"miles": float(miles[0]), "minutes": float(minutes[0])}
        
-        # Get distance and time or use defaults if zones not found
-        default = {"miles": 3.0, "minutes": 10}
-        return zone_distances.get((driver_zone, request_zone), default)
+        # Fastest path between the zones for the current hour, from the precomputed
+        # zone graph; unknown zones get the graph's default cost
+        return self.zone_router.deadhead(driver_zone, request_zone)
+   
+    def candidates(self, requests, driver: DriverProfile) -> List[TripRequest]:
+        """Requests worth scoring for this driver: all of them unless a pickup radius or nearest-N limit applies.
+
+        requests may be a list or a spatial_index.RequestIndex built once for many drivers.
+        """
+        return prefilter_requests(requests, driver.current_lat, driver.current_lon,
+                                  self.max_deadhead_miles, self.nearest_candidates)
    
     def evaluate_request(self, request: TripRequest, driver: DriverProfile, user: UserProfile, current_supply: int) -> RequestScore:
         """Evaluate a single request and return its profitability score"""
@@ -89,7 +222,11 @@ class RequestEvaluator:
 
        
         # Get deadhead costs (distance and time to pickup)
-        deadhead = self.calculate_deadhead_costs(driver.current_location, request.zone)
+        deadhead = self.calculate_deadhead_costs(
+            driver.current_location, request.zone,
+            driver_location=(driver.current_lat, driver.current_lon),
+            pickup_location=(request.pickup_lat, request.pickup_lon)
+        )
         deadhead_distance = deadhead["miles"]
         pickup_time = deadhead["minutes"]
        
@@ -167,49 +304,271 @@ class RequestEvaluator:
             final_score=final_score,
             request=request
         )
-   
+
+    def request_arrays(self, requests: List[TripRequest], graph: ZoneGraph) -> RequestArrays:
+        """Column arrays of the requests that have a fare; requests may be a compact.RequestArray"""
+        if isinstance(requests, RequestArray):
+            # Columns come straight from the records; zone names are looked up once per distinct zone
+            requests = requests[~np.isnan(requests.records["fare"])]
+            records = requests.records
+            return RequestArrays(
+                requests=requests,
+                distance=records["distance"].copy(),
+                duration=records["duration"].copy(),
+                fare=records["fare"].copy(),
+                zone_ids=graph.zone_id_array(requests.zones.values)[records["zone"]],
+                lats=records["pickup_lat"].copy(),
+                lons=records["pickup_lon"].copy()
+            )
+        requests = [request for request in requests if request.fare is not None]
+        n = len(requests)
+        lats, lons = request_coordinates(requests)
+        return RequestArrays(
+            requests=requests,
+            distance=np.fromiter((request.distance for request in requests), dtype=float, count=n),
+            duration=np.fromiter((request.duration for request in requests), dtype=float, count=n),
+            fare=np.fromiter((request.fare for request in requests), dtype=float, count=n),
+            zone_ids=graph.zone_id_array([request.zone for request in requests]),
+            lats=lats,
+            lons=lons
+        )
+
+    def driver_arrays(self, drivers: List[DriverProfile], graph: ZoneGraph) -> DriverArrays:
+        """Column arrays of driver state"""
+        def column(values, dtype=float):
+            return np.array(list(values), dtype=dtype)
+
+        return DriverArrays(
+            zone_ids=graph.zone_id_array([driver.current_location for driver in drivers]),
+            base_zone_ids=graph.zone_id_array([driver.base_location or "downtown" for driver in drivers]),
+            cost_per_mile=column(driver.cost_per_mile for driver in drivers),
+            shift_remaining_time=column(driver.shift_remaining_time for driver in drivers),
+            return_to_base=column((driver.return_to_base for driver in drivers), bool),
+            lats=column(np.nan if driver.current_lat is None else driver.current_lat for driver in drivers),
+            lons=column(np.nan if driver.current_lon is None else driver.current_lon for driver in drivers)
+        )
+
+    def _score_pairs(self, requests: RequestArrays, drivers: DriverArrays, ri, di, graph: ZoneGraph, hour: int,
+                     straight_miles: Optional[np.ndarray] = None) -> Dict[str, np.ndarray]:
+        """Score (driver di, request ri) pairs; ri and di are index arrays (or a scalar di) that broadcast together.
+
+        Same formulas and operation order as evaluate_request, so every value
+        matches the per-request path exactly. Deadhead costs come from
+        coordinates where both ends have them, otherwise from the zone graph;
+        straight_miles may carry precomputed driver-to-pickup distances.
+        """
+        distance, duration, fare = requests.distance[ri], requests.duration[ri], requests.fare[ri]
+        zone_ids = requests.zone_ids[ri]
+        cost_per_mile, shift_remaining_time = drivers.cost_per_mile[di], drivers.shift_remaining_time[di]
+
+        # Deadhead costs (distance and time to pickup)
+        deadhead_distance, pickup_time = graph.deadhead_batch(drivers.zone_ids[di], zone_ids, hour)
+        if straight_miles is None and not np.isnan(drivers.lats[di]).all():
+            straight_miles = haversine_miles(drivers.lats[di], drivers.lons[di], requests.lats[ri], requests.lons[ri])
+        if straight_miles is not None:
+            miles, minutes = deadhead_from_miles(straight_miles)
+            located = ~np.isnan(miles)
+            deadhead_distance = np.where(located, miles, deadhead_distance)
+            pickup_time = np.where(located, minutes, pickup_time)
+
+        # Operating costs and profit
+        total_distance = deadhead_distance + distance
+        operating_cost = total_distance * cost_per_mile
+        profit = fare - operating_cost
+
+        # Time commitment, plus the return trip when the shift is ending
+        total_time = pickup_time + duration
+        if drivers.return_to_base[di].any():
+            _, return_minutes = graph.deadhead_batch(zone_ids, drivers.base_zone_ids[di], hour)
+            ending = drivers.return_to_base[di] & ((shift_remaining_time - total_time) < 30)
+            total_time = np.where(ending, total_time + return_minutes, total_time)
+
+        # Efficiency metrics
+        profit_per_minute = profit / np.maximum(total_time, 1)
+        profit_per_mile = profit / np.maximum(total_distance, 0.1)
+
+        estimated_base = (7 + (1.5 * distance) + (0.2 * duration))
+        surge_factor = fare / np.maximum(estimated_base, 1)
+
+        # Opportunity cost, higher during peak hours and heavily penalized beyond the shift
+        peak_hours = [7, 8, 9, 17, 18, 19]
+        opportunity_cost = total_time * (0.5 if hour in peak_hours else 0.2)
+        beyond_shift = total_time > shift_remaining_time
+        opportunity_cost = np.where(beyond_shift, opportunity_cost * 3, opportunity_cost)
+
+        final_score = (
+            self.score_weights["profit"] * profit +
+            self.score_weights["profit_per_minute"] * profit_per_minute +
+            self.score_weights["profit_per_mile"] * profit_per_mile +
+            self.score_weights["pickup_time"] * pickup_time +
+            self.score_weights["surge_factor"] * surge_factor +
+            self.score_weights["opportunity_cost"] * opportunity_cost
+        )
+
+        return {
+            "fare": fare,
+            "profit": profit,
+            "deadhead_distance": deadhead_distance,
+            "pickup_time": pickup_time,
+            "total_time": total_time,
+            "profit_per_minute": profit_per_minute,
+            "profit_per_mile": profit_per_mile,
+            "surge_factor": surge_factor,
+            "opportunity_cost": opportunity_cost,
+            "final_score": final_score,
+            "beyond_shift": beyond_shift
+        }
+
+    def score_requests(self, requests: List[TripRequest], driver: DriverProfile) -> ScoreColumns:
+        """Score many requests for one driver at once with array arithmetic; requests without a fare are skipped"""
+        # One zone graph snapshot per call, so a graph swapped in mid-call cannot mix two versions
+        graph = self.zone_router.graph
+        columns = self.request_arrays(self.candidates(requests, driver), graph)
+        scores = self._score_pairs(columns, self.driver_arrays([driver], graph), slice(None), 0, graph, time.localtime().tm_hour)
+
+        beyond_shift = scores.pop("beyond_shift")
+        if beyond_shift.any():
+            logger.info(f"{int(beyond_shift.sum())} of {len(columns.requests)} trips exceed remaining shift time {driver.shift_remaining_time}")
+        return ScoreColumns(requests=columns.requests, **scores)
+
+    def weight_matrix(self, weight_sets: List[Dict[str, float]]) -> np.ndarray:
+        """(SCORE_METRICS, weight sets) matrix; metrics a set leaves out keep the current score_weights"""
+        for weights in weight_sets:
+            unknown = set(weights) - set(SCORE_METRICS)
+            if unknown:
+                raise ValueError(f"Unknown score metrics: {sorted(unknown)}")
+        matrix = np.array([[weights.get(metric, self.score_weights[metric]) for weights in weight_sets] for metric in SCORE_METRICS],
+                          dtype=float).reshape(len(SCORE_METRICS), len(weight_sets))
+        if not np.isfinite(matrix).all():
+            raise ValueError("Score weights must be finite numbers")
+        return matrix
+
+    def sweep_weights(self, scenarios: List[tuple], weight_sets: List[Dict[str, float]], k: int = 1) -> List[WeightSweep]:
+        """Rank every (requests, driver) scenario under every weight set.
+
+        The metrics do not depend on the weights, so each scenario is scored
+        once and the metric rows of all scenarios are multiplied by the
+        weight matrix in a single product. Scores can differ from
+        final_score in the last bits (different summation order).
+        """
+        weights = self.weight_matrix(weight_sets)
+        columns = [self.score_requests(requests, driver) for requests, driver in scenarios]
+        metrics = np.concatenate([c.metric_matrix() for c in columns]) if columns else np.empty((0, len(SCORE_METRICS)))
+        scores = metrics @ weights
+        offsets = np.cumsum([0] + [len(c) for c in columns])
+        sweeps = []
+        for c, lo, hi in zip(columns, offsets[:-1], offsets[1:]):
+            block = scores[lo:hi]
+            sweeps.append(WeightSweep(columns=c, scores=block, top=top_per_column(block, k)))
+        return sweeps
+
+    def request_index(self, columns: RequestArrays) -> Optional[RequestIndex]:
+        """Grid index over the pickups of request columns, for score_matrix; None when no pickup radius applies"""
+        if self.max_deadhead_miles is None:
+            return None
+        # Cells about as wide as the radius, so a query visits the 3 x 3 cells around the driver
+        return RequestIndex(columns.requests, cell_miles=max(self.max_deadhead_miles, 0.25))
+
+    def score_matrix(self, requests: List[TripRequest], drivers: List[DriverProfile], chunk_drivers: int = 16,
+                     index: Optional[RequestIndex] = None):
+        """Final scores of every driver for every request, as a (drivers, requests) matrix.
+
+        requests may also be RequestArrays built from the current zone graph.
+        Returns the request columns and the matrix. Drivers are scored in small
+        chunks so the temporaries stay in cache. Pickup distances use
+        haversine_outer, so coordinate-based scores can differ from
+        score_requests in the last bits. With max_deadhead_miles set, pairs
+        whose pickup is farther than that (both ends located) score -inf.
+
+        With max_deadhead_miles set and an `index` from request_index(columns),
+        located drivers are scored only against the requests the grid finds
+        within the radius (and those without coordinates), and those pairs
+        match score_requests exactly. Once a chunk of drivers has more than a
+        third of the pickups within reach, scoring falls back to the dense path.
+        """
+        graph = self.zone_router.graph
+        hour = time.localtime().tm_hour
+        columns = requests if isinstance(requests, RequestArrays) else self.request_arrays(requests, graph)
+        driver_columns = self.driver_arrays(drivers, graph)
+        matrix = np.empty((len(drivers), len(columns.requests)))
+        ri = np.arange(len(columns.requests))[None, :]
+        use_index = index is not None and self.max_deadhead_miles is not None
+        for lo in range(0, len(drivers), chunk_drivers):
+            di = np.arange(lo, min(lo + chunk_drivers, len(drivers)))[:, None]
+            if use_index:
+                # Once a chunk has too many pickups within reach, the rest are scored densely too
+                use_index = self._score_nearby(matrix, columns, driver_columns, di[:, 0], index, graph, hour)
+                if use_index:
+                    continue
+            straight_miles = None
+            if not np.isnan(driver_columns.lats[di]).all():
+                straight_miles = haversine_outer(driver_columns.lats[di[:, 0]], driver_columns.lons[di[:, 0]], columns.lats, columns.lons)
+            chunk = self._score_pairs(columns, driver_columns, ri, di, graph, hour, straight_miles)["final_score"]
+            if self.max_deadhead_miles is not None and straight_miles is not None:
+                chunk[straight_miles > self.max_deadhead_miles] = -np.inf
+            matrix[lo:lo + len(di)] = chunk
+        return columns, matrix
+
+    def _score_nearby(self, matrix: np.ndarray, columns: RequestArrays, drivers: DriverArrays, rows: np.ndarray,
+                      index: RequestIndex, graph: ZoneGraph, hour: int) -> bool:
+        """Fill matrix rows for these drivers from the pairs the index finds within max_deadhead_miles (-inf elsewhere).
+
+        Returns False, leaving the rows alone, when more than a third of the
+        located drivers' pairs are within reach: scoring densely is faster then.
+        """
+        n = len(columns.requests)
+        everything, unknown = np.arange(n), np.full(n, np.nan)
+        # Request positions and straight-line miles per driver; drivers without coordinates take every request
+        nearby = [
+            (everything, unknown) if np.isnan(lat) or np.isnan(lon) else index.within(lat, lon, self.max_deadhead_miles)
+            for lat, lon in zip(drivers.lats[rows].tolist(), drivers.lons[rows].tolist())
+        ]
+        sizes = [len(ids) for ids, _ in nearby]
+        located = [miles is not unknown for _, miles in nearby]
+        if sum(size for size, found in zip(sizes, located) if found) * 3 > sum(located) * n:
+            return False
+        matrix[rows] = -np.inf
+        if sum(sizes):
+            ri = np.concatenate([ids for ids, _ in nearby])
+            di = np.repeat(rows, sizes)
+            straight_miles = np.concatenate([miles for _, miles in nearby])
+            matrix[di, ri] = self._score_pairs(columns, drivers, ri, di, graph, hour, straight_miles)["final_score"]
+        return True
+
+    def score_pairs(self, columns: RequestArrays, drivers: List[DriverProfile], request_index, driver_index) -> List[RequestScore]:
+        """RequestScores for matched (drivers[driver_index[i]], columns.requests[request_index[i]]) pairs"""
+        graph = self.zone_router.graph
+        request_index, driver_index = np.asarray(request_index, dtype=np.intp), np.asarray(driver_index, dtype=np.intp)
+        scores = self._score_pairs(columns, self.driver_arrays(drivers, graph), request_index, driver_index, graph, time.localtime().tm_hour)
+        scores.pop("beyond_shift")
+        paired = ScoreColumns(requests=[columns.requests[i] for i in request_index], **scores)
+        return [paired.score(i) for i in range(len(paired))]
+
     def rank_requests(self, requests: List[TripRequest], driver: DriverProfile, user_profiles: Dict[str, UserProfile], current_supply: int) -> RequestScore:
         """Find the highest scoring request"""
-        scores = []
-       
-        for request in requests:
-            # Get user profile or use default
-            user = user_profiles.get(request.user_id, UserProfile())
-           
-            # Score the request
-            score = self.evaluate_request(request, driver, user, current_supply)
-            if score:  # Only append if score is not None
-                scores.append(score)
-           
-                # Log the score details
-                logger.info(f"Request {score.request_id}: Score={score.final_score:.2f}, Profit=${score.profit:.2f}, "
-                            f"Fare=${score.fare:.2f}, Profit/Min=${score.profit_per_minute:.2f}")
-       
-        # Sort by final score, highest first and return the top one
-        if not scores:
+        columns = self.score_requests(requests, driver)
+        if not len(columns):
             return None
-            
-        return sorted(scores, key=lambda x: x.final_score, reverse=True)[0]
-   
+
+        # argmax returns the first of equal scores, like sorted(reverse=True)[0]
+        best = columns.score(int(np.argmax(columns.final_score)))
+        logger.info(f"Best of {len(columns)} requests: {best.request_id}: Score={best.final_score:.2f}, Profit=${best.profit:.2f}, "
+                    f"Fare=${best.fare:.2f}, Profit/Min=${best.profit_per_minute:.2f}")
+        return best
+
     def get_best_requests(self, requests: List[TripRequest], driver: DriverProfile, user_profiles: Dict[str, UserProfile], current_supply: int) -> List[RequestScore]:
         """Get all requests ranked by profitability"""
-        scores = []
-       
-        for request in requests:
-            # Get user profile or use default
-            user = user_profiles.get(request.user_id, UserProfile())
-           
-            # Score the request
-            score = self.evaluate_request(request, driver, user, current_supply)
-            if score:  # Only append if score is not None
-                scores.append(score)
-           
-        # Sort by final score, highest first
-        return sorted(scores, key=lambda x: x.final_score, reverse=True)
+        columns = self.score_requests(requests, driver)
+        return [columns.score(i) for i in columns.ranked()]
+
+    def get_top_requests(self, requests: List[TripRequest], driver: DriverProfile, user_profiles: Dict[str, UserProfile], current_supply: int, k: int = 3) -> List[RequestScore]:
+        """Get the k most profitable requests, best first, without ranking all of them"""
+        columns = self.score_requests(requests, driver)
+        return [columns.score(i) for i in columns.top(k)]
    
     def get_best_request(self, requests: List[TripRequest], driver: DriverProfile, user_profiles: Dict[str, UserProfile], current_supply: int) -> Optional[RequestScore]:
         """Get the most profitable request"""
-        ranked_requests = self.get_best_requests(requests, driver, user_profiles, current_supply)
+        ranked_requests = self.get_top_requests(requests, driver, user_profiles, current_supply, k=1)
        
         if not ranked_requests:
             return None
@@ -1,9 +1,11 @@
+import heapq
 import numpy as np
-import pandas as pd
 from dataclasses import dataclass
 from typing import List, Dict, Optional
 import logging
 from pricing_engine import PricingEngine, TripRequest, UserProfile, PricingConfig
+from zone_graph import ZoneRouter
+from spatial_index import deadhead_from_coordinates, has_coordinates, prefilter_requests
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
@@ -22,8 +24,10 @@ class DriverProfile:
     return_to_base: bool   # whether driver needs to return to specific location at end of shift
     base_location: Optional[str] = None  # location to return to if applicable
     min_acceptable_fare: float = 5.0  # minimum fare to accept
+    current_lat: Optional[float] = None  # GPS position, when the driver app sends it
+    current_lon: Optional[float] = None
 
-@dataclass
+@dataclass(slots=True)
 class RequestScore:
     """Detailed scoring of a trip request"""
     request_id: str
@@ -42,8 +46,15 @@ class RequestScore:
 class RequestEvaluator:
     """Evaluates multiple requests to find the most profitable one"""
    
-    def __init__(self, pricing_engine):  # Fixed: Added pricing_engine parameter
+    def __init__(self, pricing_engine, zone_router: Optional[ZoneRouter] = None,
+                 max_deadhead_miles: Optional[float] = None, nearest_candidates: Optional[int] = None):  # Fixed: Added pricing_engine parameter
         self.pricing_engine = pricing_engine
+        # Zone-to-zone travel costs; the built-in default graph unless a router is given
+        self.zone_router = zone_router or ZoneRouter()
+        # Candidate prefilter for drivers with coordinates: only requests within this
+        # pickup radius and/or the nearest N are scored (None disables each limit)
+        self.max_deadhead_miles = max_deadhead_miles
+        self.nearest_candidates = nearest_candidates
         # Default weights for different factors
         self.score_weights = {
             "profit": 0.35,
@@ -60,33 +71,51 @@ class RequestEvaluator:
    
     def calculate_deadhead_costs(self, driver_zone: str, request_zone: str, driver_location=None, pickup_location=None) -> dict:
         """Calculate distance and time to pickup location"""
-        # In a real system, this would use geospatial data and routing APIs
-        # For this example, using a simplified zone-based approach
-       
-        # Zone distance matrix (simplified)
-        zone_distances = {
-            ("downtown", "downtown"): {"miles": 1.5, "minutes": 8},
-            ("downtown", "suburb"): {"miles": 5.0, "minutes": 12},
-            ("downtown", "airport"): {"miles": 10.0, "minutes": 18},
-            ("suburb", "downtown"): {"miles": 5.0, "minutes": 12},
-            ("suburb", "suburb"): {"miles": 2.0, "minutes": 6},
-            ("suburb", "airport"): {"miles": 8.0, "minutes": 15},
-            ("airport", "downtown"): {"miles": 10.0, "minutes": 18},
-            ("airport", "suburb"): {"miles": 8.0, "minutes": 15},
-            ("airport", "airport"): {"miles": 1.0, "minutes": 5},
-        }
+        if has_coordinates(driver_location) and has_coordinates(pickup_location):
+            # Straight-line distance scaled to road miles, at average pickup speed. One-element
+            # arrays take the same NumPy kernels as the batch path, so both round identically
+            miles, minutes = deadhead_from_coordinates(*driver_location, [pickup_location[0]], [pickup_location[1]])
+            return {"miles": float(miles[0]), "minutes": float(minutes[0])}
        
-        # Get distance and time or use defaults if zones not found
-        default = {"miles": 3.0, "minutes": 10}
-        return zone_distances.get((driver_zone, request_zone), default)
+        # Fastest path between the zones for the current hour, from the precomputed
+        # zone graph; unknown zones get the graph's default cost
+        return self.zone_router.deadhead(driver_zone, request_zone)
+   
+    def candidates(self, requests, driver: DriverProfile) -> List[TripRequest]:
+        """Requests worth scoring for this driver: all of them unless a pickup radius or nearest-N limit applies.
+
+        requests may be a list or a spatial_index.RequestIndex built once for many drivers.
+        """
+        return prefilter_requests(requests, driver.current_lat, driver.current_lon,
+                                  self.max_deadhead_miles, self.nearest_candidates)
    
-    def evaluate_request(self, request: TripRequest, driver: DriverProfile, user: UserProfile, current_supply: int) -> RequestScore:
-        """Evaluate a single request and return its profitability score"""
-        # Calculate fare using pricing engine
-        fare = self.pricing_engine.calculate_price(request, user, current_supply)
+    def prefetch_fares(self, requests: List[TripRequest], user_profiles: Dict[str, UserProfile], current_supply: int) -> List[float]:
+        """Fares for every request: its own fare if it has one, otherwise priced together in one batched model call"""
+        fares = [request.fare for request in requests]
+        missing = [i for i, fare in enumerate(fares) if fare is None]
+        if missing:
+            priced = self.pricing_engine.calculate_price_batch(
+                [requests[i] for i in missing],
+                [user_profiles.get(requests[i].user_id, UserProfile()) for i in missing],
+                current_supply
+            )
+            for i, fare in zip(missing, priced):
+                fares[i] = fare
+        return fares
+   
+    def evaluate_request(self, request: TripRequest, driver: DriverProfile, user: UserProfile, current_supply: int,
+                         fare: Optional[float] = None) -> RequestScore:
+        """Evaluate a single request and return its profitability score; fare skips pricing when already known"""
+        # Calculate fare using pricing engine unless it was prefetched
+        if fare is None:
+            fare = self.pricing_engine.calculate_price(request, user, current_supply)
        
         # Get deadhead costs (distance and time to pickup)
-        deadhead = self.calculate_deadhead_costs(driver.current_location, request.zone)
+        deadhead = self.calculate_deadhead_costs(
+            driver.current_location, request.zone,
+            driver_location=(driver.current_lat, driver.current_lon),
+            pickup_location=(request.pickup_lat, request.pickup_lon)
+        )
         deadhead_distance = deadhead["miles"]
         pickup_time = deadhead["minutes"]
        
@@ -166,13 +195,16 @@ class RequestEvaluator:
     def rank_requests(self, requests: List[TripRequest], driver: DriverProfile, user_profiles: Dict[str, UserProfile], current_supply: int) -> List[RequestScore]:
         """Rank multiple requests by profitability score"""
         scores = []
+        candidates = list(self.candidates(requests, driver))  # A RequestArray is materialized once here
+        # Price every candidate up front in one batch instead of once per request
+        fares = self.prefetch_fares(candidates, user_profiles, current_supply)
        
-        for request in requests:
+        for request, fare in zip(candidates, fares):
             # Get user profile or use default
             user = user_profiles.get(request.user_id, UserProfile())
            
             # Score the request
-            score = self.evaluate_request(request, driver, user, current_supply)
+            score = self.evaluate_request(request, driver, user, current_supply, fare)
             scores.append(score)
            
             # Log the score details
@@ -182,9 +214,20 @@ class RequestEvaluator:
         # Sort by final score, highest first
         return sorted(scores, key=lambda x: x.final_score, reverse=True)
    
+    def get_top_requests(self, requests: List[TripRequest], driver: DriverProfile, user_profiles: Dict[str, UserProfile], current_supply: int, k: int = 3) -> List[RequestScore]:
+        """Get the k highest scoring requests, best first, using a bounded heap instead of a full sort"""
+        candidates = list(self.candidates(requests, driver))
+        fares = self.prefetch_fares(candidates, user_profiles, current_supply)
+        scores = (
+            self.evaluate_request(request, driver, user_profiles.get(request.user_id, UserProfile()), current_supply, fare)
+            for request, fare in zip(candidates, fares)
+        )
+        # nlargest keeps ties in input order, same as sorted(..., reverse=True)[:k]
+        return heapq.nlargest(k, scores, key=lambda x: x.final_score)
+   
     def get_best_request(self, requests: List[TripRequest], driver: DriverProfile, user_profiles: Dict[str, UserProfile], current_supply: int) -> Optional[RequestScore]:
         """Get the most profitable request"""
-        ranked_requests = self.rank_requests(requests, driver, user_profiles, current_supply)
+        ranked_requests = self.get_top_requests(requests, driver, user_profiles, current_supply, k=1)
        
         if not ranked_requests:
             return None
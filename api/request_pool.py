@@ -0,0 +1,370 @@
+import time
+import heapq
+import logging
+import threading
+import numpy as np
+from typing import Dict, Hashable, Iterable, List, Optional, Tuple
+from spatial_index import RequestIndex
+from profitability_evaluatorV2 import RequestEvaluator, DriverProfile, RequestArrays, RequestScore, TripRequest
+
+# Configure logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+class TimerWheel:
+    """Hashed timer wheel: O(1) scheduling, and expiry work proportional to elapsed ticks plus expired timers.
+
+    A timer lands in the slot of the first tick at or after its deadline;
+    timers more than one revolution out share the slot and wait for their
+    round. Timers are never cancelled: each carries a token, and the owner
+    ignores expirations whose token is no longer current.
+    """
+
+    def __init__(self, tick_seconds: float = 1.0, slots: int = 512, now: float = 0.0):
+        self.tick_seconds = tick_seconds
+        self.slots: List[List[Tuple[int, Hashable, int]]] = [[] for _ in range(slots)]
+        self.current = int(now // tick_seconds)  # Last tick already processed
+        self.size = 0
+
+    def schedule(self, key: Hashable, token: int, deadline: float):
+        tick = max(int(np.ceil(deadline / self.tick_seconds)), self.current + 1)
+        self.slots[tick % len(self.slots)].append((tick, key, token))
+        self.size += 1
+
+    def advance(self, now: float) -> List[Tuple[Hashable, int]]:
+        """(key, token) of every timer whose tick (its deadline rounded up to a whole tick) has been reached by now"""
+        target = int(now // self.tick_seconds)
+        if target <= self.current:
+            return []
+        expired = []
+        # After a long pause every slot is visited once, not once per elapsed tick
+        for tick in range(self.current + 1, self.current + 1 + min(target - self.current, len(self.slots))):
+            slot = self.slots[tick % len(self.slots)]
+            if not slot:
+                continue
+            waiting = [timer for timer in slot if timer[0] > target]
+            expired.extend((key, token) for due, key, token in slot if due <= target)
+            self.slots[tick % len(self.slots)] = waiting
+        self.size -= len(expired)
+        self.current = target
+        return expired
+
+
+class DriverQueue:
+    """One driver's best open requests as a max-heap of (-score, seq, ride id), with lazy deletion.
+
+    Only the best `depth` requests are kept after a rebuild; `floor` is the
+    best score among the requests that were dropped, so any kept entry
+    scoring at least `floor` is known to outrank everything not in the heap.
+    """
+
+    def __init__(self, driver: DriverProfile):
+        self.driver = driver
+        self.heap: List[Tuple[float, int, Hashable]] = []
+        self.floor = -np.inf
+        self.epoch = None  # Scoring inputs the heap was built with; None means rebuild before use
+
+
+class RequestPool:
+    """Server-side pool of open requests with an incrementally maintained ranking per driver.
+
+    Adding requests scores just the new ones for every registered driver and
+    pushes them onto the drivers' heaps; removed and expired requests are
+    skipped lazily when they surface. A driver update only marks that
+    driver's heap for a rebuild on its next query, and the same happens to
+    every heap when the hour (peak pricing), zone graph or weights change.
+    So a "best request for driver X" query costs O(k log depth) instead of
+    rescoring the whole pool. Requests expire ttl_seconds after they are
+    added, through a TimerWheel.
+
+    Every change bumps `version` and wakes wait_for_change(), so a
+    subscriber can re-check its driver's top() after changes instead of
+    polling.
+    """
+
+    def __init__(self, evaluator: RequestEvaluator, ttl_seconds: float = 300.0, depth: int = 64,
+                 tick_seconds: float = 1.0, clock=time.time):
+        self.evaluator = evaluator
+        self.ttl_seconds = ttl_seconds
+        self.depth = depth
+        self._clock = clock
+        self._requests: Dict[Hashable, Tuple[TripRequest, int]] = {}  # ride id -> (request, seq)
+        self._drivers: Dict[Hashable, DriverQueue] = {}
+        self._wheel = TimerWheel(tick_seconds, now=clock())
+        self._seq = 0
+        self._columns: Optional[Tuple[object, RequestArrays, np.ndarray, Optional[RequestIndex]]] = None  # (graph, columns, seqs, index) of the whole pool
+        self._lock = threading.Lock()
+        self._changed = threading.Condition(self._lock)
+        self.version = 0  # Bumped on every change to the requests or drivers
+        self.counters = {"added": 0, "removed": 0, "expired": 0, "rebuilds": 0, "queries": 0}
+
+    def add_requests(self, requests: Iterable[TripRequest], ttl_seconds: Optional[float] = None) -> int:
+        """Add or replace requests (keyed by rideId); returns how many were added"""
+        added = list(requests)
+        if any(request.rideId is None for request in added):
+            raise ValueError("Pooled requests need a rideId")
+        added = list({request.rideId: request for request in added}.values())  # The last copy of a repeated rideId wins
+        with self._lock:
+            self._expire()
+            deadline = self._clock() + (self.ttl_seconds if ttl_seconds is None else ttl_seconds)
+            for request in added:
+                self._seq += 1
+                self._requests[request.rideId] = (request, self._seq)  # Replacing invalidates the old heap entries
+                self._wheel.schedule(request.rideId, self._seq, deadline)
+            if not added:
+                return 0
+            self._columns = None
+            self.counters["added"] += len(added)
+            self._touch()
+
+            # Score only the new requests, for drivers whose heaps are current
+            epoch = self._epoch()
+            current = [queue for queue in self._drivers.values() if queue.epoch == epoch]
+            if current:
+                # Few new requests: score many drivers per chunk
+                columns, matrix = self.evaluator.score_matrix(added, [queue.driver for queue in current],
+                                                              chunk_drivers=max(16, 4096 // len(added)))
+                seqs = [self._requests[request.rideId][1] for request in columns.requests]
+                ride_ids = [request.rideId for request in columns.requests]
+                # A request scoring below a driver's floor ranks behind one already left out of
+                # its heap, so it can stay out too
+                floors = np.array([queue.floor for queue in current])
+                rows, cols = np.nonzero((matrix >= floors[:, None]) & (matrix != -np.inf))
+                for row, col, score in zip(rows.tolist(), cols.tolist(), matrix[rows, cols].tolist()):
+                    heapq.heappush(current[row].heap, (-score, seqs[col], ride_ids[col]))
+                for row in np.unique(rows).tolist():
+                    if len(current[row].heap) > 4 * self.depth:
+                        self._compact(current[row])
+            return len(added)
+
+    def remove_requests(self, ride_ids: Iterable[Hashable]) -> int:
+        """Remove taken or cancelled requests; returns how many were in the pool"""
+        with self._lock:
+            removed = sum(self._requests.pop(ride_id, None) is not None for ride_id in ride_ids)
+            if removed:
+                self._columns = None
+                self.counters["removed"] += removed
+                self._touch()
+            self._expire()
+            return removed
+
+    def expire(self) -> int:
+        with self._lock:
+            return self._expire()
+
+    def update_driver(self, driver_id: Hashable, driver: DriverProfile):
+        """Register a driver or replace its state; the heap is rebuilt on the next query"""
+        with self._lock:
+            queue = self._drivers.get(driver_id)
+            if queue is None:
+                self._drivers[driver_id] = DriverQueue(driver)
+            else:
+                queue.driver = driver
+                queue.epoch = None
+            self._touch()
+
+    def remove_driver(self, driver_id: Hashable) -> bool:
+        with self._lock:
+            removed = self._drivers.pop(driver_id, None) is not None
+            if removed:
+                self._touch()
+            return removed
+
+    def wait_for_change(self, version: int, timeout: float) -> int:
+        """Block until the pool's version differs from `version` or timeout passes; returns the current version"""
+        with self._changed:
+            self._changed.wait_for(lambda: self.version != version, timeout)
+            return self.version
+
+    def best(self, driver_id: Hashable, k: int = 1) -> List[RequestScore]:
+        """The driver's k best open requests with score breakdowns, best first; KeyError for unknown drivers"""
+        with self._lock:
+            taken, driver = self._top(driver_id, k)
+            self.counters["queries"] += 1
+            requests = [self._requests[ride_id][0] for _, _, ride_id in taken]
+
+        if not requests:
+            return []
+        # Full breakdowns for the few winners only
+        columns = self.evaluator.request_arrays(requests, self.evaluator.zone_router.graph)
+        return self.evaluator.score_pairs(columns, [driver], np.arange(len(requests)), np.zeros(len(requests), dtype=np.intp))
+
+    def top(self, driver_id: Hashable, k: int = 1) -> List[Tuple[Hashable, float]]:
+        """(ride id, score) of the driver's k best open requests, best first, without breakdowns; KeyError for unknown drivers"""
+        with self._lock:
+            taken, _ = self._top(driver_id, k)
+            return [(ride_id, -negated_score) for negated_score, _, ride_id in taken]
+
+    def _top(self, driver_id: Hashable, k: int) -> Tuple[List[Tuple[float, int, Hashable]], DriverProfile]:
+        """Heap entries of the driver's k best open requests and its profile (caller holds the lock)"""
+        self._expire()
+        queue = self._drivers[driver_id]
+        if queue.epoch != self._epoch():
+            self._rebuild(queue, k)
+        taken = self._pop_valid(queue, k)
+        if queue.floor != -np.inf and (len(taken) < k or -taken[-1][0] < queue.floor):
+            # Removals ate into the kept entries; requests outside the heap may now rank
+            for entry in taken:
+                heapq.heappush(queue.heap, entry)
+            self._rebuild(queue, k)
+            taken = self._pop_valid(queue, k)
+        for entry in taken:
+            heapq.heappush(queue.heap, entry)
+        return taken, queue.driver
+
+    def stats(self) -> Dict:
+        with self._lock:
+            self._expire()
+            return {
+                "open_requests": len(self._requests),
+                "drivers": len(self._drivers),
+                "pending_timers": self._wheel.size,
+                "heap_entries": sum(len(queue.heap) for queue in self._drivers.values()),
+                **self.counters
+            }
+
+    def _epoch(self):
+        """Everything besides the driver and request that scores depend on"""
+        evaluator = self.evaluator
+        return (evaluator.zone_router.graph, time.localtime().tm_hour, tuple(sorted(evaluator.score_weights.items())))
+
+    def _expire(self) -> int:
+        """Drop requests whose timers fired (caller holds the lock)"""
+        expired = 0
+        for ride_id, token in self._wheel.advance(self._clock()):
+            entry = self._requests.get(ride_id)
+            if entry is not None and entry[1] == token:
+                del self._requests[ride_id]
+                expired += 1
+        if expired:
+            self._columns = None
+            self.counters["expired"] += expired
+            self._touch()
+            logger.info(f"Expired {expired} requests, {len(self._requests)} open")
+        return expired
+
+    def _touch(self):
+        """Record a change and wake wait_for_change() callers (caller holds the lock)"""
+        self.version += 1
+        self._changed.notify_all()
+
+    def _valid(self, entry: Tuple[float, int, Hashable]) -> bool:
+        current = self._requests.get(entry[2])
+        return current is not None and current[1] == entry[1]
+
+    def _pop_valid(self, queue: DriverQueue, k: int) -> List[Tuple[float, int, Hashable]]:
+        taken = []
+        while queue.heap and len(taken) < k:
+            entry = heapq.heappop(queue.heap)
+            if self._valid(entry):
+                taken.append(entry)
+        return taken
+
+    def _compact(self, queue: DriverQueue):
+        """Drop dead entries and trim to the best `depth`, raising the floor to the best one trimmed"""
+        live = [entry for entry in queue.heap if self._valid(entry)]
+        if len(live) > self.depth:
+            live.sort()
+            queue.floor = max(queue.floor, -live[self.depth][0])
+            del live[self.depth:]
+        heapq.heapify(live)
+        queue.heap = live
+
+    def _pool_columns(self) -> Tuple[RequestArrays, np.ndarray, Optional[RequestIndex]]:
+        """Column arrays of every open request and their pickup grid (with a pickup radius), cached until the
+        pool or zone graph changes"""
+        graph = self.evaluator.zone_router.graph
+        if self._columns is None or self._columns[0] is not graph:
+            columns = self.evaluator.request_arrays([request for request, _ in self._requests.values()], graph)
+            seqs = np.fromiter((self._requests[request.rideId][1] for request in columns.requests), dtype=np.int64,
+                               count=len(columns.requests))
+            self._columns = (graph, columns, seqs, self.evaluator.request_index(columns))
+        return self._columns[1:]
+
+    def _rebuild(self, queue: DriverQueue, k: int = 1):
+        """Score the whole pool for one driver and keep its best `depth` (at least k) requests"""
+        keep = max(self.depth, k)
+        queue.epoch = self._epoch()
+        columns, seqs, index = self._pool_columns()
+        _, matrix = self.evaluator.score_matrix(columns, [queue.driver], index=index)
+        scores = matrix[0]
+        order = np.flatnonzero(scores != -np.inf)
+        queue.floor = -np.inf
+        if len(order) > keep:
+            # Ties at the cut keep the earliest added, like a stable sort
+            order = order[np.lexsort((seqs[order], -scores[order]))]
+            queue.floor = float(scores[order[keep]])
+            order = order[:keep]
+        queue.heap = [(-float(scores[i]), int(seqs[i]), columns.requests[i].rideId) for i in order.tolist()]
+        heapq.heapify(queue.heap)
+        self.counters["rebuilds"] += 1
+
+
+if __name__ == "__main__":
+    import argparse
+    import random
+
+    parser = argparse.ArgumentParser(description="Compare pooled best-request queries against rescoring the full list")
+    parser.add_argument("--requests", type=int, default=5000)
+    parser.add_argument("--drivers", type=int, default=200)
+    parser.add_argument("--polls", type=int, default=2000)
+    parser.add_argument("--churn", type=int, default=5, help="Requests added and taken between polls")
+    args = parser.parse_args()
+
+    logging.getLogger("profitability_evaluatorV2").setLevel(logging.WARNING)
+    rng = random.Random(0)
+    zones = ["downtown", "suburb", "airport"]
+
+    def make_request(ride_id):
+        return TripRequest(user_id=f"user{ride_id}", distance=rng.uniform(1, 20), duration=rng.uniform(5, 60), zone=rng.choice(zones),
+                           timestamp=time.time(), ride_demand_level=3, traffic_level=2, weather_severity=0, traffic_blocks=1,
+                           is_holiday=False, is_event_nearby=False, fare=rng.uniform(50, 400), rideId=ride_id,
+                           pickup_lat=12.97 + rng.gauss(0, 0.05), pickup_lon=77.59 + rng.gauss(0, 0.05))
+
+    evaluator = RequestEvaluator()
+    pool = RequestPool(evaluator)
+    open_ids = list(range(args.requests))
+    pool.add_requests([make_request(i) for i in open_ids])
+    drivers = {
+        f"driver{i}": DriverProfile(current_location=rng.choice(zones), current_fuel=80.0, shift_remaining_time=240.0,
+                                    earnings_today=100.0, earnings_target=250.0, vehicle_mpg=25.0, cost_per_mile=0.3,
+                                    return_to_base=False, current_lat=12.97 + rng.gauss(0, 0.05), current_lon=77.59 + rng.gauss(0, 0.05))
+        for i in range(args.drivers)
+    }
+    for driver_id, driver in drivers.items():
+        pool.update_driver(driver_id, driver)
+    for driver_id in drivers:
+        pool.best(driver_id)  # First query builds each heap
+
+    next_id = args.requests
+    updating = querying = full = 0.0
+    mismatches = 0
+    for poll in range(args.polls):
+        taken = set(rng.sample(open_ids, args.churn))
+        open_ids = [ride_id for ride_id in open_ids if ride_id not in taken]
+        new_requests = [make_request(next_id + j) for j in range(args.churn)]
+        start = time.perf_counter()
+        pool.remove_requests(taken)
+        pool.add_requests(new_requests)
+        updating += time.perf_counter() - start
+        open_ids.extend(range(next_id, next_id + args.churn))
+        next_id += args.churn
+
+        driver_id = rng.choice(list(drivers))
+        start = time.perf_counter()
+        best = pool.best(driver_id)[0]
+        querying += time.perf_counter() - start
+
+        requests = [pool._requests[i][0] for i in open_ids]
+        start = time.perf_counter()
+        columns, matrix = evaluator.score_matrix(requests, [drivers[driver_id]])
+        full += time.perf_counter() - start
+        mismatches += columns.requests[int(np.argmax(matrix[0]))].rideId != best.request_id
+
+    print(f"{args.polls} polls over {args.requests} open requests, {args.drivers} drivers, churn {args.churn} per poll")
+    print(f"  pool update (all drivers)  {updating / args.polls * 1000:8.3f} ms per churn batch")
+    print(f"  pooled best-request query  {querying / args.polls * 1000:8.3f} ms per poll")
+    print(f"  full rescore               {full / args.polls * 1000:8.3f} ms per poll")
+    print(f"  best request mismatches    {mismatches}")
+    print(f"  {pool.stats()}")
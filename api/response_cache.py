@@ -0,0 +1,140 @@
+import time
+import hashlib
+import threading
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Hashable, NamedTuple, Optional, Tuple
+import codec
+
+
+class CachedResponse(NamedTuple):
+    body: bytes
+    status: int
+    content_type: str
+
+
+def payload_key(payload, *context: Hashable) -> bytes:
+    """Digest of a payload that does not depend on key order or whitespace, plus anything else the response depends on"""
+    digest = hashlib.blake2b(codec.canonical_dumps(payload), digest_size=16)
+    digest.update(repr(context).encode())
+    return digest.digest()
+
+
+class _Flight:
+    """A computation other callers with the same key wait on"""
+    __slots__ = ("done", "result", "error", "cpu_seconds")
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result: Optional[CachedResponse] = None
+        self.error: Optional[BaseException] = None
+        self.cpu_seconds = 0.0
+
+
+class ResponseCache:
+    """Short-lived cache of encoded responses, bounded by the bytes it holds.
+
+    Entries expire ttl seconds after they were computed and are evicted
+    least-recently-used once the bodies exceed max_bytes. Concurrent callers
+    with the same key share one computation: the first computes, the others
+    wait for its result. Only responses with a cacheable status are stored.
+    """
+
+    def __init__(self, ttl: float, max_bytes: int, cacheable_statuses=frozenset({200}), clock=time.monotonic):
+        if ttl <= 0 or max_bytes <= 0:
+            raise ValueError("ttl and max_bytes must be positive")
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self.cacheable_statuses = cacheable_statuses
+        self._clock = clock
+        self._entries: "OrderedDict[bytes, tuple]" = OrderedDict()  # key -> (expires_at, response, cpu seconds to compute)
+        self._in_flight: Dict[bytes, _Flight] = {}
+        self._lock = threading.Lock()
+        self.size_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.compute_seconds = 0.0  # CPU time spent computing misses
+        self.saved_seconds = 0.0    # CPU time the computed responses would have cost again on hits and coalesced calls
+
+    def get_or_compute(self, key: bytes, compute: Callable[[], CachedResponse]) -> Tuple[CachedResponse, str]:
+        """The response for key and where it came from: "hit", "coalesced" or "miss" """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                if entry[0] > self._clock():
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    self.saved_seconds += entry[2]
+                    return entry[1], "hit"
+                self._remove(key)
+                self.expirations += 1
+            flight = self._in_flight.get(key)
+            leader = flight is None
+            if leader:
+                flight = self._in_flight[key] = _Flight()
+                self.misses += 1
+
+        if not leader:
+            flight.done.wait()
+            if flight.error is not None:
+                raise flight.error
+            with self._lock:
+                self.coalesced += 1
+                self.saved_seconds += flight.cpu_seconds
+            return flight.result, "coalesced"
+
+        start = time.thread_time()
+        try:
+            flight.result = compute()
+        except BaseException as e:
+            flight.error = e
+            raise
+        finally:
+            flight.cpu_seconds = time.thread_time() - start
+            with self._lock:
+                del self._in_flight[key]
+                self.compute_seconds += flight.cpu_seconds
+                if flight.error is None:
+                    self._store(key, flight.result, flight.cpu_seconds)
+            flight.done.set()
+        return flight.result, "miss"
+
+    def _store(self, key: bytes, response: CachedResponse, cpu_seconds: float):
+        if response.status not in self.cacheable_statuses or len(response.body) > self.max_bytes:
+            return
+        if key in self._entries:
+            self._remove(key)
+        self._entries[key] = (self._clock() + self.ttl, response, cpu_seconds)
+        self.size_bytes += len(response.body)
+        while self.size_bytes > self.max_bytes:
+            oldest = next(iter(self._entries))
+            self._remove(oldest)
+            self.evictions += 1
+
+    def _remove(self, key: bytes):
+        self.size_bytes -= len(self._entries.pop(key)[1].body)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.size_bytes = 0
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self.hits + self.coalesced + self.misses
+            return {
+                "entries": len(self._entries),
+                "size_bytes": self.size_bytes,
+                "max_bytes": self.max_bytes,
+                "ttl_seconds": self.ttl,
+                "hits": self.hits,
+                "coalesced": self.coalesced,
+                "misses": self.misses,
+                "hit_rate": (self.hits + self.coalesced) / lookups if lookups else 0.0,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+                "compute_cpu_seconds": round(self.compute_seconds, 6),
+                "saved_cpu_seconds": round(self.saved_seconds, 6)
+            }
@@ -0,0 +1,104 @@
+import os
+import time
+import logging
+from typing import Dict
+from array_store import file_fingerprint
+from compiled_forest import CompiledForest
+
+# Configure logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+def load_shared_forest(store_path: str, model_path: str) -> CompiledForest:
+    """Attach read-only to the shared forest file, compiling it from the joblib model if needed.
+
+    The node arrays are memory-mapped, so every worker process on the host
+    shares a single copy of the forest through the OS page cache instead of
+    unpickling a private one. The file is tagged with the joblib model's
+    fingerprint and rebuilt when the model changes; writes go through a
+    temp file and rename, so concurrent workers never see a partial file.
+    """
+    model_version = file_fingerprint(model_path) if os.path.exists(model_path) else None
+    if os.path.exists(store_path):
+        forest = CompiledForest.load(store_path, model_version)
+        if forest is not None:
+            logger.info(f"Attached to shared fare model {store_path}")
+            return forest
+        logger.info(f"Shared fare model {store_path} is stale, recompiling")
+    if model_version is None:
+        raise FileNotFoundError(f"Neither {store_path} nor {model_path} is usable")
+
+    import joblib
+    CompiledForest.from_pipeline(joblib.load(model_path)).save(store_path, model_version)
+    return CompiledForest.load(store_path, model_version)
+
+
+def memory_usage() -> Dict[str, float]:
+    """Resident memory of this process in MB: RSS, PSS (shared pages split between sharers) and private"""
+    usage = {}
+    try:
+        with open("/proc/self/smaps_rollup") as f:
+            for line in f:
+                key, _, value = line.partition(":")
+                if key in ("Rss", "Pss", "Private_Clean", "Private_Dirty"):
+                    usage[key] = int(value.split()[0]) / 1024
+        usage["Private"] = usage.pop("Private_Clean", 0.0) + usage.pop("Private_Dirty", 0.0)
+    except OSError:
+        import resource
+        usage["Rss"] = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    return usage
+
+
+def _worker(backend: str, model_path: str, store_path: str, barrier, results):
+    """One simulated server worker: start an engine, touch the whole model, report memory"""
+    start = time.perf_counter()
+    from pricing_engine import PricingEngine, PricingConfig
+    imported = time.perf_counter()
+    engine = PricingEngine(PricingConfig(model_path=model_path, inference_backend=backend, model_store_path=store_path))
+    loaded = time.perf_counter()
+
+    # Read every model page so resident memory reflects the full model
+    if engine.compiled_model is not None:
+        forest = engine.compiled_model
+        for array in (forest.feature, forest.threshold, forest.children, forest.value):
+            array.sum()
+    engine._ml_fares(5.0, 12, 2, 0, 1, 0, 0, 3)
+
+    barrier.wait()  # Measure only once every worker is up, so shared pages are split fairly
+    results.put({"import_ms": (imported - start) * 1000, "load_ms": (loaded - imported) * 1000, **memory_usage()})
+    barrier.wait()
+
+
+def measure(backend: str, workers: int, model_path: str, store_path: str) -> Dict[str, float]:
+    """Start `workers` fresh processes with the given backend and average their startup and memory"""
+    import multiprocessing
+
+    context = multiprocessing.get_context("spawn")
+    barrier, results = context.Barrier(workers), context.Queue()
+    processes = [context.Process(target=_worker, args=(backend, model_path, store_path, barrier, results))
+                 for _ in range(workers)]
+    for process in processes:
+        process.start()
+    reports = [results.get() for _ in processes]
+    for process in processes:
+        process.join()
+    return {key: sum(report.get(key, 0.0) for report in reports) / workers for key in reports[0]}
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Compare per-worker memory and startup: private joblib vs shared forest")
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--model", default="dynamic_pricing_model.joblib")
+    parser.add_argument("--store", default="dynamic_pricing_model.forest")
+    args = parser.parse_args()
+
+    load_shared_forest(args.store, args.model)  # Build the shared file once, before workers race for it
+
+    print(f"{'backend':<10}{'workers':>8}{'import ms':>11}{'load ms':>10}{'RSS MB':>9}{'PSS MB':>9}{'private MB':>12}")
+    for backend in ("sklearn", "compiled", "shared"):
+        row = measure(backend, args.workers, args.model, args.store)
+        print(f"{backend:<10}{args.workers:>8}{row['import_ms']:>11.0f}{row['load_ms']:>10.0f}"
+              f"{row.get('Rss', 0):>9.1f}{row.get('Pss', 0):>9.1f}{row.get('Private', 0):>12.1f}")
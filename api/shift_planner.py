@@ -0,0 +1,241 @@
+import time
+import logging
+import numpy as np
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Tuple
+from profitability_evaluatorV2 import RequestEvaluator, DriverProfile, TripRequest
+from spatial_index import deadhead_from_coordinates
+from compact import RequestArray
+
+# Configure logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class ShiftPlan:
+    """Best chain of open requests found for the rest of a shift"""
+    requests: List[TripRequest]  # In driving order; the first one is the request to take now
+    total_profit: float          # Fares minus operating costs of every leg, including the drive to base
+    total_minutes: float         # Including the drive to base when the driver has to return
+    complete: bool               # False when the time budget cut the beam search short
+    states_expanded: int
+    elapsed_ms: float
+    stats: Dict[str, int] = field(default_factory=dict)
+
+    @property
+    def next_request(self) -> Optional[TripRequest]:
+        return self.requests[0] if self.requests else None
+
+
+@dataclass
+class _State:
+    zone: int
+    minutes: float  # Shift minutes used so far
+    profit: float
+    path: Tuple[int, ...]  # Positions in the candidate list, in driving order
+
+
+class ShiftPlanner:
+    """Beam search over chains of open requests that fit in a driver's remaining shift.
+
+    Each step extends every state in the beam with the open requests that
+    still fit, including the drive back to base_location when return_to_base
+    is set. Deadheads come from the zone graph for the hour each leg starts
+    (the first leg from coordinates when both ends have them), and a trip
+    ends in its dropoff_zone, or its pickup zone when that is unknown.
+
+    States are memoized on (zone, time bucket): a state is dropped when an
+    earlier state reached the same zone in the same or an earlier bucket with
+    at least as much profit. The beam keeps the states with the best profit
+    plus an estimate of what their remaining minutes can still earn.
+
+    Large pools are cut to the `max_candidates` requests with the best
+    profit per minute of trip time and each state only branches into its
+    `branching` best next trips. When `budget_ms` runs out the rest of the
+    chain is extended greedily from the best state, so an interrupted search
+    still plans as far ahead as a greedy one.
+    """
+
+    def __init__(self, evaluator: RequestEvaluator, beam_width: int = 32, max_trips: int = 4,
+                 time_bucket_minutes: float = 10.0, max_candidates: int = 200, branching: int = 16,
+                 budget_ms: float = 20.0):
+        self.evaluator = evaluator
+        self.beam_width = beam_width
+        self.max_trips = max_trips
+        self.time_bucket_minutes = time_bucket_minutes
+        self.max_candidates = max_candidates
+        self.branching = branching
+        self.budget_ms = budget_ms
+
+    def plan(self, requests, driver: DriverProfile, budget_ms: Optional[float] = None) -> ShiftPlan:
+        """Best plan for the driver over the open requests (a list or a RequestArray)"""
+        start = time.perf_counter()
+        deadline = start + (self.budget_ms if budget_ms is None else budget_ms) / 1000
+        graph = self.evaluator.zone_router.graph  # One snapshot for the whole search
+        hour = time.localtime().tm_hour
+
+        columns = self.evaluator.request_arrays(requests, graph)
+        shift = driver.shift_remaining_time
+        cost_per_mile = driver.cost_per_mile
+        base = graph.zone_id(driver.base_location or "downtown")
+
+        # Trip value before the deadhead, and the pool cut to the best earners per minute
+        trip_profit = columns.fare - columns.distance * cost_per_mile
+        rate = trip_profit / np.maximum(columns.duration, 1)
+        keep = np.flatnonzero(columns.duration <= shift)
+        if len(keep) > self.max_candidates:
+            keep = keep[np.argpartition(-rate[keep], self.max_candidates - 1)[:self.max_candidates]]
+        # Rough earnings per spare minute, used to rank states with different amounts of time left
+        spare_rate = max(float(np.median(rate[keep])), 0.0) if len(keep) else 0.0
+        pickup, dropoff = columns.zone_ids[keep], self._dropoff_ids(columns, graph)[keep]
+        duration, trip_profit = columns.duration[keep], trip_profit[keep]
+
+        first_leg = None
+        if driver.current_lat is not None and driver.current_lon is not None:
+            miles, minutes = deadhead_from_coordinates(driver.current_lat, driver.current_lon, columns.lats[keep], columns.lons[keep])
+            first_leg = (miles, minutes, ~np.isnan(miles))
+
+        def bucket_at(minutes: float) -> int:
+            return graph.bucket_of_hour[(hour + int(minutes // 60)) % 24]
+
+        def home(state: _State) -> Tuple[float, float]:
+            """Cost and minutes of the drive to base from a state (nothing when the driver need not return)"""
+            if not driver.return_to_base:
+                return 0.0, 0.0
+            bucket = bucket_at(state.minutes)
+            return graph.miles[bucket, state.zone, base] * cost_per_mile, graph.minutes[bucket, state.zone, base]
+
+        def value(state: _State) -> float:
+            return state.profit - home(state)[0]
+
+        root = _State(graph.zone_id(driver.current_location), 0.0, 0.0, ())
+        best, best_value = root, value(root)
+        memo: Dict[Tuple[int, int], float] = {}
+        beam = [root]
+        expanded = pruned = 0
+        complete = True
+        branching = self.branching
+
+        for depth in range(self.max_trips):
+            if complete and time.perf_counter() > deadline:
+                # Out of time: finish the chain greedily from the most promising state
+                complete = False
+                beam, branching = beam[:1], 1
+            children = []
+            for state in beam:
+                if complete and children and time.perf_counter() > deadline:
+                    break  # Keep what this depth found; the next one goes greedy
+                expanded += 1
+                bucket = bucket_at(state.minutes)
+                miles = graph.miles[bucket, state.zone, pickup]
+                minutes = graph.minutes[bucket, state.zone, pickup]
+                if depth == 0 and first_leg is not None:
+                    miles = np.where(first_leg[2], first_leg[0], miles)
+                    minutes = np.where(first_leg[2], first_leg[1], minutes)
+
+                end = state.minutes + minutes + duration
+                if driver.return_to_base:
+                    end_bucket = graph.bucket_of_hour[(hour + (end // 60).astype(int)) % 24]
+                    fits = end + graph.minutes[end_bucket, dropoff, base] <= shift
+                else:
+                    fits = end <= shift
+                fits[list(state.path)] = False  # Each request is driven at most once
+                options = np.flatnonzero(fits)
+                if not len(options):
+                    continue
+                gain = trip_profit[options] - miles[options] * cost_per_mile
+                if len(options) > branching:
+                    per_minute = gain / np.maximum(end[options] - state.minutes, 1)
+                    chosen = np.argpartition(-per_minute, branching - 1)[:branching]
+                    options, gain = options[chosen], gain[chosen]
+                for option, trip_gain in zip(options.tolist(), gain.tolist()):
+                    children.append(_State(int(dropoff[option]), float(end[option]), state.profit + trip_gain, state.path + (option,)))
+            if not children:
+                break
+
+            # Best first, so the memo keeps the strongest state of every (zone, bucket)
+            children.sort(key=lambda s: (-s.profit, s.minutes))
+            survivors = []
+            for child in children:
+                bucket = int(child.minutes // self.time_bucket_minutes)
+                if any(memo.get((child.zone, b), -np.inf) >= child.profit for b in range(bucket + 1)):
+                    pruned += 1
+                    continue
+                memo[(child.zone, bucket)] = child.profit
+                survivors.append(child)
+                child_value = value(child)
+                if child_value > best_value:
+                    best, best_value = child, child_value
+
+            survivors.sort(key=lambda s: -(s.profit + (shift - s.minutes) * spare_rate))
+            beam = survivors[:self.beam_width if complete else 1]
+
+        total_minutes = best.minutes + home(best)[1]
+        elapsed_ms = (time.perf_counter() - start) * 1000
+        plan = ShiftPlan(
+            requests=[columns.requests[int(keep[i])] for i in best.path],
+            total_profit=float(best_value),
+            total_minutes=float(total_minutes),
+            complete=complete,
+            states_expanded=expanded,
+            elapsed_ms=elapsed_ms,
+            stats={"candidates": int(len(keep)), "pruned": pruned, "memo_entries": len(memo)}
+        )
+        logger.info(f"Planned {len(best.path)} trips (profit ${plan.total_profit:.2f}, {plan.total_minutes:.0f} of {shift:.0f} min) "
+                    f"from {len(keep)} candidates in {elapsed_ms:.1f} ms{'' if complete else ' (budget exhausted)'}")
+        return plan
+
+    @staticmethod
+    def _dropoff_ids(columns, graph) -> np.ndarray:
+        """Zone graph ids of where each trip ends (its pickup zone when the dropoff is unknown)"""
+        requests = columns.requests
+        if isinstance(requests, RequestArray):
+            codes = requests.records["dropoff_zone"]
+            table = graph.zone_id_array(requests.zones.values)
+            return np.where(codes >= 0, table[np.maximum(codes, 0)], columns.zone_ids)
+        return graph.zone_id_array([request.dropoff_zone or request.zone for request in requests])
+
+
+if __name__ == "__main__":
+    import argparse
+    import random
+
+    parser = argparse.ArgumentParser(description="Compare shift plans against greedy one-trip-at-a-time choices")
+    parser.add_argument("--requests", type=int, default=500)
+    parser.add_argument("--drivers", type=int, default=50)
+    parser.add_argument("--budget-ms", type=float, default=20.0)
+    parser.add_argument("--trips", type=int, default=64, help="Lookahead depth; large values plan the whole shift")
+    args = parser.parse_args()
+
+    logging.getLogger("profitability_evaluatorV2").setLevel(logging.WARNING)
+    logger.setLevel(logging.WARNING)
+    rng = random.Random(0)
+    zones = ["downtown", "suburb", "airport"]
+    requests = [
+        TripRequest(user_id=f"user{i}", distance=rng.uniform(1, 20), duration=rng.uniform(5, 60), zone=rng.choice(zones),
+                    timestamp=time.time(), ride_demand_level=3, traffic_level=2, weather_severity=0, traffic_blocks=1,
+                    is_holiday=False, is_event_nearby=False, fare=rng.uniform(50, 400), rideId=i,
+                    dropoff_zone=rng.choice(zones))
+        for i in range(args.requests)
+    ]
+    drivers = [
+        DriverProfile(current_location=rng.choice(zones), current_fuel=80.0, shift_remaining_time=rng.choice([45.0, 120.0, 240.0]),
+                      earnings_today=100.0, earnings_target=250.0, vehicle_mpg=25.0, cost_per_mile=rng.uniform(0.25, 0.4),
+                      return_to_base=rng.random() < 0.3, base_location="downtown")
+        for _ in range(args.drivers)
+    ]
+
+    evaluator = RequestEvaluator()
+    planners = {
+        "greedy": ShiftPlanner(evaluator, beam_width=1, branching=1, max_trips=args.trips, budget_ms=args.budget_ms),
+        "beam": ShiftPlanner(evaluator, max_trips=args.trips, budget_ms=args.budget_ms),
+    }
+    planners["beam"].plan(requests[:10], drivers[0])  # Warm up
+    for name, planner in planners.items():
+        plans = [planner.plan(requests, driver) for driver in drivers]
+        elapsed = np.array([plan.elapsed_ms for plan in plans])
+        print(f"{name:<7} mean profit ${np.mean([plan.total_profit for plan in plans]):8.2f}  "
+              f"trips {np.mean([len(plan.requests) for plan in plans]):4.1f}  "
+              f"p50 {np.percentile(elapsed, 50):5.1f} ms  p99 {np.percentile(elapsed, 99):5.1f} ms  "
+              f"complete {sum(plan.complete for plan in plans)}/{len(plans)}")
@@ -0,0 +1,244 @@
+import numpy as np
+from typing import List, Optional, Sequence, Tuple
+from pricing_engine import TripRequest
+from compact import RequestArray
+
+EARTH_RADIUS_MILES = 3958.8
+MILES_PER_DEGREE_LAT = np.pi * EARTH_RADIUS_MILES / 180
+ROAD_DISTANCE_FACTOR = 1.3  # Road miles per straight-line mile on a city street grid
+PICKUP_SPEED_MPH = 18.0     # Average speed driving to a pickup
+
+
+def haversine_miles(lat1, lon1, lat2, lon2) -> np.ndarray:
+    """Great-circle distance in miles; any argument may be an array"""
+    lat1, lon1, lat2, lon2 = (np.radians(np.asarray(v, dtype=float)) for v in (lat1, lon1, lat2, lon2))
+    a = np.sin((lat2 - lat1) / 2) ** 2 + np.cos(lat1) * np.cos(lat2) * np.sin((lon2 - lon1) / 2) ** 2
+    return 2 * EARTH_RADIUS_MILES * np.arcsin(np.sqrt(np.minimum(a, 1.0)))
+
+
+def haversine_outer(lats1, lons1, lats2, lons2) -> np.ndarray:
+    """Great-circle miles from every point in set 1 to every point in set 2, as a (len1, len2) matrix.
+
+    Sines and cosines are taken once per point and the half-angle
+    differences expanded with the angle-subtraction identity, so the matrix
+    itself needs only products and one arcsin per pair. Agrees with
+    haversine_miles to rounding error, not bit for bit.
+    """
+    lat1, lon1, lat2, lon2 = (np.radians(np.asarray(v, dtype=float)) / 2 for v in (lats1, lons1, lats2, lons2))
+    sin_dlat = np.multiply.outer(np.cos(lat1), np.sin(lat2)) - np.multiply.outer(np.sin(lat1), np.cos(lat2))
+    sin_dlon = np.multiply.outer(np.cos(lon1), np.sin(lon2)) - np.multiply.outer(np.sin(lon1), np.cos(lon2))
+    cos_product = np.multiply.outer(np.cos(2 * lat1), np.cos(2 * lat2))
+    a = sin_dlat ** 2 + cos_product * sin_dlon ** 2
+    return 2 * EARTH_RADIUS_MILES * np.arcsin(np.sqrt(np.minimum(a, 1.0)))
+
+
+def deadhead_from_miles(straight_miles) -> Tuple[np.ndarray, np.ndarray]:
+    """Estimated road miles and minutes for a straight-line distance"""
+    miles = straight_miles * ROAD_DISTANCE_FACTOR
+    return miles, miles / PICKUP_SPEED_MPH * 60
+
+
+def deadhead_from_coordinates(lat1, lon1, lat2, lon2) -> Tuple[np.ndarray, np.ndarray]:
+    """Estimated road miles and minutes between coordinates (NaN where any coordinate is NaN)"""
+    return deadhead_from_miles(haversine_miles(lat1, lon1, lat2, lon2))
+
+
+def has_coordinates(location) -> bool:
+    return location is not None and None not in location
+
+
+class GridIndex:
+    """Uniform lat/lon grid over a fixed set of points for radius and k-nearest queries.
+
+    Points are sorted by cell once, so each cell is a contiguous slice and a
+    query only measures the points in the cells its search box overlaps.
+    Longitude cells are narrowed by the cosine of the latitude farthest from
+    the equator, so no cell is narrower than cell_miles where there are
+    points. How many columns a search box spans is worked out per query from
+    the haversine formula, which keeps radius and nearest queries exact at
+    any latitude.
+    """
+
+    def __init__(self, lats: np.ndarray, lons: np.ndarray, cell_miles: float = 1.0):
+        self.lats = np.asarray(lats, dtype=float)
+        self.lons = np.asarray(lons, dtype=float)
+        self.cell_miles = cell_miles
+        self.lat_step = cell_miles / MILES_PER_DEGREE_LAT
+        # Smallest cos(latitude) over the points; it bounds how far a longitude difference can shrink
+        self.min_cos = float(np.cos(np.radians(np.abs(self.lats).max()))) if len(self.lats) else 1.0
+        self.lon_step = self.lat_step / max(self.min_cos, 0.01)
+
+        rows, cols = self._cells(self.lats, self.lons)
+        self.order = np.lexsort((cols, rows))
+        keys = np.stack([rows[self.order], cols[self.order]], axis=1)
+        starts = np.flatnonzero(np.r_[True, (keys[1:] != keys[:-1]).any(axis=1)]) if len(keys) else np.empty(0, int)
+        ends = np.r_[starts[1:], len(keys)]
+        self._slices = {(int(keys[s, 0]), int(keys[s, 1])): (s, e) for s, e in zip(starts, ends)}
+        self._occupied = keys[starts]
+
+    def __len__(self) -> int:
+        return len(self.lats)
+
+    def _cells(self, lats, lons) -> Tuple[np.ndarray, np.ndarray]:
+        return np.floor(lats / self.lat_step).astype(np.int64), np.floor(lons / self.lon_step).astype(np.int64)
+
+    def _reach(self, lat: float, miles: float) -> Tuple[int, int]:
+        """Rows and columns either side of (lat, *)'s cell that hold every point within miles of it.
+
+        hav(d) >= hav(dlat) bounds the rows; hav(d) >= cos(lat) cos(lat') hav(dlon),
+        with cos(lat') no smaller than min_cos, bounds the columns.
+        """
+        rows = int(np.ceil(miles / self.cell_miles))
+        all_cols = int(np.ceil(180 / self.lon_step))
+        angle = miles / EARTH_RADIUS_MILES
+        scale = np.cos(np.radians(lat)) * self.min_cos
+        if angle >= np.pi or np.sin(angle / 2) ** 2 >= scale:
+            return rows, all_cols  # Any longitude difference may be close enough
+        dlon = np.degrees(2 * np.arcsin(np.sin(angle / 2) / np.sqrt(scale)))
+        return rows, min(int(np.ceil(dlon / self.lon_step)), all_cols)
+
+    def _gather(self, lat: float, lon: float, rows: int, cols: int) -> np.ndarray:
+        """Point ids in the (2 * rows + 1) x (2 * cols + 1) cells around (lat, lon)"""
+        row, col = (int(c) for c in self._cells(np.float64(lat), np.float64(lon)))
+        if (2 * rows + 1) * (2 * cols + 1) > len(self._slices):
+            # A box wider than the occupied area: walk the occupied cells instead
+            cells = [cell for cell in self._slices if abs(cell[0] - row) <= rows and abs(cell[1] - col) <= cols]
+        else:
+            cells = [(r, c) for r in range(row - rows, row + rows + 1) for c in range(col - cols, col + cols + 1)]
+        parts = []
+        for cell in cells:
+            span = self._slices.get(cell)
+            if span is not None:
+                parts.append(self.order[span[0]:span[1]])
+        return np.concatenate(parts) if parts else np.empty(0, dtype=np.intp)
+
+    def query_radius(self, lat: float, lon: float, radius_miles: float, nearest_first: bool = True) -> Tuple[np.ndarray, np.ndarray]:
+        """Ids and distances of points within radius_miles, nearest first unless nearest_first is False"""
+        ids = self._gather(lat, lon, *self._reach(lat, radius_miles))
+        distances = haversine_miles(lat, lon, self.lats[ids], self.lons[ids])
+        keep = distances <= radius_miles
+        ids, distances = ids[keep], distances[keep]
+        if not nearest_first:
+            return ids, distances
+        order = np.argsort(distances, kind="stable")
+        return ids[order], distances[order]
+
+    def nearest(self, lat: float, lon: float, k: int, max_radius_miles: Optional[float] = None) -> Tuple[np.ndarray, np.ndarray]:
+        """Ids and distances of the k nearest points (optionally within max_radius_miles), nearest first.
+
+        The search radius grows a cell at a time, then doubling, until k
+        points lie within it; the box searched always holds every point
+        within the radius, so no closer point can be missed.
+        """
+        if k <= 0 or not len(self):
+            return np.empty(0, dtype=np.intp), np.empty(0)
+        if max_radius_miles is None:
+            # Far enough to take in every occupied cell: a point is at most its latitude
+            # difference plus its longitude difference (measured at the equator) away
+            row, col = self._cells(np.float64(lat), np.float64(lon))
+            row_span, col_span = np.abs(self._occupied - [row, col]).max(axis=0) + 1
+            max_reach = int(row_span + np.ceil(col_span * self.lon_step / self.lat_step))
+        else:
+            max_reach = int(np.ceil(max_radius_miles / self.cell_miles))
+        reach = 0
+        while True:
+            covered = reach * self.cell_miles  # Every point closer than this is inside the box
+            ids = self._gather(lat, lon, *self._reach(lat, covered))
+            distances = haversine_miles(lat, lon, self.lats[ids], self.lons[ids])
+            if max_radius_miles is not None:
+                covered = min(covered, max_radius_miles)
+                inside = distances <= max_radius_miles
+                ids, distances = ids[inside], distances[inside]
+            enough = np.count_nonzero(distances <= covered) >= k
+            if enough or reach >= max_reach or len(ids) == len(self):
+                order = np.argsort(distances, kind="stable")[:k]
+                return ids[order], distances[order]
+            reach = min(max(1, reach * 2), max_reach)
+
+
+def request_coordinates(requests: Sequence[TripRequest]) -> Tuple[np.ndarray, np.ndarray]:
+    """Pickup lat/lon arrays, NaN where a request has no coordinates"""
+    if isinstance(requests, RequestArray):
+        return requests.records["pickup_lat"].copy(), requests.records["pickup_lon"].copy()
+    n = len(requests)
+    lats = np.fromiter((np.nan if r.pickup_lat is None else r.pickup_lat for r in requests), dtype=float, count=n)
+    lons = np.fromiter((np.nan if r.pickup_lon is None else r.pickup_lon for r in requests), dtype=float, count=n)
+    return lats, lons
+
+
+class RequestIndex:
+    """Open requests with a grid index over their pickup coordinates.
+
+    Build once per pool of open requests and query it per driver. Requests
+    without coordinates cannot be placed, so every query keeps them. A
+    RequestArray stays a RequestArray.
+    """
+
+    def __init__(self, requests: Sequence[TripRequest], cell_miles: float = 1.0):
+        self.requests = requests if isinstance(requests, RequestArray) else list(requests)
+        lats, lons = request_coordinates(self.requests)
+        located = ~(np.isnan(lats) | np.isnan(lons))
+        self.located = np.flatnonzero(located)
+        self.unlocated = np.flatnonzero(~located)
+        self.grid = GridIndex(lats[located], lons[located], cell_miles)
+
+    def __len__(self) -> int:
+        return len(self.requests)
+
+    def within(self, lat: float, lon: float, radius_miles: float) -> Tuple[np.ndarray, np.ndarray]:
+        """Positions of the requests within radius_miles plus those without coordinates, in pool order,
+        and their straight-line miles from (lat, lon) (NaN for those without coordinates)"""
+        ids, distances = self.grid.query_radius(lat, lon, radius_miles, nearest_first=False)
+        chosen = np.concatenate([self.located[ids], self.unlocated])
+        miles = np.concatenate([distances, np.full(len(self.unlocated), np.nan)])
+        order = np.argsort(chosen, kind="stable")
+        return chosen[order], miles[order]
+
+    def near(self, lat: float, lon: float, radius_miles: Optional[float] = None,
+             k_nearest: Optional[int] = None) -> List[TripRequest]:
+        """Requests within radius_miles and/or the k nearest, plus every request without coordinates"""
+        if k_nearest is not None:
+            ids, _ = self.grid.nearest(lat, lon, k_nearest, radius_miles)
+        elif radius_miles is not None:
+            ids, _ = self.grid.query_radius(lat, lon, radius_miles)
+        else:
+            return self.requests
+        chosen = np.concatenate([self.located[ids], self.unlocated])
+        chosen.sort()  # Keep pool order so score ties still break by request order
+        if isinstance(self.requests, RequestArray):
+            return self.requests.take(chosen)
+        return [self.requests[i] for i in chosen]
+
+
+def prefilter_requests(requests, lat: Optional[float], lon: Optional[float], radius_miles: Optional[float] = None,
+                       k_nearest: Optional[int] = None) -> List[TripRequest]:
+    """Candidates worth scoring for a driver at (lat, lon).
+
+    requests may be a RequestIndex (queried through its grid), a plain
+    list or a RequestArray; the last two are filtered with one vectorized
+    haversine pass since building an index for a single query would not pay
+    off, and a RequestArray comes back as a RequestArray. Without driver
+    coordinates or any limit, every request is a candidate.
+    """
+    if lat is None or lon is None or (radius_miles is None and k_nearest is None):
+        if isinstance(requests, RequestIndex):
+            return requests.requests
+        return requests if isinstance(requests, RequestArray) else list(requests)
+    if isinstance(requests, RequestIndex):
+        return requests.near(lat, lon, radius_miles, k_nearest)
+
+    if not isinstance(requests, RequestArray):
+        requests = list(requests)
+    lats, lons = request_coordinates(requests)
+    distances = haversine_miles(lat, lon, lats, lons)
+    located = ~np.isnan(distances)
+    keep = ~located
+    ids = np.flatnonzero(located)
+    if radius_miles is not None:
+        ids = ids[distances[ids] <= radius_miles]
+    if k_nearest is not None and len(ids) > k_nearest:
+        ids = ids[np.argsort(distances[ids], kind="stable")[:k_nearest]]
+    keep[ids] = True
+    if isinstance(requests, RequestArray):
+        return requests[keep]
+    return [request for request, kept in zip(requests, keep) if kept]
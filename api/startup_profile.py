@@ -0,0 +1,72 @@
+import sys
+import json
+import time
+import subprocess
+
+BACKENDS = ("sklearn", "compiled", "shared")
+
+
+def _profile_child(backend: str, warmup: bool):
+    """Runs in a fresh interpreter: time import, model load and the first requests"""
+    start = time.perf_counter()
+    from pricing_engine import PricingEngine, PricingConfig, TripRequest, UserProfile
+    imported = time.perf_counter()
+
+    engine = PricingEngine(PricingConfig(inference_backend=backend))
+    loaded = time.perf_counter()
+
+    warmup_ms = engine.warmup()["warmup_ms"] if warmup else 0.0
+
+    request = TripRequest(user_id="profile", distance=4.2, duration=18.0, zone="downtown", timestamp=time.time(),
+                          ride_demand_level=3, traffic_level=2, weather_severity=0, traffic_blocks=2,
+                          is_holiday=False, is_event_nearby=False)
+    latencies = []
+    for _ in range(2):
+        begin = time.perf_counter()
+        engine.calculate_price(request, UserProfile(), current_supply=20)
+        latencies.append((time.perf_counter() - begin) * 1000)
+
+    print(json.dumps({
+        "import_ms": (imported - start) * 1000,
+        "load_ms": (loaded - imported) * 1000,
+        "warmup_ms": warmup_ms,
+        "first_request_ms": latencies[0],
+        "second_request_ms": latencies[1],
+        "heavy_modules_loaded": sorted(m for m in ("pandas", "sklearn", "joblib") if m in sys.modules)
+    }))
+
+
+def profile(backend: str, warmup: bool) -> dict:
+    """Profile one backend in a fresh interpreter so nothing is already imported or cached"""
+    result = subprocess.run(
+        [sys.executable, __file__, "--child", backend] + (["--warmup"] if warmup else []),
+        capture_output=True, text=True, check=True
+    )
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Startup-time breakdown: import, model load and first-request latency")
+    parser.add_argument("--child", choices=BACKENDS, help=argparse.SUPPRESS)
+    parser.add_argument("--warmup", action="store_true", help=argparse.SUPPRESS)
+    parser.add_argument("--out", help="Also write the results as JSON to this file")
+    args = parser.parse_args()
+
+    if args.child:
+        _profile_child(args.child, args.warmup)
+        sys.exit(0)
+
+    rows = []
+    print(f"{'backend':<10}{'warmup':>7}{'import ms':>11}{'load ms':>10}{'warmup ms':>11}{'1st req ms':>12}{'2nd req ms':>12}  heavy modules")
+    for backend in BACKENDS:
+        for warmup in (False, True):
+            row = {"backend": backend, "warmup": warmup, **profile(backend, warmup)}
+            rows.append(row)
+            print(f"{backend:<10}{'yes' if warmup else 'no':>7}{row['import_ms']:>11.0f}{row['load_ms']:>10.0f}"
+                  f"{row['warmup_ms']:>11.0f}{row['first_request_ms']:>12.1f}{row['second_request_ms']:>12.1f}  "
+                  f"{','.join(row['heavy_modules_loaded']) or '-'}")
+    if args.out:
+        with open(args.out, "w") as f:
+            json.dump(rows, f, indent=2)
@@ -0,0 +1,183 @@
+import time
+import logging
+import threading
+from typing import Dict, Iterable, Optional
+import numpy as np
+
+# Configure logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+def surge_curve(ratio, surge_threshold: float):
+    """Sigmoid surge (1.0 to 1.8) for demand/supply ratios above 1; works on scalars and arrays"""
+    normalized_ratio = (ratio - 1.0) / (surge_threshold - 1.0)
+    sigmoid = 1 / (1 + np.exp(-4 * (normalized_ratio - 0.5)))
+    return 1.0 + (sigmoid * 0.8)
+
+
+def demand_time_weight(hour: int) -> float:
+    """Weight applied to demand by time of day"""
+    if 8 <= hour <= 10 or 16 <= hour <= 19:  # Peak hours
+        return 1.2
+    elif 23 <= hour or hour <= 4:  # Late night
+        return 1.1
+    return 1.0
+
+
+class SlidingWindowCounter:
+    """Event count over the last `window` seconds, kept in a ring of per-second buckets"""
+
+    def __init__(self, window: int):
+        self.window = window
+        self.buckets = [0] * window
+        self.total = 0
+        self.head: Optional[int] = None  # Latest second the ring has advanced to
+
+    def advance(self, second: int):
+        """Expire buckets that fell out of the window; O(1) amortized"""
+        if self.head is None or second <= self.head:
+            self.head = second if self.head is None else self.head
+            return
+        for expired in range(self.head + 1, self.head + min(second - self.head, self.window) + 1):
+            index = expired % self.window
+            self.total -= self.buckets[index]
+            self.buckets[index] = 0
+        self.head = second
+
+    def add(self, second: int, amount: int = 1):
+        self.advance(second)
+        if second <= self.head - self.window:
+            return  # Too old to count
+        self.buckets[second % self.window] += amount
+        self.total += amount
+
+
+class ZoneState:
+    """Sliding request counter and online drivers for one zone"""
+
+    def __init__(self, window: int):
+        self.requests = SlidingWindowCounter(window)
+        self.drivers = set()
+
+
+class SurgeState:
+    """Per-zone surge multipliers maintained incrementally from supply/demand events.
+
+    Events are request_created, driver_online and driver_offline. Each event
+    updates its zone's counters and republishes that zone's multiplier, and a
+    background tick keeps multipliers current as old requests leave the
+    window. Readers get the published value with a dict lookup, so every
+    quote in a zone sees the same surge.
+    """
+
+    EVENT_TYPES = ("request_created", "driver_online", "driver_offline")
+
+    def __init__(self, surge_threshold: float, window_seconds: int = 300, clock=time.time):
+        self.surge_threshold = surge_threshold
+        self.window_seconds = window_seconds
+        self._clock = clock
+        self._zones: Dict[str, ZoneState] = {}
+        self._driver_zone: Dict[str, str] = {}
+        self._surge: Dict[str, float] = {}
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def get_surge(self, zone: str) -> float:
+        """Current published multiplier for a zone (1.0 if nothing is known about it)"""
+        return self._surge.get(zone, 1.0)
+
+    def request_created(self, zone: str, timestamp: Optional[float] = None):
+        with self._lock:
+            second = self._second(timestamp)
+            self._zone(zone).requests.add(second)
+            self._publish(zone, second)
+
+    def driver_online(self, zone: str, driver_id: str, timestamp: Optional[float] = None):
+        with self._lock:
+            second = self._second(timestamp)
+            previous = self._driver_zone.get(driver_id)
+            if previous is not None and previous != zone:
+                self._zones[previous].drivers.discard(driver_id)
+                self._publish(previous, second)
+            self._driver_zone[driver_id] = zone
+            self._zone(zone).drivers.add(driver_id)
+            self._publish(zone, second)
+
+    def driver_offline(self, driver_id: str, timestamp: Optional[float] = None):
+        with self._lock:
+            zone = self._driver_zone.pop(driver_id, None)
+            if zone is not None:
+                self._zones[zone].drivers.discard(driver_id)
+                self._publish(zone, self._second(timestamp))
+
+    def apply_events(self, events: Iterable[dict]) -> int:
+        """Apply {"type", "zone", "driver_id", "timestamp"} events in order; returns how many were applied"""
+        applied = 0
+        for event in events:
+            event_type = event.get("type")
+            if event_type == "request_created":
+                self.request_created(event["zone"], event.get("timestamp"))
+            elif event_type == "driver_online":
+                self.driver_online(event["zone"], str(event["driver_id"]), event.get("timestamp"))
+            elif event_type == "driver_offline":
+                self.driver_offline(str(event["driver_id"]), event.get("timestamp"))
+            else:
+                raise ValueError(f"Unknown surge event type: {event_type}")
+            applied += 1
+        return applied
+
+    def tick(self, timestamp: Optional[float] = None):
+        """Expire old requests in every zone and republish"""
+        with self._lock:
+            second = self._second(timestamp)
+            for zone in self._zones:
+                self._publish(zone, second)
+
+    def snapshot(self) -> Dict[str, dict]:
+        with self._lock:
+            return {
+                zone: {
+                    "requests_in_window": state.requests.total,
+                    "drivers_online": len(state.drivers),
+                    "surge": self._surge.get(zone, 1.0)
+                }
+                for zone, state in self._zones.items()
+            }
+
+    def start(self, tick_interval: float = 1.0):
+        if self._thread is not None:
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, args=(tick_interval,), name="surge-tick", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def _run(self, tick_interval: float):
+        while not self._stop.wait(tick_interval):
+            self.tick()
+
+    def _second(self, timestamp: Optional[float]) -> int:
+        return int(self._clock() if timestamp is None else timestamp)
+
+    def _zone(self, zone: str) -> ZoneState:
+        state = self._zones.get(zone)
+        if state is None:
+            state = self._zones[zone] = ZoneState(self.window_seconds)
+        return state
+
+    def _publish(self, zone: str, second: int):
+        """Recompute one zone's multiplier from its counters (caller holds the lock)"""
+        state = self._zones[zone]
+        state.requests.advance(second)
+        hourly_demand = state.requests.total * 3600 / self.window_seconds
+        effective_demand = hourly_demand * demand_time_weight(time.localtime(second).tm_hour)
+        ratio = effective_demand / max(len(state.drivers), 1)
+        surge = 1.0 if ratio <= 1.0 else float(surge_curve(ratio, self.surge_threshold))
+        self._surge[zone] = max(1.0, min(surge, 1.8))
@@ -0,0 +1,100 @@
+import pytest
+import codec
+from codec import CodecError, PRICING_TRIP, TRIP_REQUEST, USER_PROFILE, decode_request_array
+from compact import RequestArray, StringTable
+from pricing_engine import TripRequest, UserProfile
+
+
+def ride(i: int = 0, **fields):
+    row = {"user_id": f"u{i}", "distance": 5.0, "duration": 15.0, "zone": "downtown", "timestamp": 1700000000 + i,
+           "ride_demand_level": 3, "traffic_level": 2, "weather_severity": 1, "traffic_blocks": 0,
+           "is_holiday": False, "is_event_nearby": False, "fare": 120.0, "rideId": i}
+    row.update(fields)
+    return row
+
+
+@pytest.mark.parametrize("field,value", [("weather_severity", 300), ("weather_severity", -129), ("ride_demand_level", 40000),
+                                         ("traffic_level", -32769), ("traffic_blocks", 2 ** 15), ("rideId", 2 ** 63),
+                                         ("rideId", -2 ** 63)])
+def test_values_outside_packed_columns_are_rejected(field, value):
+    rows = [ride(0), ride(1, **{field: value})]
+    with pytest.raises(CodecError, match=rf"rideRequests\[1\]: field '{field}' must be between"):
+        decode_request_array(rows)
+    with pytest.raises(CodecError, match=r"rideRequests\[1\]"):
+        TRIP_REQUEST.decode_many(rows, "rideRequests")
+    with pytest.raises(CodecError, match=field):
+        TRIP_REQUEST.decode(rows[1])
+    if field != "rideId":
+        with pytest.raises(CodecError, match=field):
+            PRICING_TRIP.with_defaults(timestamp=0).decode(rows[1], timestamp=0)
+
+
+def test_values_at_the_limits_are_packed():
+    rows = [ride(0, weather_severity=127, traffic_blocks=-32768, rideId=2 ** 63 - 1), ride(1, weather_severity=-128, rideId=None)]
+    packed = decode_request_array(rows).to_dicts()
+    assert [{name: row[name] for name in rows[0]} for row in packed] == rows
+
+
+def test_too_many_zones_for_the_zone_column():
+    zones = StringTable(f"z{i}" for i in range(2 ** 15))
+    assert RequestArray.from_columns(TRIP_REQUEST.columns([ride(zone="z7")]), zones=zones).zone_names() == ["z7"]
+    with pytest.raises(OverflowError, match="zones"):
+        RequestArray.from_columns(TRIP_REQUEST.columns([ride(zone="one more")]), zones=zones)
+
+
+@pytest.mark.parametrize("row,message", [
+    ([], "expected an object, got list"),
+    ({k: v for k, v in ride().items() if k != "distance"}, r"missing fields \['distance'\]"),
+    (ride(color="red"), "unexpected field 'color'"),
+    (ride(distance="5"), "field 'distance' must be float, got str"),
+    (ride(traffic_level=2.5), "field 'traffic_level' must be int, got float"),
+    (ride(traffic_level=True), "field 'traffic_level' must be int, got bool"),
+    (ride(is_holiday=2), "field 'is_holiday' must be bool, got int"),
+    (ride(zone=None), "field 'zone' must be str, got NoneType"),
+    (ride(user_id=7), "field 'user_id' must be str, got int"),
+])
+def test_schema_rejects_bad_rows(row, message):
+    with pytest.raises(CodecError, match=message) as error:
+        TRIP_REQUEST.decode(row, "trip")
+    assert error.value.status == 400
+    with pytest.raises(CodecError, match=rf"rideRequests\[1\]: {message}"):
+        TRIP_REQUEST.decode_many([ride(0), row], "rideRequests")
+    with pytest.raises(CodecError, match=rf"rideRequests\[1\]: {message}"):
+        decode_request_array([ride(0), row])
+
+
+def test_schema_coerces_only_lossless_values():
+    trip = TRIP_REQUEST.decode(ride(traffic_level=2.0, is_holiday=1, distance=5, fare=None, rideId=None))
+    assert trip == TripRequest(**ride(traffic_level=2, is_holiday=True, distance=5.0, fare=None, rideId=None))
+    assert type(trip.traffic_level) is int and type(trip.is_holiday) is bool
+    assert TRIP_REQUEST.decode_many([ride(0), ride(1, traffic_level=3.0)])[1].traffic_level == 3
+    with pytest.raises(CodecError, match="rideRequests: expected a list, got dict"):
+        TRIP_REQUEST.columns({"rides": []}, "rideRequests")
+
+
+def test_partial_schemas_fill_and_ignore_fields():
+    trip = PRICING_TRIP.decode({**ride(), "extra": 1}, timestamp=123)
+    assert trip.timestamp == 123 and trip.fare is None and trip.rideId is None  # Client timestamp, fare and id are not read
+    with pytest.raises(CodecError, match=r"missing fields \['zone'\]"):
+        PRICING_TRIP.decode({k: v for k, v in ride().items() if k != "zone"}, timestamp=0)
+    pricing = PRICING_TRIP.with_defaults(zone="downtown")
+    assert pricing.decode({k: v for k, v in ride().items() if k != "zone"}, timestamp=0).zone == "downtown"
+    assert pricing.required == PRICING_TRIP.required - {"zone"}
+    user = USER_PROFILE.decode({"loyalty_tier": 2, "price_sensitivity": 1, "vip": True})
+    assert user == UserProfile(loyalty_tier=2, price_sensitivity=1.0)
+    with pytest.raises(CodecError, match=r"UserProfile: missing fields \['price_sensitivity'\]"):
+        USER_PROFILE.decode({"loyalty_tier": 2})
+
+
+def test_malformed_bodies():
+    with pytest.raises(CodecError, match="Invalid JSON payload"):
+        codec.decode(b"{not json")
+    assert codec.decode(b'{"a": [1, 2.5]}', "application/json; charset=utf-8") == {"a": [1, 2.5]}
+    if codec.msgpack is None:
+        with pytest.raises(CodecError) as error:
+            codec.decode(b"\x80", codec.MSGPACK)
+        assert error.value.status == 415
+    else:
+        with pytest.raises(CodecError, match="Invalid MessagePack payload"):
+            codec.decode(b"\xc1", codec.MSGPACK)
+        assert codec.decode(codec.msgpack.packb({"a": 1}), "application/x-msgpack") == {"a": 1}
@@ -0,0 +1,45 @@
+import os
+import numpy as np
+import pytest
+from sklearn.model_selection import train_test_split
+from base_price_model import build_model, engineer_features, load_data
+from compiled_forest import CompiledForest
+
+DATA_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'realistic_taxi_data.csv')
+
+
+@pytest.fixture(scope="module")
+def trained():
+    """A smaller forest from build_model(), fitted on every row (outlier cleaning would leave only a few dozen)"""
+    df = engineer_features(load_data(DATA_PATH))
+    X_train, X_test, y_train, _ = train_test_split(df.drop('fare', axis=1), df['fare'], test_size=0.2, random_state=42)
+    pipeline = build_model().set_params(regressor__n_estimators=20)
+    pipeline.fit(X_train, y_train)
+    return pipeline, X_test
+
+
+def test_predictions_match_pipeline_exactly(trained):
+    pipeline, X_test = trained
+    compiled = CompiledForest.from_pipeline(pipeline)
+    expected = pipeline.predict(X_test)
+    assert np.array_equal(compiled.predict(X_test), expected)
+    # Also across traversal chunks, the last one a single row
+    compiled.chunk_rows = len(X_test) - 1
+    assert np.array_equal(compiled.predict(X_test), expected)
+
+
+def test_single_rows_match_pipeline(trained):
+    pipeline, X_test = trained
+    compiled = CompiledForest.from_pipeline(pipeline)
+    for i in range(20):
+        row = X_test.iloc[[i]]
+        assert np.array_equal(compiled.predict(row), pipeline.predict(row))
+
+
+def test_saved_forest_predicts_the_same(trained, tmp_path):
+    pipeline, X_test = trained
+    path = str(tmp_path / "model.forest")
+    CompiledForest.from_pipeline(pipeline).save(path, model_version="v1")
+    assert CompiledForest.load(path, model_version="v2") is None
+    loaded = CompiledForest.load(path, model_version="v1")
+    assert np.array_equal(loaded.predict(X_test), pipeline.predict(X_test))
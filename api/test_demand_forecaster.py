@@ -0,0 +1,56 @@
+import time
+import numpy as np
+from demand_forecaster import GLOBAL_ZONE, DemandForecaster, DemandTable, fit_demand_table
+
+WEEK = 7 * 86400
+
+
+def local(day: int, hour: int, minute: int = 0) -> float:
+    """Timestamp of a local time in the week of Monday 1 January 2024 (day 0 is that Monday)"""
+    return time.mktime((2024, 1, 1 + day, hour, minute, 0, 0, 0, -1))
+
+
+def test_fit_averages_trips_over_the_slots_the_history_covers():
+    prior = DemandTable.uniform(np.arange(24, dtype=float))
+    trips = [("airport", local(0, 8, 10)), ("airport", local(0, 8, 40)), ("downtown", local(1, 9)), ("downtown", local(1, 9, 5))]
+    table = fit_demand_table(trips, prior)
+
+    assert table.zones == [GLOBAL_ZONE, "airport", "downtown"]
+    assert table.lookup(8, "airport", 0) == 2.0
+    assert table.lookup(9, "downtown", 1) == 2.0
+    assert table.lookup(9, "airport", 1) == 0.0      # Covered, no trips
+    assert table.lookup(8, GLOBAL_ZONE, 0) == 2.0
+    assert table.lookup(9, "suburb", 1) == 2.0       # Unknown zones read the city-wide row
+    assert table.lookup(7, "airport", 0) == 7.0      # Before the history starts: the prior
+    assert table.lookup(10, "downtown", 6) == 10.0   # No Sunday in the span
+    assert np.array_equal(table.lookup_batch(np.array([8, 9, 7]), ["airport", "downtown", "airport"], np.array([0, 1, 0])),
+                          [2.0, 2.0, 7.0])
+    assert fit_demand_table([], prior) is prior
+
+
+def test_refit_reads_history_and_recorded_trips(tmp_path):
+    history = tmp_path / "trips.csv"
+    history.write_text("zone,timestamp\n" + "".join(f"downtown,{local(0, 18) + week * WEEK}\n" for week in range(4)))
+    forecaster = DemandForecaster(str(history), refresh_interval=0)
+    forecaster.train(np.array([[0, 2.0], [23, 2.0]]))
+    assert forecaster.predict_demand(18, "downtown", 0) == 2.0  # The prior until the first refit
+
+    forecaster.refit()
+    assert forecaster.predict_demand(18, "downtown", 0) == 1.0
+    for week in range(4):
+        forecaster.record_trip("downtown", local(0, 18, 30) + week * WEEK)
+    forecaster.record_trip("airport", local(21, 18, 45))
+    forecaster.refit()
+    assert forecaster.predict_demand(18, "downtown", 0) == 2.0
+    assert forecaster.predict_demand(18, "airport", 0) == 0.25
+    assert forecaster.predict_demand(18, None, 0) == 2.25
+    assert forecaster.predict_demand(3, "airport", 5) == 0.0  # The span covers every weekly slot
+
+
+def test_start_refits_once_without_a_refresh_interval():
+    forecaster = DemandForecaster(refresh_interval=0)
+    forecaster.record_trip("downtown", local(2, 12))
+    forecaster.start()
+    assert forecaster._thread is None
+    assert forecaster.predict_demand(12, "downtown", 2) == 1.0
+    forecaster.stop()
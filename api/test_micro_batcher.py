@@ -0,0 +1,78 @@
+import asyncio
+import copy
+import pytest
+from micro_batcher import MicroBatcher
+from pricing_engine import PricingConfig, PricingEngine, TripRequest, UserProfile
+
+
+def trip(i: int) -> TripRequest:
+    return TripRequest(user_id=f"u{i}", distance=2.0 + i, duration=10.0 + i, zone="downtown", timestamp=1700000000 + 3600 * i,
+                       ride_demand_level=3, traffic_level=2, weather_severity=0, traffic_blocks=1,
+                       is_holiday=False, is_event_nearby=False)
+
+
+async def quote_all(batcher: MicroBatcher, quotes):
+    """Submit every quote at once so they share batches; each result is a price or the exception raised"""
+    await batcher.start()
+    try:
+        return await asyncio.gather(*(batcher.submit(*quote) for quote in quotes), return_exceptions=True)
+    finally:
+        await batcher.stop()
+
+
+@pytest.fixture
+def engine(model_path):
+    engine = PricingEngine(PricingConfig(model_path=model_path))
+    yield engine
+    engine.close()
+
+
+def test_malformed_quote_does_not_reprice_the_batch(engine):
+    quotes = [(trip(i), UserProfile(), 1000) for i in range(8)]
+    bad = copy.copy(quotes[3][0])
+    bad.distance = None
+    quotes[3] = (bad, UserProfile(), 1000)
+    batcher = MicroBatcher(engine, max_batch_size=16, max_wait_ms=50)
+    prices = asyncio.run(quote_all(batcher, quotes))
+
+    assert batcher.batches == 1
+    assert prices[3] == engine.config.min_price
+    expected = [engine.calculate_price(*quote) for quote in quotes]
+    for i in (0, 1, 2, 4, 5, 6, 7):  # No surge at this supply, so the prices are deterministic
+        assert prices[i] == expected[i] != engine.config.min_price
+
+
+class BatchFailingEngine:
+    """Its batch call always raises; single quotes fail only for trips without a zone"""
+
+    def calculate_price_batch(self, requests, users, supplies):
+        raise RuntimeError("batch failed")
+
+    def calculate_price(self, request, user, current_supply):
+        if request.zone is None:
+            raise ValueError(f"no zone for {request.user_id}")
+        return 100.0 + request.distance
+
+
+def test_failed_batch_resolves_each_quote_on_its_own():
+    quotes = [(trip(i), UserProfile(), 5) for i in range(5)]
+    quotes[2][0].zone = None
+    results = asyncio.run(quote_all(MicroBatcher(BatchFailingEngine(), max_batch_size=8, max_wait_ms=50), quotes))
+
+    assert isinstance(results[2], ValueError)
+    assert [results[i] for i in (0, 1, 3, 4)] == [102.0, 103.0, 105.0, 106.0]
+
+
+def test_stop_fails_queued_quotes_and_allows_restart():
+    async def scenario():
+        batcher = MicroBatcher(BatchFailingEngine(), max_batch_size=4, max_wait_ms=50)
+        await batcher.start()
+        pending = [asyncio.create_task(batcher.submit(trip(i), UserProfile(), 5)) for i in range(3)]
+        await asyncio.sleep(0)  # Queued, but the batch window has not closed
+        await batcher.stop()
+        stopped = await asyncio.gather(*pending, return_exceptions=True)
+        return stopped, await quote_all(batcher, [(trip(9), UserProfile(), 5)])
+
+    stopped, restarted = asyncio.run(scenario())
+    assert all(isinstance(result, RuntimeError) for result in stopped)
+    assert restarted == [111.0]
@@ -0,0 +1,97 @@
+import copy
+import random
+import numpy as np
+import pytest
+from pricing_engine import PricingConfig, PricingEngine, TripRequest, UserProfile
+
+
+@pytest.fixture(params=["sklearn", "compiled"])
+def engine(request, model_path):
+    engine = PricingEngine(PricingConfig(model_path=model_path, inference_backend=request.param))
+    yield engine
+    engine.close()
+
+
+def trips(n: int, seed: int = 0):
+    """Trips across zones, hours and conditions; low supply values make many of them surge"""
+    rnd = random.Random(seed)
+    requests, users, supplies = [], [], []
+    for i in range(n):
+        requests.append(TripRequest(
+            user_id=f"u{i}", distance=rnd.uniform(0.5, 20), duration=rnd.uniform(5, 60),
+            zone=rnd.choice(["airport", "downtown", "suburb", "nowhere"]), timestamp=1700000000 + rnd.randint(0, 86400 * 7),
+            ride_demand_level=rnd.randint(1, 5), traffic_level=rnd.randint(1, 5), weather_severity=rnd.randint(0, 3),
+            traffic_blocks=rnd.randint(0, 5), is_holiday=rnd.random() < 0.1, is_event_nearby=rnd.random() < 0.1, rideId=i
+        ))
+        users.append(UserProfile(rnd.randint(1, 5), rnd.choice([0.9, 1.0, 1.2])))
+        supplies.append(rnd.randint(0, 100))
+    return requests, users, supplies
+
+
+@pytest.mark.parametrize("seed", [0, 7])
+def test_batch_matches_sequential_prices(engine, seed):
+    requests, users, supplies = trips(300)
+    rng = np.random.default_rng(seed)
+    expected = [engine.calculate_price(request, user, supply, rng=rng)
+                for request, user, supply in zip(requests, users, supplies)]
+    assert len(set(expected)) > len(expected) // 2  # Real prices, not the min_price error fallback
+    assert engine.calculate_price_batch(requests, users, supplies, seed=seed) == expected
+
+
+def test_batch_seed_sets_surge_jitter(engine):
+    requests, users, supplies = trips(300)
+    assert engine.calculate_price_batch(requests, users, supplies, seed=1) == engine.calculate_price_batch(requests, users, supplies, seed=1)
+    assert engine.calculate_price_batch(requests, users, supplies, seed=1) != engine.calculate_price_batch(requests, users, supplies, seed=2)
+
+
+def test_batch_with_one_supply_value(engine):
+    requests, users, _ = trips(50, seed=1)
+    rng = np.random.default_rng(3)
+    expected = [engine.calculate_price(request, user, 5, rng=rng) for request, user in zip(requests, users)]
+    assert engine.calculate_price_batch(requests, users, 5, seed=3) == expected
+    assert engine.calculate_price_batch([], [], 5) == []
+    with pytest.raises(ValueError):
+        engine.calculate_price_batch(requests, users[:-1], 5)
+
+
+def with_row(rows, i, row):
+    return rows[:i] + [row] + rows[i:]
+
+
+def test_failing_row_keeps_other_prices(engine):
+    requests, users, supplies = trips(40, seed=2)
+    users[10] = None  # The vectorized pass raises; every row is priced on its own instead
+    rng = np.random.default_rng(4)
+    expected = [engine.calculate_price(request, user, supply, rng=rng)
+                for request, user, supply in zip(requests, users, supplies)]
+    prices = engine.calculate_price_batch(requests, users, supplies, seed=4)
+    assert prices == expected
+    assert prices[10] == engine.config.min_price
+    assert len(set(prices)) > len(prices) // 2
+
+
+def test_unpriceable_row_gets_min_price(engine):
+    requests, users, supplies = trips(40, seed=2)
+    valid = engine.calculate_price_batch(requests, users, supplies, seed=4)
+    bad = copy.copy(requests[10])
+    bad.distance = None  # Becomes NaN in the float columns instead of raising
+    prices = engine.calculate_price_batch(with_row(requests, 10, bad), with_row(users, 10, users[10]),
+                                          with_row(supplies, 10, supplies[10]), seed=4)
+    assert prices[10] == engine.config.min_price
+    assert prices[:10] == valid[:10]
+    assert all(np.isfinite(prices)) and len(set(prices)) > len(prices) // 2
+
+
+@pytest.mark.parametrize("refresh", [0.0, 3600.0])
+def test_only_booked_trips_are_recorded_for_demand(model_path, refresh):
+    engine = PricingEngine(PricingConfig(model_path=model_path, demand_refresh_interval=refresh))
+    try:
+        requests, users, supplies = trips(20)
+        engine.calculate_price_batch(requests, users, supplies)
+        engine.calculate_price(requests[0], users[0], supplies[0])
+        assert len(engine.demand_forecaster._recorded) == 0  # Quotes are not demand
+        booked = [(request.zone, request.timestamp) for request in requests[:5]]
+        assert engine.record_trips(booked) == (5 if refresh else 0)
+        assert list(engine.demand_forecaster._recorded) == (booked if refresh else [])
+    finally:
+        engine.close()
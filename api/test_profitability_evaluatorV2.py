@@ -0,0 +1,125 @@
+import copy
+import time
+import numpy as np
+import pytest
+from benchmarks import make_driver, make_workload
+from profitability_evaluatorV2 import RequestEvaluator, top_per_column
+
+
+def workload(coordinates: bool):
+    """Trips with some missing fares, unknown zones and exact duplicates (tied scores), optionally with pickup coordinates"""
+    w = make_workload(400, seed=3)
+    requests = w["requests"]
+    for i in range(0, len(requests), 7):
+        requests[i].fare = None
+    for i in range(0, len(requests), 11):
+        requests[i].zone = "nowhere"
+    if coordinates:
+        for i, request in enumerate(requests):
+            if i % 9:  # Every ninth request keeps only its zone
+                request.pickup_lat = 40.70 + (i % 37) * 0.004
+                request.pickup_lon = -74.02 + (i % 23) * 0.005
+    for i in range(5):
+        duplicate = copy.copy(requests[i * 13 + 1])
+        duplicate.rideId = len(requests)
+        requests.append(duplicate)
+    return requests, w["users"]
+
+
+def driver(coordinates: bool, return_to_base: bool, shift_remaining_time: float):
+    profile = make_driver()
+    profile.return_to_base = return_to_base
+    profile.shift_remaining_time = shift_remaining_time
+    if coordinates:
+        profile.current_lat, profile.current_lon = 40.75, -73.98
+    return profile
+
+
+def scalar_ranking(evaluator, requests, profile):
+    """The per-request path: evaluate_request for each, sorted best first"""
+    scores = [score for score in (evaluator.evaluate_request(request, profile, None, 20) for request in requests) if score]
+    return sorted(scores, key=lambda x: x.final_score, reverse=True)
+
+
+def same_hour(compute):
+    """Run compute again if the local hour (which sets the opportunity cost) changed while it ran"""
+    while True:
+        hour = time.localtime().tm_hour
+        result = compute()
+        if time.localtime().tm_hour == hour:
+            return result
+
+
+DRIVERS = [(True, 120.0), (False, 40.0), (True, 20.0)]
+
+
+@pytest.mark.parametrize("coordinates", [False, True])
+@pytest.mark.parametrize("return_to_base,shift_remaining_time", DRIVERS)
+def test_rankings_match_per_request_path(coordinates, return_to_base, shift_remaining_time):
+    evaluator = RequestEvaluator()
+    requests, users = workload(coordinates)
+    profile = driver(coordinates, return_to_base, shift_remaining_time)
+
+    expected, best, ranked = same_hour(lambda: (
+        scalar_ranking(evaluator, requests, profile),
+        evaluator.rank_requests(requests, profile, users, 20),
+        evaluator.get_best_requests(requests, profile, users, 20)
+    ))
+    assert len(expected) < len(requests)  # Requests without a fare are skipped
+    assert best == expected[0]
+    assert ranked == expected
+
+
+@pytest.mark.parametrize("coordinates", [False, True])
+@pytest.mark.parametrize("return_to_base,shift_remaining_time", DRIVERS)
+def test_top_requests_match_per_request_path(coordinates, return_to_base, shift_remaining_time):
+    evaluator = RequestEvaluator()
+    requests, users = workload(coordinates)
+    profile = driver(coordinates, return_to_base, shift_remaining_time)
+
+    def compute():
+        expected = scalar_ranking(evaluator, requests, profile)
+        # Also cut between every pair of tied scores
+        ties = [i + 1 for i in range(len(expected) - 1) if expected[i].final_score == expected[i + 1].final_score]
+        assert ties
+        ks = [1, 2, 3, 50, len(requests) + 1] + ties
+        return expected, {k: evaluator.get_top_requests(requests, profile, users, 20, k=k) for k in ks}
+
+    expected, top = same_hour(compute)
+    for k, scores in top.items():
+        assert scores == expected[:k]
+    assert evaluator.get_top_requests(requests, profile, users, 20, k=0) == []
+
+
+def test_no_requests():
+    evaluator = RequestEvaluator()
+    profile = driver(True, True, 120.0)
+    assert evaluator.rank_requests([], profile, {}, 20) is None
+    assert evaluator.get_best_requests([], profile, {}, 20) == []
+    assert evaluator.get_top_requests([], profile, {}, 20, k=3) == []
+
+
+def test_top_per_column_cuts_ties_like_a_stable_sort():
+    scores = np.random.default_rng(0).integers(0, 6, size=(200, 8)).astype(float)  # Dozens of ties per column
+    expected = np.argsort(-scores.T, axis=1, kind="stable")
+    for k in range(0, 202, 3):
+        assert np.array_equal(top_per_column(scores, k), expected[:, :k])
+
+
+def test_sweep_top_matches_each_weight_sets_scores():
+    evaluator = RequestEvaluator()
+    requests, _ = workload(coordinates=True)
+    # Scoring on surge alone ties most requests
+    weight_sets = [{}, {"profit": 0.0, "profit_per_minute": 0.0, "profit_per_mile": 0.0, "pickup_time": 0.0,
+                        "opportunity_cost": 0.0, "surge_factor": 1.0}]
+    for k in (1, 5, 40):
+        sweep, = evaluator.sweep_weights([(requests, driver(True, True, 120.0))], weight_sets, k)
+        for w in range(len(weight_sets)):
+            assert sweep.top[w].tolist() == np.argsort(-sweep.scores[:, w], kind="stable")[:k].tolist()
+        assert sweep.top[0].tolist() == sweep.columns.top(k).tolist()
+
+
+@pytest.mark.parametrize("weight", [float("nan"), float("inf")])
+def test_sweep_rejects_non_finite_weights(weight):
+    with pytest.raises(ValueError, match="finite"):
+        RequestEvaluator().weight_matrix([{"profit": weight}])
@@ -0,0 +1,138 @@
+import copy
+import math
+import random
+import time
+import numpy as np
+import pytest
+from dataclasses import replace
+from benchmarks import make_driver, make_workload
+from profitability_evaluatorV2 import RequestEvaluator
+from request_pool import RequestPool, TimerWheel
+
+
+class Clock:
+    def __init__(self, now: float = 1000.0):
+        self.now = now
+
+    def __call__(self) -> float:
+        return self.now
+
+
+@pytest.mark.parametrize("tick_seconds,slots", [(1.0, 8), (0.5, 512)])
+def test_timer_wheel_fires_each_timer_once_when_due(tick_seconds, slots):
+    rnd = random.Random(slots)
+    wheel = TimerWheel(tick_seconds, slots, now=0.0)
+    due_ticks, fired, now = {}, set(), 0.0
+    for key in range(3000):
+        if rnd.random() < 0.3:
+            now += rnd.choice([0.0, 0.3, 1.0, 3.0, slots * tick_seconds * 2.5])  # Including pauses of several revolutions
+            expired = wheel.advance(now)
+            keys = {key for key, _ in expired}
+            assert len(keys) == len(expired) and not keys & fired
+            fired |= keys
+            assert fired == {key for key, tick in due_ticks.items() if tick <= now // tick_seconds}
+        deadline = now + rnd.choice([-1.0, 0.0, 0.7, 2.0, 10.0, slots * tick_seconds * 3.0])
+        # Deadlines round up to a whole tick, and never to one already processed
+        due_ticks[key] = max(math.ceil(deadline / tick_seconds), int(now // tick_seconds) + 1)
+        wheel.schedule(key, 0, deadline)
+    wheel.advance(now + slots * tick_seconds * 4)
+    assert wheel.size == 0
+
+
+def requests(n: int, seed: int = 0):
+    """Trips with rideIds, plus exact copies under new ids so scores tie"""
+    trips = make_workload(n, seed=seed)["requests"]
+    for i, trip in enumerate(trips):
+        trip.rideId = i
+    for i in range(0, n, 5):
+        twin = copy.copy(trips[i])
+        twin.rideId = n + i
+        trips.append(twin)
+    return trips
+
+
+def expected_top(evaluator, pool, driver, k):
+    """The driver's k best by rescoring every open request, ties in the order they were added"""
+    entries = sorted(pool._requests.values(), key=lambda entry: entry[1])
+    if not entries:
+        return []
+    columns, matrix = evaluator.score_matrix([request for request, _ in entries], [driver])
+    scores = matrix[0]
+    order = [i for i in np.argsort(-scores, kind="stable").tolist() if scores[i] != -np.inf]
+    return [(columns.requests[i].rideId, float(scores[i])) for i in order[:k]]
+
+
+def same_hour(compute):
+    """Run compute again if the local hour (which sets the opportunity cost) changed while it ran"""
+    while True:
+        hour = time.localtime().tm_hour
+        result = compute()
+        if time.localtime().tm_hour == hour:
+            return result
+
+
+@pytest.mark.parametrize("depth", [3, 64])
+def test_top_matches_full_rescore_through_churn(depth):
+    evaluator = RequestEvaluator()
+    pool = RequestPool(evaluator, depth=depth, clock=Clock())
+    driver = make_driver()
+    trips = requests(300)
+    rnd = random.Random(depth)
+    pool.add_requests(trips[:100])
+    pool.update_driver("d1", driver)
+    open_ids = {trip.rideId for trip in trips[:100]}
+    for step in range(60):
+        if step % 3 == 0:
+            added = rnd.sample(trips, 8)
+            pool.add_requests(added)
+            open_ids |= {trip.rideId for trip in added}
+        else:
+            taken = rnd.sample(sorted(open_ids), min(len(open_ids), 6))
+            assert pool.remove_requests(taken) == len(taken)
+            open_ids -= set(taken)
+        for k in (1, 2, depth + 3):
+            top, expected = same_hour(lambda: (pool.top("d1", k), expected_top(evaluator, pool, driver, k)))
+            assert top == expected
+    assert pool.counters["rebuilds"] > 1
+    with pytest.raises(KeyError):
+        pool.top("nobody")
+
+
+def test_requests_expire_after_their_ttl():
+    clock = Clock()
+    pool = RequestPool(RequestEvaluator(), ttl_seconds=60, clock=clock)
+    trips = requests(10)
+    pool.add_requests(trips[:5])
+    clock.now += 30
+    pool.add_requests(trips[5:8], ttl_seconds=10)
+    pool.update_driver("d1", make_driver())
+    assert len(pool.top("d1", 20)) == 8
+
+    clock.now += 11
+    assert {ride_id for ride_id, _ in pool.top("d1", 20)} == {trip.rideId for trip in trips[:5]}
+    clock.now += 18
+    assert pool.stats()["open_requests"] == 5
+    clock.now += 2
+    assert pool.top("d1", 20) == []
+    assert pool.counters["expired"] == 8 and pool.stats()["pending_timers"] == 0
+
+
+def test_replacing_a_ride_id_supersedes_the_old_request():
+    clock = Clock()
+    pool = RequestPool(RequestEvaluator(), ttl_seconds=60, clock=clock)
+    trips = requests(20)
+    pool.update_driver("d1", make_driver())
+    pool.add_requests(trips[:20])
+    best_id, best_score = pool.top("d1")[0]
+
+    cheaper = replace(trips[best_id], fare=1.0)
+    clock.now += 50
+    assert pool.add_requests([trips[best_id], cheaper]) == 1  # The last copy of a repeated rideId wins
+    assert pool._requests[best_id][0] is cheaper and pool.stats()["open_requests"] == 20
+    assert pool.top("d1")[0] != (best_id, best_score)  # The old heap entry is no longer served
+
+    clock.now += 20  # Past the first deadline: only the replacement's timer is current
+    assert pool.expire() == 19
+    assert list(pool._requests) == [best_id]
+    with pytest.raises(ValueError):
+        pool.add_requests([replace(trips[0], rideId=None)])
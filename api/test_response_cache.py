@@ -0,0 +1,112 @@
+import threading
+import time
+import pytest
+from response_cache import CachedResponse, ResponseCache, payload_key
+
+
+class Clock:
+    def __init__(self, now: float = 0.0):
+        self.now = now
+
+    def __call__(self) -> float:
+        return self.now
+
+
+def response(body: bytes, status: int = 200) -> CachedResponse:
+    return CachedResponse(body, status, "application/json")
+
+
+def test_concurrent_callers_share_one_computation():
+    cache = ResponseCache(ttl=60, max_bytes=1000)
+    release, calls = threading.Event(), []
+
+    def compute():
+        calls.append(1)
+        release.wait(5)
+        return response(b'{"ranked":[]}')
+
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(cache.get_or_compute(b"k", compute))) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    deadline = time.monotonic() + 5
+    while not calls and time.monotonic() < deadline:
+        time.sleep(0.001)
+    time.sleep(0.05)  # Let the others reach the in-flight computation
+    release.set()
+    for thread in threads:
+        thread.join()
+
+    assert len(calls) == 1
+    assert {body for (body, _, _), _ in results} == {b'{"ranked":[]}'}
+    sources = [source for _, source in results]
+    assert sources.count("miss") == 1 and set(sources) <= {"miss", "coalesced", "hit"}
+    stats = cache.stats()
+    assert stats["misses"] == 1 and stats["coalesced"] + stats["hits"] == 7
+
+
+def test_a_failed_computation_reaches_waiters_and_is_not_cached():
+    cache = ResponseCache(ttl=60, max_bytes=1000)
+    started, release = threading.Event(), threading.Event()
+
+    def failing():
+        started.set()
+        release.wait(5)
+        raise RuntimeError("model unavailable")
+
+    errors = []
+
+    def call(compute):
+        try:
+            cache.get_or_compute(b"k", compute)
+        except RuntimeError as e:
+            errors.append(e)
+
+    leader = threading.Thread(target=call, args=(failing,))
+    leader.start()
+    started.wait(5)
+    follower = threading.Thread(target=call, args=(lambda: response(b"late"),))
+    follower.start()
+    time.sleep(0.05)
+    release.set()
+    leader.join()
+    follower.join()
+
+    assert 1 <= len(errors) <= 2 and all(str(e) == "model unavailable" for e in errors)
+    assert cache.get_or_compute(b"k", lambda: response(b"ok"))[1] in ("miss", "hit")
+    assert cache.stats()["entries"] == 1
+
+
+def test_entries_expire_after_ttl():
+    clock = Clock()
+    cache = ResponseCache(ttl=2.0, max_bytes=1000, clock=clock)
+    assert cache.get_or_compute(b"k", lambda: response(b"one")) == (response(b"one"), "miss")
+    clock.now = 1.9
+    assert cache.get_or_compute(b"k", lambda: response(b"two")) == (response(b"one"), "hit")
+    clock.now = 2.0
+    assert cache.get_or_compute(b"k", lambda: response(b"two")) == (response(b"two"), "miss")
+    assert cache.stats()["expirations"] == 1 and cache.size_bytes == 3
+
+
+def test_least_recently_used_bodies_are_evicted_past_max_bytes():
+    cache = ResponseCache(ttl=60, max_bytes=10)
+    for key in (b"a", b"b"):
+        cache.get_or_compute(key, lambda: response(b"1234"))
+    cache.get_or_compute(b"a", lambda: response(b"xxxx"))  # A hit: b is now the least recently used
+    cache.get_or_compute(b"c", lambda: response(b"5678"))
+    assert list(cache._entries) == [b"a", b"c"] and cache.size_bytes == 8 and cache.evictions == 1
+
+    assert cache.get_or_compute(b"big", lambda: response(b"x" * 11))[1] == "miss"  # Larger than the cache: not stored
+    assert cache.get_or_compute(b"error", lambda: response(b"{}", status=500))[1] == "miss"
+    assert cache.get_or_compute(b"error", lambda: response(b"{}", status=500))[1] == "miss"
+    assert list(cache._entries) == [b"a", b"c"] and cache.size_bytes == 8
+    cache.clear()
+    assert cache.stats()["entries"] == 0 and cache.size_bytes == 0
+    with pytest.raises(ValueError):
+        ResponseCache(ttl=0, max_bytes=10)
+
+
+def test_payload_key_ignores_key_order_but_not_context():
+    assert payload_key({"a": 1, "b": [1, 2]}, 3) == payload_key({"b": [1, 2], "a": 1}, 3)
+    assert payload_key({"a": 1}, 3) != payload_key({"a": 1}, 4)
+    assert payload_key({"a": 1}, False, 3, 0) != payload_key({"a": 1}, False, 3, 1)
@@ -0,0 +1,38 @@
+import numpy as np
+import pytest
+from spatial_index import GridIndex, haversine_miles
+
+
+def points(n: int, lat_range, lon_range, seed: int = 0):
+    rng = np.random.default_rng(seed)
+    return rng.uniform(*lat_range, n), rng.uniform(*lon_range, n)
+
+
+# A single city, a span reaching far from the equator, and one straddling it
+SPANS = [((40.6, 40.9), (-74.1, -73.8)), ((55.0, 70.0), (15.0, 30.0)), ((-20.0, 5.0), (100.0, 110.0))]
+
+
+@pytest.mark.parametrize("lat_range,lon_range", SPANS)
+def test_queries_match_brute_force(lat_range, lon_range):
+    lats, lons = points(2000, lat_range, lon_range)
+    grid = GridIndex(lats, lons, cell_miles=2.0)
+    query_lats, query_lons = points(40, (lat_range[0] - 3, lat_range[1] + 3), lon_range, seed=1)
+    for lat, lon in zip(query_lats, query_lons):
+        distances = haversine_miles(lat, lon, lats, lons)
+        for radius in (0.5, 5.0, 40.0, 300.0):
+            ids, found = grid.query_radius(lat, lon, radius)
+            expected = np.flatnonzero(distances <= radius)
+            assert sorted(ids.tolist()) == expected.tolist()
+            assert np.all(np.diff(found) >= 0)
+        for k in (1, 10, 200):
+            _, found = grid.nearest(lat, lon, k)
+            assert np.array_equal(found, np.sort(distances)[:k])
+            _, found = grid.nearest(lat, lon, k, max_radius_miles=25.0)
+            within = np.sort(distances[distances <= 25.0])
+            assert np.array_equal(found, within[:k])
+
+
+def test_empty_index():
+    grid = GridIndex(np.empty(0), np.empty(0))
+    assert len(grid.query_radius(60.0, 20.0, 10.0)[0]) == 0
+    assert len(grid.nearest(60.0, 20.0, 3)[0]) == 0
@@ -0,0 +1,51 @@
+import random
+import pytest
+from surge_state import SlidingWindowCounter, SurgeState
+
+
+@pytest.mark.parametrize("window", [1, 5, 60])
+def test_window_counter_matches_brute_force(window):
+    rnd = random.Random(window)
+    counter = SlidingWindowCounter(window)
+    seconds, now = [], 1000
+    for _ in range(2000):
+        now += rnd.choice([0, 0, 1, 2, 7, window * 3])  # Bursts, steps and gaps longer than the window
+        second = now - rnd.randint(0, window + 2)        # Some arrive late, some too late to count
+        counter.add(second)
+        seconds.append(second)
+        assert counter.total == sum(1 for s in seconds if s > counter.head - window)
+        counter.advance(now + rnd.randint(0, 2))
+        assert counter.total == sum(1 for s in seconds if s > counter.head - window)
+
+
+def test_requests_leave_the_window():
+    state = SurgeState(surge_threshold=3.0, window_seconds=60)
+    for second in range(1000, 1030):
+        state.request_created("airport", second)
+    state.driver_online("airport", "d1", 1030)
+    assert state.snapshot()["airport"]["requests_in_window"] == 30
+    assert state.get_surge("airport") > 1.0
+
+    state.tick(1074)  # The window is now (1014, 1074]: the first 15 requests have left it
+    assert state.snapshot()["airport"]["requests_in_window"] == 15
+    state.tick(1090)
+    assert state.snapshot()["airport"] == {"requests_in_window": 0, "drivers_online": 1, "surge": 1.0}
+    assert state.get_surge("downtown") == 1.0
+
+
+def test_drivers_move_between_zones():
+    state = SurgeState(surge_threshold=3.0, window_seconds=3600)
+    for second in range(20):
+        state.request_created("downtown", 1000 + second)
+    state.driver_online("downtown", "d1", 1020)
+    lone_driver = state.get_surge("downtown")
+    state.driver_online("downtown", "d2", 1020)
+    assert 1.0 < state.get_surge("downtown") < lone_driver
+
+    assert state.apply_events([{"type": "driver_online", "zone": "suburb", "driver_id": "d2", "timestamp": 1021}]) == 1
+    assert state.get_surge("downtown") == lone_driver  # d2 left downtown
+    state.driver_offline("d2", 1022)
+    state.driver_offline("unknown", 1022)
+    assert {zone: s["drivers_online"] for zone, s in state.snapshot().items()} == {"downtown": 1, "suburb": 0}
+    with pytest.raises(ValueError):
+        state.apply_events([{"type": "ride_cancelled", "zone": "downtown"}])
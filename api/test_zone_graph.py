@@ -0,0 +1,103 @@
+import itertools
+import json
+import os
+import numpy as np
+import pytest
+from zone_graph import DEFAULT_GRAPH, ZoneGraph, ZoneRouter, all_pairs_shortest
+
+
+def brute_force_shortest(minutes: np.ndarray, miles: np.ndarray):
+    """Fastest path minutes and its miles for one bucket, by trying every simple path"""
+    n = len(minutes)
+    best_minutes, best_miles = minutes.copy(), miles.copy()
+    for a, b in itertools.permutations(range(n), 2):
+        others = [z for z in range(n) if z not in (a, b)]
+        for length in range(1, len(others) + 1):
+            for middle in itertools.permutations(others, length):
+                path = (a,) + middle + (b,)
+                legs = list(zip(path, path[1:]))
+                total = sum(minutes[x, y] for x, y in legs)
+                if total < best_minutes[a, b]:
+                    best_minutes[a, b], best_miles[a, b] = total, sum(miles[x, y] for x, y in legs)
+    return best_minutes, best_miles
+
+
+def test_all_pairs_shortest_matches_brute_force():
+    rng = np.random.default_rng(0)
+    buckets, n = 3, 6
+    minutes = np.where(rng.random((buckets, n, n)) < 0.5, rng.uniform(1, 30, (buckets, n, n)), np.inf)
+    miles = rng.uniform(0.5, 10, (buckets, n, n))
+    for i in range(n):
+        minutes[:, i, i] = miles[:, i, i] = 0.0
+    got_minutes, got_miles = all_pairs_shortest(minutes, miles)
+    for bucket in range(buckets):
+        expected_minutes, expected_miles = brute_force_shortest(minutes[bucket], miles[bucket])
+        assert np.allclose(got_minutes[bucket], expected_minutes)
+        reachable = np.isfinite(expected_minutes)
+        assert np.allclose(got_miles[bucket][reachable], expected_miles[reachable])
+    assert np.isinf(minutes).any() and np.isfinite(got_minutes).sum() > np.isfinite(minutes).sum()
+
+
+CHAIN = {
+    "zones": ["a", "b", "c", "d"],
+    "hour_buckets": [{"start": 0, "factor": 1.0}, {"start": 7, "factor": 2.0}, {"start": 10, "factor": 1.0}],
+    "links": [
+        {"from": "a", "to": "b", "miles": 2.0, "minutes": 5, "two_way": True},
+        {"from": "b", "to": "c", "miles": 3.0, "minutes": 5, "two_way": True},
+        {"from": "a", "to": "c", "miles": 4.0, "minutes": 15, "minutes_by_bucket": [15, 15, 15]},
+        {"from": "c", "to": "d", "miles": 1.0, "minutes": 2},
+    ],
+    "intra_zone": {"a": {"miles": 0.5, "minutes": 3}},
+    "default": {"miles": 9.0, "minutes": 30},
+}
+
+
+def test_graph_routes_through_faster_zones():
+    graph = ZoneGraph.from_spec(CHAIN)
+    assert graph.deadhead("a", "c", 3) == {"miles": 5.0, "minutes": 10.0}   # Via b beats the direct link
+    assert graph.deadhead("a", "c", 8) == {"miles": 4.0, "minutes": 15.0}   # Rush hour doubles a-b-c, not the direct link
+    assert graph.deadhead("a", "d", 3) == {"miles": 6.0, "minutes": 12.0}
+    assert graph.deadhead("d", "a", 3) == {"miles": 9.0, "minutes": 30.0}   # c -> d is one way: unreachable, default
+    assert graph.deadhead("a", "a", 8) == {"miles": 0.5, "minutes": 6.0}    # Intra-zone, scaled by the bucket
+    assert graph.deadhead("b", "b", 3) == {"miles": 9.0, "minutes": 30.0}   # No intra-zone figure: default
+    assert graph.deadhead("a", "nowhere", 3) == {"miles": 9.0, "minutes": 30.0}
+    miles, minutes = graph.deadhead_batch(graph.zone_id_array(["a", "a", "nowhere"]), graph.zone_id("c"), 3)
+    assert miles.tolist() == [5.0, 5.0, 9.0] and minutes.tolist() == [10.0, 10.0, 30.0]
+
+
+@pytest.mark.parametrize("change,message", [
+    ({"zones": ["a", "a"]}, "Duplicate"),
+    ({"hour_buckets": [{"start": 3}]}, "hour 0"),
+    ({"links": [{"from": "a", "to": "z", "miles": 1.0, "minutes": 1}]}, "unknown zone"),
+    ({"links": [{"from": "a", "to": "b", "miles": 1.0, "minutes": 1, "minutes_by_bucket": [1, 2]}]}, "one time per hour bucket"),
+])
+def test_invalid_graphs_are_rejected(change, message):
+    with pytest.raises(ValueError, match=message):
+        ZoneGraph.from_spec({**CHAIN, **change})
+
+
+def write_graph(path, spec, mtime):
+    with open(path, "w") as f:
+        f.write(spec if isinstance(spec, str) else json.dumps(spec))
+    os.utime(path, (mtime, mtime))
+
+
+def test_router_version_counts_swapped_in_graphs(tmp_path):
+    path = str(tmp_path / "graph.json")
+    write_graph(path, DEFAULT_GRAPH, 1000)
+    router = ZoneRouter(path, poll_interval=0)
+    first = router.graph
+    assert router.version == 1
+    assert not router.reload()
+    assert router.version == 1
+
+    write_graph(path, {**DEFAULT_GRAPH, "default": {"miles": 4.0, "minutes": 12}}, 2000)
+    assert router.reload()
+    assert router.version == 2 and router.graph is not first
+    assert router.deadhead("nowhere", "downtown", 12) == {"miles": 4.0, "minutes": 12.0}
+
+    write_graph(path, "{not json", 3000)
+    with pytest.raises(ValueError):
+        router.reload()
+    assert router.version == 2  # The previous graph is kept, so cached results stay valid
+    assert ZoneRouter().version == 0
@@ -0,0 +1,214 @@
+import os
+import json
+import time
+import logging
+import threading
+import numpy as np
+from typing import Dict, List, Optional, Sequence, Tuple
+
+# Configure logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Same costs as the zone pairs the evaluators used to hard-code: every link
+# is the direct trip between two zones, and intra_zone is the pickup cost
+# within a zone. Anything not covered falls back to "default".
+DEFAULT_GRAPH = {
+    "zones": ["downtown", "suburb", "airport"],
+    "hour_buckets": [{"start": 0, "factor": 1.0}],
+    "links": [
+        {"from": "downtown", "to": "suburb", "miles": 5.0, "minutes": 12, "two_way": True},
+        {"from": "downtown", "to": "airport", "miles": 10.0, "minutes": 18, "two_way": True},
+        {"from": "suburb", "to": "airport", "miles": 8.0, "minutes": 15, "two_way": True},
+    ],
+    "intra_zone": {
+        "downtown": {"miles": 1.5, "minutes": 8},
+        "suburb": {"miles": 2.0, "minutes": 6},
+        "airport": {"miles": 1.0, "minutes": 5},
+    },
+    "default": {"miles": 3.0, "minutes": 10},
+}
+
+
+def all_pairs_shortest(minutes: np.ndarray, miles: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """Floyd-Warshall over stacked [bucket, from, to] link matrices (inf where there is no link).
+
+    Paths minimize travel time; the returned miles are the distance along
+    each fastest path. Every bucket is relaxed at once, one pivot zone per step.
+    """
+    minutes, miles = minutes.copy(), miles.copy()
+    via = np.empty_like(minutes)
+    better = np.empty(minutes.shape, dtype=bool)
+    for k in range(minutes.shape[1]):
+        np.add(minutes[:, :, k, None], minutes[:, None, k, :], out=via)
+        np.less(via, minutes, out=better)
+        np.copyto(minutes, via, where=better)
+        np.copyto(miles, miles[:, :, k, None] + miles[:, None, k, :], where=better)
+    return minutes, miles
+
+
+class ZoneGraph:
+    """Deadhead miles and minutes between every pair of zones, per hour bucket.
+
+    Zone names map to integer ids; one extra id past the last zone stands for
+    any unknown zone, so lookups are pure array indexing with the default cost
+    filled into that row and column.
+    """
+
+    def __init__(self, zones: List[str], bucket_of_hour: np.ndarray, miles: np.ndarray, minutes: np.ndarray):
+        self.zones = zones
+        self.zone_ids = {zone: i for i, zone in enumerate(zones)}
+        self.unknown_id = len(zones)
+        self.bucket_of_hour = bucket_of_hour
+        self.miles = miles
+        self.minutes = minutes
+
+    @classmethod
+    def from_spec(cls, spec: Dict) -> "ZoneGraph":
+        start = time.perf_counter()
+        zones = list(spec["zones"])
+        ids = {zone: i for i, zone in enumerate(zones)}
+        if len(ids) != len(zones):
+            raise ValueError("Duplicate zone names in graph")
+
+        buckets = sorted(spec.get("hour_buckets") or [{"start": 0, "factor": 1.0}], key=lambda b: b["start"])
+        if buckets[0]["start"] != 0:
+            raise ValueError("The first hour bucket must start at hour 0")
+        bucket_of_hour = np.searchsorted([b["start"] for b in buckets], np.arange(24), side="right") - 1
+        factors = np.array([b.get("factor", 1.0) for b in buckets], dtype=float)
+
+        n_buckets, n = len(buckets), len(zones)
+        minutes = np.full((n_buckets, n, n), np.inf)
+        miles = np.full((n_buckets, n, n), np.inf)
+        for i in range(n):
+            minutes[:, i, i] = miles[:, i, i] = 0.0
+        for link in spec.get("links", []):
+            if link["from"] not in ids or link["to"] not in ids:
+                raise ValueError(f"Link {link['from']} -> {link['to']} references an unknown zone")
+            link_minutes = np.asarray(link.get("minutes_by_bucket") or link["minutes"] * factors, dtype=float)
+            if link_minutes.shape != (n_buckets,):
+                raise ValueError(f"Link {link['from']} -> {link['to']} needs one time per hour bucket")
+            pairs = [(ids[link["from"]], ids[link["to"]])]
+            if link.get("two_way"):
+                pairs.append(pairs[0][::-1])
+            for a, b in pairs:
+                faster = link_minutes < minutes[:, a, b]
+                minutes[faster, a, b] = link_minutes[faster]
+                miles[faster, a, b] = link["miles"]
+
+        minutes, miles = all_pairs_shortest(minutes, miles)
+
+        # Pickups inside a zone cost the zone's own figure, not a zero-length path
+        default = spec.get("default", DEFAULT_GRAPH["default"])
+        for i, zone in enumerate(zones):
+            intra = spec.get("intra_zone", {}).get(zone, default)
+            minutes[:, i, i] = intra["minutes"] * factors
+            miles[:, i, i] = intra["miles"]
+
+        # Unreachable pairs and the unknown-zone row/column use the default cost
+        minutes = np.pad(minutes, ((0, 0), (0, 1), (0, 1)), constant_values=np.inf)
+        miles = np.pad(miles, ((0, 0), (0, 1), (0, 1)), constant_values=np.inf)
+        unreachable = np.isinf(minutes)
+        minutes[unreachable] = default["minutes"]
+        miles[unreachable] = default["miles"]
+
+        logger.info(f"Built zone graph: {n} zones, {n_buckets} hour buckets in {(time.perf_counter() - start) * 1000:.1f} ms")
+        return cls(zones, bucket_of_hour, miles, minutes)
+
+    @classmethod
+    def from_file(cls, path: str) -> "ZoneGraph":
+        with open(path) as f:
+            return cls.from_spec(json.load(f))
+
+    def zone_id(self, zone: str) -> int:
+        return self.zone_ids.get(zone, self.unknown_id)
+
+    def zone_id_array(self, zones: Sequence[str]) -> np.ndarray:
+        get, unknown = self.zone_ids.get, self.unknown_id
+        return np.fromiter((get(zone, unknown) for zone in zones), dtype=np.intp, count=len(zones))
+
+    def deadhead(self, from_zone: str, to_zone: str, hour: Optional[int] = None) -> Dict[str, float]:
+        """Miles and minutes from one zone to another, as calculate_deadhead_costs returns them"""
+        bucket = self.bucket_of_hour[time.localtime().tm_hour if hour is None else hour]
+        a, b = self.zone_id(from_zone), self.zone_id(to_zone)
+        return {"miles": float(self.miles[bucket, a, b]), "minutes": float(self.minutes[bucket, a, b])}
+
+    def deadhead_batch(self, from_ids, to_ids, hour: Optional[int] = None) -> Tuple[np.ndarray, np.ndarray]:
+        """Miles and minutes for arrays of zone ids (either side may be a single id)"""
+        bucket = self.bucket_of_hour[time.localtime().tm_hour if hour is None else hour]
+        return self.miles[bucket, from_ids, to_ids], self.minutes[bucket, from_ids, to_ids]
+
+
+class ZoneRouter:
+    """Serves deadhead lookups from the current ZoneGraph and rebuilds it when the graph file changes.
+
+    A daemon thread polls the file's modification time; a changed file is
+    rebuilt off the request path and swapped in with a single reference
+    assignment. A file that fails to load is logged and the old graph kept.
+    `version` counts the graphs swapped in, for keying cached results.
+    """
+
+    def __init__(self, path: Optional[str] = None, poll_interval: float = 5.0):
+        self.path = path
+        self.poll_interval = poll_interval
+        self._mtime: Optional[float] = None
+        self.graph = ZoneGraph.from_spec(DEFAULT_GRAPH)
+        self.version = 0
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        if path is not None:
+            self.reload()
+
+    def reload(self) -> bool:
+        """Rebuild from the graph file if it changed since the last load; True if a new graph was swapped in"""
+        mtime = os.stat(self.path).st_mtime
+        if mtime == self._mtime:
+            return False
+        self._mtime = mtime  # A broken file is reported once, not on every poll
+        self.graph = ZoneGraph.from_file(self.path)
+        # Bumped after the swap, so a result keyed with the new version never comes from the old graph
+        self.version += 1
+        logger.info(f"Loaded zone graph from {self.path}")
+        return True
+
+    def deadhead(self, from_zone: str, to_zone: str, hour: Optional[int] = None) -> Dict[str, float]:
+        return self.graph.deadhead(from_zone, to_zone, hour)
+
+    def start(self):
+        if self.path is None or self.poll_interval <= 0 or self._thread is not None:
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="zone-graph-watch", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def _run(self):
+        while not self._stop.wait(self.poll_interval):
+            try:
+                self.reload()
+            except Exception as e:
+                logger.error(f"Zone graph reload failed, keeping the previous graph: {e}")
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Write the default zone graph or inspect a graph file")
+    parser.add_argument("path", help="Graph file to inspect, or to create with --write-default")
+    parser.add_argument("--write-default", action="store_true")
+    args = parser.parse_args()
+
+    if args.write_default:
+        with open(args.path, "w") as f:
+            json.dump(DEFAULT_GRAPH, f, indent=2)
+        print(f"Wrote {args.path}")
+    graph = ZoneGraph.from_file(args.path)
+    print(f"{len(graph.zones)} zones, {graph.minutes.shape[0]} hour buckets")
+    for zone in graph.zones[:10]:
+        row = ", ".join(f"{other} {graph.deadhead(zone, other, 12)['minutes']:.0f}m" for other in graph.zones[:10])
+        print(f"  {zone}: {row}")